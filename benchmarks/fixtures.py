@@ -0,0 +1,116 @@
+"""
+Synthetic configurations and .fits files for the benchmarks.
+
+The images cover a 10 x 10 field whatever ngx is, with an Einstein ring of radius 1.5 around the
+centre: arcmask is the annulus 1 < r < 2.2, lensmask the disk r < 0.8.
+"""
+import os
+
+import numpy as np
+from astropy.io import fits
+
+from pyGLEE.GleeConfig import GleeConfig
+from pyGLEE.header import Header
+from pyGLEE.optimisers import Optimisers, SimanParameters, McmcParameters
+from pyGLEE.esource import ESource
+from pyGLEE.light_profiles import Sersic, Gaussian, Moffat, piemd, PSF
+from pyGLEE.mass_profiles import PIEMD, Shear
+from pyGLEE.priors import FlatPrior, GaussianPrior, ExactPrior
+
+FIELD = 10.0
+CENTRE = FIELD / 2
+
+
+def _gaussian_kernel(side, sigma):
+    c = np.arange(side) - side // 2
+    kernel = np.exp(-(c[:, None]**2 + c[None, :]**2) / (2 * sigma**2))
+    return kernel / kernel.sum()
+
+
+def write_files(directory, ngx, factor=1, seed=0):
+    """
+    Write the data, err, masks and PSFs of an ngx x ngx image (once per ngx and factor).
+
+    Returns
+    -------
+    dict of str to str
+        The paths, keyed by ESource attribute.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, f"{name}_{ngx}.fits") for name in ("data", "err", "arcmask", "lensmask")}
+    paths["psf"] = os.path.join(directory, "psf.fits")
+    paths["sub_psf"] = os.path.join(directory, f"psf_x{factor}.fits")
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+    dx = FIELD / ngx
+    c = (np.arange(ngx) + 0.5) * dx - CENTRE
+    r = np.hypot(c[None, :], c[:, None])
+    rng = np.random.default_rng(seed)
+    ring = np.exp(-0.5 * ((r - 1.5) / 0.2)**2) + 2 * np.exp(-r / 0.5)
+    fits.writeto(paths["data"], ring + rng.normal(0, 0.05, r.shape), overwrite=True)
+    fits.writeto(paths["err"], np.full(r.shape, 0.05), overwrite=True)
+    fits.writeto(paths["arcmask"], ((r > 1.0) & (r < 2.2)).astype(np.int16), overwrite=True)
+    fits.writeto(paths["lensmask"], (r < 0.8).astype(np.int16), overwrite=True)
+    fits.writeto(paths["psf"], _gaussian_kernel(21, 2.0), overwrite=True)
+    fits.writeto(paths["sub_psf"], _gaussian_kernel(7 * factor, 0.7 * factor), overwrite=True)
+    return paths
+
+
+def light_profiles(n, rng):
+    """
+    Returns n light profiles cycling through the profile types, with free priors near the centre.
+    """
+    def flat(mean, width, label=""):
+        return FlatPrior(float(mean), float(mean - width), float(mean + width), label=label)
+    profiles = []
+    for k in range(n):
+        x, y = flat(CENTRE + rng.normal(0, 0.3), 1.0), flat(CENTRE + rng.normal(0, 0.3), 1.0)
+        amp = flat(rng.uniform(2, 8), 2.0)
+        q, pa = flat(rng.uniform(0.5, 0.9), 0.1), flat(rng.uniform(0.5, 2.5), 0.5)
+        kind = k % 5
+        if kind == 0:
+            profiles.append(Sersic(x=x, y=y, amp=amp, q=q, pa=pa, r_eff=flat(rng.uniform(0.5, 1.5), 0.4),
+                                   n_sersic=ExactPrior(4.0)))
+        elif kind == 1:
+            profiles.append(Gaussian(x=x, y=y, amp=amp, q=q, pa=pa, sigma=flat(rng.uniform(0.3, 1.0), 0.2)))
+        elif kind == 2:
+            profiles.append(Moffat(x=x, y=y, amp=amp, q=q, pa=pa, alpha=flat(1.0, 0.5), beta=GaussianPrior(2.5, 0.3)))
+        elif kind == 3:
+            profiles.append(piemd(x=x, y=y, amp=amp, q=q, pa=pa, w=flat(0.3, 0.2)))
+        else:
+            profiles.append(PSF(x=x, y=y, amp=amp))
+    return profiles
+
+
+def lenses():
+    """
+    Returns an elliptical PIEMD in external shear, centred in the field.
+    """
+    return [PIEMD(x=FlatPrior(CENTRE, CENTRE - 0.5, CENTRE + 0.5, label="lens_x"),
+                  y=FlatPrior(CENTRE, CENTRE - 0.5, CENTRE + 0.5, label="lens_y"),
+                  q=FlatPrior(0.75, 0.3, 1.0), pa=FlatPrior(0.6, 0.0, 3.14),
+                  theta_e=FlatPrior(1.5, 0.5, 3.0), w=ExactPrior(0.05)),
+            Shear(x=ExactPrior(CENTRE, link="lens_x"), y=ExactPrior(CENTRE, link="lens_y"),
+                  gamma=FlatPrior(0.05, 0.0, 0.3), phi=FlatPrior(0.4, 0.0, 3.14))]
+
+
+def make_config(n_esources=1, n_light=1, ngx=100, ngy=30, factor=1, directory="fixtures", seed=0):
+    """
+    Build a LensOnly GleeConfig with n_esources ESources of n_light light profiles each, all on the
+    ngx x ngx images written by write_files.
+    """
+    paths = write_files(directory, ngx, factor, seed)
+    rng = np.random.default_rng(seed)
+    header = Header(chi2type=16, minimiser="siman", seed=seed,
+                    optimisers=Optimisers(SimanParameters(10, 1000, 0.1, 0.5, 1, 1.0, 0.5, 1),
+                                          McmcParameters(1000, 0.25, 1, 1)))
+    esources = [ESource(ngy=ngy, ngx=ngx, dx=FIELD / ngx,
+                        data=paths["data"], err=paths["err"], arcmask=paths["arcmask"], lensmask=paths["lensmask"],
+                        psf=paths["psf"], sub_agn_psf=paths["sub_psf"], sub_agn_psf_factor=factor,
+                        sub_esr_psf=paths["sub_psf"], sub_esr_psf_factor=factor,
+                        regopt="SpecRegPrecSigFigOnce", reglampre=1, reglamnup=10, regtype="curv",
+                        reglam=10, reglamlo=0.01, reglamhi=1000,
+                        light_profiles=light_profiles(n_light, rng),
+                        mod_light="LensOnly", dds_ds=ExactPrior(1.0))
+                for _ in range(n_esources)]
+    return GleeConfig(header, esources, lenses=lenses())
@@ -0,0 +1,334 @@
+"""
+Benchmarks of the configuration and numeric hot paths of pyGLEE.
+
+Every benchmark is timed over a few repeats (best and median wall time) after a warm-up call, and
+its peak traced allocation is measured with tracemalloc on one extra call. Each run is appended as
+one JSON line to the history file, with the git revision, so runs can be compared later.
+
+Usage:
+    python benchmarks/run.py                     # all cases, appended to benchmarks/history.jsonl
+    python benchmarks/run.py --quick             # the smallest cases only
+    python benchmarks/run.py -k parse -k sweep   # benchmarks whose name contains 'parse' or 'sweep'
+    python benchmarks/run.py --compare           # the last run against the one before it
+    python benchmarks/run.py --compare abc1234   # the last run against the last run of a revision
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fixtures import CENTRE, make_config, write_files, light_profiles
+
+from pyGLEE.GleeConfig import GleeConfig
+from pyGLEE.priors import FlatPrior
+from pyGLEE.light_profiles import Sersic
+from pyGLEE.fits_data import check_config, close_all, open_fits
+from pyGLEE.cache import config_hash
+from pyGLEE.sweep import Sweep
+from pyGLEE.grid import PixelGrid
+from pyGLEE.convolution import Convolver, ModelImage
+from pyGLEE.chi2 import MaskedChi2
+from pyGLEE.likelihood import LightChi2, free_light_parameters
+from pyGLEE.mass_profiles import MassModel
+from pyGLEE.lensing import LensingOperator
+from pyGLEE.regularization import SourceSolver
+from pyGLEE.point_sources import ImageFinder, PointChi2, PointImage, PointSource
+from pyGLEE.priors import ExactPrior
+
+HISTORY = os.path.join(HERE, "history.jsonl")
+
+# The configuration sizes and image sizes the benchmarks are run on, smallest first.
+CONFIG_SIZES = [dict(n_esources=n, n_light=m) for n in (1, 10, 100) for m in (1, 5, 20)]
+GRIDS = [dict(ngx=n) for n in (100, 300, 1000)]
+BATCH = 8
+
+BENCHMARKS = []
+
+
+def benchmark(*cases, quick=1):
+    """
+    Register a benchmark. The decorated setup(directory, **case) returns the callable to time;
+    --quick runs only the first `quick` cases.
+    """
+    def register(setup):
+        BENCHMARKS.append((setup.__name__, cases or ({},), quick, setup))
+        return setup
+    return register
+
+
+# Configuration
+
+
+@benchmark(*CONFIG_SIZES, quick=3)
+def construct(directory, n_esources, n_light):
+    write_files(directory, 100)
+    return lambda: make_config(n_esources, n_light, directory=directory)
+
+
+@benchmark(dict(n=1000), dict(n=100000))
+def construct_bulk(directory, n):
+    rng = np.random.default_rng(0)
+    mean = rng.uniform(1, 2, n)
+
+    def run():
+        columns = {name: FlatPrior.from_arrays(mean, mean - 1, mean + 1) for name in Sersic.parameters}
+        return Sersic.from_priors(**columns)
+    return run
+
+
+@benchmark(*CONFIG_SIZES, quick=3)
+def validate(directory, n_esources, n_light):
+    config = make_config(n_esources, n_light, directory=directory)
+
+    def run():
+        close_all()
+        return check_config(config)
+    return run
+
+
+@benchmark(*CONFIG_SIZES, quick=3)
+def as_string(directory, n_esources, n_light):
+    return make_config(n_esources, n_light, directory=directory).as_string
+
+
+@benchmark(*CONFIG_SIZES, quick=3)
+def parse(directory, n_esources, n_light):
+    text = make_config(n_esources, n_light, directory=directory).as_string()
+    return lambda: GleeConfig.from_string(text)
+
+
+@benchmark(*CONFIG_SIZES, quick=3)
+def hashing(directory, n_esources, n_light):
+    config = make_config(n_esources, n_light, directory=directory)
+    return lambda: config_hash(config)
+
+
+@benchmark(dict(n=100), dict(n=1000), dict(n=10000))
+def sweep(directory, n):
+    template = make_config(10, 5, directory=directory)
+    rng = np.random.default_rng(0)
+    overrides = {"esource[0].light[0].r_eff.mean": rng.uniform(0.5, 1.5, n),
+                 "esource[3].light[1].q.mean": rng.uniform(0.5, 0.9, n),
+                 "header.seed": np.arange(n)}
+    target = os.path.join(directory, "sweep")
+    return lambda: Sweep(template, overrides).write(target)
+
+
+# Numerics
+
+
+@benchmark(*GRIDS)
+def light_evaluate(directory, ngx):
+    grid = PixelGrid(ngx, 10.0 / ngx)
+    profiles = light_profiles(5, np.random.default_rng(0))
+    rng = np.random.default_rng(1)
+    params = [{name: getattr(lp, name).mean + rng.normal(0, 0.01, BATCH) for name in ("x", "y")} for lp in profiles]
+    return lambda: [lp.evaluate(grid, p) for lp, p in zip(profiles, params)]
+
+
+@benchmark(*GRIDS)
+def convolve(directory, ngx):
+    paths = write_files(directory, ngx)
+    convolver = Convolver.from_array(open_fits(paths["psf"]).data, (ngx, ngx))
+    images = np.random.default_rng(0).random((BATCH, ngx, ngx))
+    return lambda: convolver.convolve(images)
+
+
+@benchmark(*GRIDS)
+def render(directory, ngx):
+    model = ModelImage(make_config(1, 5, ngx, directory=directory).e_source_list[0])
+    return model.render
+
+
+@benchmark(*GRIDS)
+def chi2(directory, ngx):
+    chi2 = MaskedChi2.from_esource(make_config(1, 1, ngx, directory=directory).e_source_list[0])
+    models = np.random.default_rng(0).random((BATCH, ngx, ngx))
+    return lambda: chi2.chi2(models)
+
+
+# With workers, n_esources=4 ngx=300 should approach n_esources=1 ngx=300 (the slowest ESource) on >= 4 cores.
+@benchmark(dict(n_esources=1, ngx=100), dict(n_esources=1, ngx=300), dict(n_esources=10, ngx=100),
+           dict(n_esources=10, ngx=100, workers=4), dict(n_esources=4, ngx=300), dict(n_esources=4, ngx=300, workers=4))
+def light_chi2(directory, n_esources, ngx, workers=None):
+    config = make_config(n_esources, 5, ngx, directory=directory)
+    parameters = free_light_parameters(config)
+    evaluate = LightChi2(config, parameters, workers)
+    mean = config.parameter_vector(parameters, bind=False).mean
+    x = mean + np.random.default_rng(0).normal(0, 1e-3, (BATCH, len(mean)))
+    return lambda: evaluate(x)
+
+
+@benchmark(*GRIDS)
+def deflection(directory, ngx):
+    model = MassModel(make_config(1, 1, ngx, directory=directory).lenses)
+    grid = PixelGrid(ngx, 10.0 / ngx)
+    return lambda: model.ray_trace(grid, dds_ds=(1.0, 0.8))
+
+
+@benchmark(dict(ngx=100, ngy=30), dict(ngx=300, ngy=50))
+def lensing_operator(directory, ngx, ngy):
+    config = make_config(1, 1, ngx, ngy, factor=3, directory=directory)
+    model = MassModel(config.lenses)
+    return lambda: LensingOperator(config.e_source_list[0], model)
+
+
+@benchmark(dict(ngx=100, ngy=30), dict(ngx=300, ngy=50))
+def source_solver(directory, ngx, ngy):
+    config = make_config(1, 1, ngx, ngy, factor=3, directory=directory)
+    es = config.e_source_list[0]
+    response = LensingOperator(es, MassModel(config.lenses)).response(es.psf)
+
+    def run():
+        solver = SourceSolver.from_esource(es, response)
+        return solver.solve(solver.optimise(es.reglamlo, es.reglamhi, es.reglampre))
+    return run
+
+
+@benchmark(dict(chi2type=1), dict(chi2type=2), dict(chi2type=2 | 4 | 128), quick=3)
+def point_chi2(directory, chi2type):
+    model = MassModel(make_config(1, 1, directory=directory).lenses)
+    finder = ImageFinder(model, centre=(CENTRE, CENTRE), size=5.0, n=60)
+    x, y, _ = finder.find(CENTRE + 0.05, CENTRE + 0.03)
+    images = [PointImage(xi, yi, 0.005, flux=1.0, sigma_flux=0.1, delay=10.0 * k, sigma_delay=1.0)
+              for k, (xi, yi) in enumerate(zip(x, y))]
+    source = PointSource(ExactPrior(CENTRE + 0.05), ExactPrior(CENTRE + 0.03), images,
+                         dds_ds=ExactPrior(1.0), ddt=ExactPrior(2000.0))
+    evaluate = PointChi2([source], chi2type)
+    return lambda: evaluate(model)
+
+
+# Measurement and history
+
+
+def measure(run, repeat=5, budget=10.0):
+    """
+    Returns the wall times of up to `repeat` calls (fewer once `budget` seconds are spent, at least
+    one) and the peak traced allocation of one call, after a warm-up call.
+    """
+    run()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times = []
+    while len(times) < repeat and (not times or sum(times) < budget):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times, peak
+
+
+def git_revision():
+    """
+    Returns the current git revision and whether tracked files differ from it, or (None, None).
+    """
+    root = os.path.dirname(HERE)
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return rev, dirty
+
+
+def case_name(name, case):
+    return name + "".join(f" {k}={v}" for k, v in case.items())
+
+
+def run_all(patterns=(), quick=False, repeat=5, budget=10.0, out=sys.stdout):
+    """
+    Run the selected benchmarks and return the run record written to the history.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pyglee-bench-") as directory:
+        for name, cases, n_quick, setup in BENCHMARKS:
+            if patterns and not any(p in name for p in patterns):
+                continue
+            for case in cases[:n_quick] if quick else cases:
+                run = setup(directory, **case)
+                times, peak = measure(run, repeat, budget)
+                result = dict(name=name, case=case, repeat=len(times), best=min(times),
+                              median=statistics.median(times), peak_bytes=peak)
+                results.append(result)
+                print(f"{case_name(name, case):48s} {result['best'] * 1e3:10.2f} ms "
+                      f"{result['median'] * 1e3:10.2f} ms {peak / 2**20:9.1f} MiB", file=out, flush=True)
+                del run
+        close_all()
+    rev, dirty = git_revision()
+    return dict(timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                git_rev=rev, dirty=dirty, python=platform.python_version(), numpy=np.__version__,
+                machine=platform.machine(), quick=quick, results=results)
+
+
+def read_history(path=HISTORY):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(new, old, out=sys.stdout):
+    """
+    Print the best times and peak memory of the cases two runs have in common, with new/old ratios.
+    """
+    before = {case_name(r["name"], r["case"]): r for r in old["results"]}
+    print(f"{'':48s} {old['git_rev']} -> {new['git_rev']}", file=out)
+    for r in new["results"]:
+        key = case_name(r["name"], r["case"])
+        if key not in before:
+            continue
+        b = before[key]
+        print(f"{key:48s} {b['best'] * 1e3:10.2f} -> {r['best'] * 1e3:10.2f} ms ({r['best'] / b['best']:5.2f}x) "
+              f"{b['peak_bytes'] / 2**20:8.1f} -> {r['peak_bytes'] / 2**20:8.1f} MiB", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        help="only run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--quick", action="store_true", help="only run the smallest cases")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per case")
+    parser.add_argument("--budget", type=float, default=10.0, help="seconds after which a case stops repeating")
+    parser.add_argument("--history", default=HISTORY, help="the JSON lines history file")
+    parser.add_argument("--no-save", action="store_true", help="do not append the run to the history")
+    parser.add_argument("--compare", nargs="?", const="", metavar="REV",
+                        help="compare the last run in the history with the previous one, or with the last run of REV")
+    args = parser.parse_args(argv)
+
+    if args.compare is not None:
+        history = read_history(args.history)
+        if not history:
+            parser.error("the history is empty")
+        new = history[-1]
+        old = [run for run in history[:-1] if not args.compare or run["git_rev"] == args.compare]
+        if not old:
+            parser.error("no earlier run to compare with")
+        compare(new, old[-1])
+        return
+
+    record = run_all(args.patterns, args.quick, args.repeat, args.budget)
+    if not args.no_save:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
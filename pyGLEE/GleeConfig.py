@@ -2,6 +2,9 @@ from .header import Header
 from .optimisers import Optimisers
 from .esource import ESource
 from .light_profiles import LightProfile
+from .mass_profiles import MassProfile
+from .point_sources import PointSource
+from .instrument import traced
 
 class GleeConfig:
     """
@@ -17,17 +20,88 @@ class GleeConfig:
         An extended source
     light_profiles : list of LightProfile
         The list of LightProfile parameters.mlplane      lens_coord_observed
+    lenses : list of MassProfile
+        The mass profiles of the lens, written as a 'lenses' block before the ESources.
+    point_sources : list of PointSource
+        The point sources and their observed images, written as a 'psources' block before the ESources.
     """
-    def __init__(self, header, e_source_list):
+    @traced("config.construct")
+    def __init__(self, header, e_source_list, lenses=None, point_sources=None):
         if not isinstance(header, Header):
             raise TypeError("header must be an instance of Header")
         if not isinstance(e_source_list, list):
             raise TypeError("e_source_list must be a list of ESource instances")
         if not all(isinstance(es, ESource) for es in e_source_list):
             raise TypeError("e_source_list must be a list of ESource instances")
+        if lenses is None:
+            lenses = []
+        if not isinstance(lenses, list) or not all(isinstance(mp, MassProfile) for mp in lenses):
+            raise TypeError("lenses must be a list of MassProfile instances")
+        if point_sources is None:
+            point_sources = []
+        if not isinstance(point_sources, list) or not all(isinstance(ps, PointSource) for ps in point_sources):
+            raise TypeError("point_sources must be a list of PointSource instances")
         self.header = header
         self.e_source_list = e_source_list
+        self.lenses = lenses
+        self.point_sources = point_sources
 
+    @classmethod
+    def from_string(cls, text):
+        """
+        Builds a GleeConfig from the text of a GLEE configfile.
+
+        Parameters
+        ----------
+        text : str
+            The configfile, e.g. the output of `as_string`.
+
+        Returns
+        -------
+        GleeConfig
+            The parsed configuration. `GleeConfig.from_string(s).as_string() == s` for any `s` written by `as_string`.
+        """
+        from .configfile import parse_string
+        return parse_string(text)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Builds a GleeConfig by streaming a GLEE configfile from disk.
+
+        Parameters
+        ----------
+        path : str
+            Path to the configfile.
+
+        Returns
+        -------
+        GleeConfig
+            The parsed configuration.
+        """
+        from .configfile import parse_file
+        return parse_file(path)
+
+    def parameter_vector(self, parameters=None, bind=True):
+        """
+        Returns a ParameterVector over the priors of the GleeConfig.
+
+        Parameters
+        ----------
+        parameters : list of tuple, optional
+            The parameters to index, in the format of `all_parameters`. Defaults to the free parameters.
+        bind : bool, optional
+            Whether the priors read and write their means in the vector. Defaults to True.
+
+        Returns
+        -------
+        ParameterVector
+            The vector; with bind, assigning `vector.values = x` updates this configuration in place.
+        """
+        from .parameters import ParameterVector
+        return ParameterVector.from_config(self, parameters, bind)
+
+    @traced("config.as_string")
     def as_string(self):
         """
         Returns a string representation of the GleeConfig object.
@@ -40,6 +114,18 @@ class GleeConfig:
         values = []
         values.append(self.header.as_string())
         values.append("") 
+        if self.lenses:
+            values.append(f"lenses {len(self.lenses)}")
+            for mp in self.lenses:
+                values.append(mp.as_string())
+            values.append("")
+        if self.point_sources:
+            values.append(f"psources {len(self.point_sources)}")
+            values.append("")
+            for ps in self.point_sources:
+                values.append(ps.as_string())
+                values.append("psource_end")
+                values.append("")
         values.append(f"esources {len(self.e_source_list)}")
         values.append("")
         for i in range(len(self.e_source_list)):
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+from .configfile import _tokenize
+
+
+# Keywords whose value is a file; the file itself is hashed, not its path.
+FILE_KEYS = ("data", "err", "arcmask", "lensmask", "psf", "sub_agn_psf", "sub_esr_psf", "sampling_cov")
+RESULT_INDEX = "result.json"
+
+_NUMBER = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+_INTEGER = re.compile(r"^[+-]?\d+$")
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def _number(text):
+    # Integers are kept exact (seeds beyond 2**53 must not collide); integral floats below 2**53
+    # are written as the same integer, so 1, 1.0 and 1e0 are the same.
+    if _INTEGER.match(text):
+        return str(int(text))
+    value = float(text)
+    if value.is_integer() and abs(value) < 2**53:
+        return str(int(value))
+    return repr(value)
+
+
+def _normalize(token):
+    # Numbers inside tokens such as 'flat:-1,1.0' compare by value.
+    pieces = re.split(r"([:,])", token)
+    return "".join(_number(p) if _NUMBER.match(p) else p for p in pieces)
+
+
+def file_fingerprint(path, content=False):
+    """
+    Returns a fingerprint of a file that does not depend on how its path is spelled.
+
+    Parameters
+    ----------
+    path : str
+        The file.
+    content : bool, optional
+        Whether to hash the file contents (sha256, memoised per size and mtime). Defaults to False,
+        fingerprinting by device, inode, size and mtime only.
+
+    Returns
+    -------
+    str
+        The fingerprint, or 'missing:<absolute path>' for a file that does not exist.
+    """
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return f"missing:{os.path.normpath(path)}"
+    if not content:
+        return f"stat:{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with _digests_lock:
+            _digests[key] = digest
+    return f"sha256:{digest}"
+
+
+def canonical_lines(config, content=False):
+    """
+    Returns the normalized configfile of a GleeConfig as a list of lines.
+
+    Whitespace and '#' comments are dropped, numbers are written by value and file paths are
+    replaced by their file_fingerprint, so equal configurations give equal lines however they were written.
+    """
+    lines = []
+    for _, tokens in _tokenize(config.as_string().splitlines()):
+        tokens = [t for t in tokens if not t.startswith("#")]
+        if tokens[0] in FILE_KEYS and len(tokens) > 1:
+            lines.append(f"{tokens[0]} {file_fingerprint(tokens[1], content)}")
+        else:
+            lines.append(" ".join(_normalize(t) for t in tokens))
+    return lines
+
+
+def config_hash(config, content=False):
+    """
+    Returns the sha256 hex digest of canonical_lines(config, content), the identity of a GleeConfig
+    and the files it references.
+    """
+    return hashlib.sha256("\n".join(canonical_lines(config, content)).encode()).hexdigest()
+
+
+def run_key(config, executable, args=(), content=False):
+    """
+    Returns the cache key of a GLEE run: the config_hash together with the executable and its
+    arguments, so runs of another GLEE build or with other flags are not served each other's output.
+
+    The executable is identified by its resolved path and its file_fingerprint.
+    """
+    path = os.path.abspath(shutil.which(executable) or executable)
+    identity = [config_hash(config, content), path, file_fingerprint(path, content), list(args)]
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+
+def _tree_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+class RunCache:
+    """
+    A class to keep the output of finished GLEE runs on disk, keyed by run_key.
+
+    Each entry is a directory <key>/ holding a copy of the job's scratch directory and a result.json.
+    Reading an entry marks it as used; when the cache grows beyond max_bytes the least recently used
+    entries are evicted.
+
+    Attributes
+    ----------
+    directory : str
+        The cache directory.
+    max_bytes : int or None
+        The size limit, None for no limit.
+    """
+    def __init__(self, directory, max_bytes=None):
+        if max_bytes is not None and (not isinstance(max_bytes, int) or max_bytes < 0):
+            raise ValueError("max_bytes must be a non-negative int")
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _index(self, key):
+        return os.path.join(self.directory, key, RESULT_INDEX)
+
+    def __contains__(self, key):
+        return os.path.exists(self._index(key))
+
+    def get(self, key):
+        """
+        Returns the result.json contents of an entry (with its 'path' added), or None if not cached.
+        """
+        index = self._index(key)
+        with self._lock:
+            try:
+                with open(index) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            os.utime(index)
+        entry["path"] = os.path.dirname(index)
+        return entry
+
+    def put(self, key, workdir, **result):
+        """
+        Store a copy of a scratch directory and the given result fields under key, then evict.
+        """
+        target = os.path.join(self.directory, key)
+        staging = os.path.join(self.directory, f".{key}.{threading.get_ident()}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.copytree(workdir, staging)
+        result["size"] = _tree_size(staging)
+        result["stored"] = time.time()
+        with open(os.path.join(staging, RESULT_INDEX), "w") as f:
+            json.dump(result, f)
+        with self._lock:
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(staging, target)
+            self._evict()
+
+    def entries(self):
+        """
+        Returns (key, size, last use) per entry, least recently used first.
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            index = self._index(key)
+            try:
+                with open(index) as f:
+                    size = json.load(f)["size"]
+                entries.append((key, size, os.path.getmtime(index)))
+            except (OSError, ValueError, KeyError):
+                continue
+        return sorted(entries, key=lambda e: e[2])
+
+    @property
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            for key, _, _ in self.entries():
+                shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
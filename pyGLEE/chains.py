@@ -0,0 +1,351 @@
+import json
+import os
+
+import numpy as np
+
+from .likelihood import free_parameters, parameter_names
+
+
+CACHE_INDEX = "columns.json"
+
+
+class QuantileSketch:
+    """
+    A class to estimate quantiles of a stream in bounded memory (a KLL-style compactor sketch).
+
+    Values enter level 0; when a level holds more than k values it is sorted and every other value
+    (from a random offset) moves up one level, where each value stands for twice as many samples.
+    Memory stays O(k log(n / k)) and the rank error is of order 1/k.
+    """
+    def __init__(self, k=2048, seed=0):
+        self.k = k
+        self.levels = []
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        self.count += len(values)
+        h = 0
+        while len(values):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            buf = np.concatenate([self.levels[h], values])
+            if len(buf) <= self.k:
+                self.levels[h] = buf
+                return
+            buf.sort()
+            keep = buf[-1:] if len(buf) % 2 else buf[:0]
+            values = buf[self._rng.integers(2):len(buf) - len(keep):2]
+            self.levels[h] = keep
+            h += 1
+
+    def quantile(self, q):
+        """
+        Returns the estimated q-quantile(s), q in [0, 1].
+        """
+        if not self.count:
+            return np.full(np.shape(q), np.nan)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0**h) for h, level in enumerate(self.levels)])
+        order = np.argsort(values)
+        values, weights = values[order], weights[order]
+        ranks = np.cumsum(weights) - weights / 2
+        return np.interp(np.asarray(q) * weights.sum(), ranks, values)
+
+
+class ChainStatistics:
+    """
+    A class to accumulate statistics of chain samples chunk by chunk.
+
+    Attributes
+    ----------
+    names : list of str
+        The parameter column names.
+    count : int
+        The number of samples seen.
+    mean : numpy.ndarray
+        The running mean per column.
+    accepted : int
+        The number of chain transitions in which the parameters changed.
+    transitions : int
+        The number of chain transitions seen.
+    """
+    def __init__(self, names, batch_size=1000, sketch_k=2048):
+        n = len(names)
+        self.names = list(names)
+        self.batch_size = batch_size
+        self.count = 0
+        self.mean = np.zeros(n)
+        self._m2 = np.zeros(n)
+        self.sketches = [QuantileSketch(sketch_k, seed=i) for i in range(n)]
+        self.accepted = 0
+        self.transitions = 0
+        self._last = {}
+        self._partial = {}
+        self._batches = 0
+        self._batch_mean = np.zeros(n)
+        self._batch_m2 = np.zeros(n)
+
+    def _add_moments(self, x):
+        # Chan et al. pairwise update of mean and sum of squared deviations.
+        m = len(x)
+        if not m:
+            return
+        mean = x.mean(axis=0)
+        m2 = ((x - mean) ** 2).sum(axis=0)
+        n = self.count
+        delta = mean - self.mean
+        self.count = n + m
+        self.mean = self.mean + delta * m / self.count
+        self._m2 = self._m2 + m2 + delta**2 * n * m / self.count
+
+    def _add_batch_means(self, means):
+        m = len(means)
+        if not m:
+            return
+        mean = means.mean(axis=0)
+        m2 = ((means - mean) ** 2).sum(axis=0)
+        n = self._batches
+        delta = mean - self._batch_mean
+        self._batches = n + m
+        self._batch_mean = self._batch_mean + delta * m / self._batches
+        self._batch_m2 = self._batch_m2 + m2 + delta**2 * n * m / self._batches
+
+    def update(self, x, chain=None):
+        """
+        Add samples.
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            Samples of shape (m, n_params), in time order within each chain.
+        chain : numpy.ndarray, optional
+            The chain index of every row. Defaults to a single chain.
+        """
+        x = np.asarray(x, dtype=float)
+        self._add_moments(x)
+        for k, sketch in enumerate(self.sketches):
+            sketch.update(x[:, k])
+        if chain is None:
+            chain = np.zeros(len(x), dtype=int)
+        order = np.argsort(chain, kind="stable")
+        ids, starts = np.unique(chain[order], return_index=True)
+        B = self.batch_size
+        for c, rows in zip(ids.tolist(), np.split(x[order], starts[1:])):
+            previous = self._last.get(c)
+            seq = rows if previous is None else np.vstack([previous, rows])
+            self.accepted += int(np.any(seq[1:] != seq[:-1], axis=1).sum())
+            self.transitions += len(seq) - 1
+            self._last[c] = rows[-1:]
+            total, filled = self._partial.get(c, (np.zeros(x.shape[1]), 0))
+            need = B - filled
+            if len(rows) < need:
+                self._partial[c] = (total + rows.sum(axis=0), filled + len(rows))
+                continue
+            means = [(total + rows[:need].sum(axis=0)) / B]
+            rest = rows[need:]
+            full = len(rest) // B * B
+            if full:
+                means.extend(rest[:full].reshape(-1, B, x.shape[1]).mean(axis=1))
+            self._add_batch_means(np.array(means))
+            self._partial[c] = (rest[full:].sum(axis=0), len(rest) - full)
+
+    @property
+    def variance(self):
+        return self._m2 / max(1, self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def acceptance(self):
+        return self.accepted / self.transitions if self.transitions else np.nan
+
+    def quantile(self, q):
+        """
+        Returns the estimated q-quantile(s) of every column, of shape (n_params,) + shape(q).
+        """
+        return np.array([sketch.quantile(q) for sketch in self.sketches])
+
+    def autocorrelation_time(self):
+        """
+        Returns the integrated autocorrelation time of every column, by the batch means method:
+        tau = batch_size * var(batch means) / var(samples).
+        """
+        if self._batches < 2:
+            return np.full(len(self.names), np.nan)
+        batch_var = self._batch_m2 / (self._batches - 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.batch_size * batch_var / self.variance
+
+    def summary(self):
+        """
+        Returns a dict of name to (mean, std, 16%, 50%, 84% quantiles, autocorrelation time).
+        """
+        q = self.quantile([0.16, 0.5, 0.84])
+        tau = self.autocorrelation_time()
+        return {name: (self.mean[k], self.std[k], *q[k], tau[k]) for k, name in enumerate(self.names)}
+
+
+class ChainReader:
+    """
+    A class to stream a chain file in chunks without loading it whole.
+
+    The columns are named from the file's '#' header line if it has one (as written by ChainWriter),
+    else from the free parameters of the originating GleeConfig preceded by the `leading` columns
+    (e.g. chi2). A binary columnar cache written by `to_cache` is opened the same way and its
+    columns are memory-mapped.
+
+    Attributes
+    ----------
+    path : str
+        The chain file or cache directory.
+    names : list of str
+        The column names.
+    """
+    def __init__(self, path, config=None, leading=("chi2",)):
+        self.path = path
+        self._cache = None
+        if os.path.isdir(path):
+            with open(os.path.join(path, CACHE_INDEX)) as f:
+                index = json.load(f)
+            self.names = index["names"]
+            self._cache = [np.memmap(os.path.join(path, f"{k}.f64"), dtype=np.float64, mode="r",
+                                     shape=(index["rows"],)) for k in range(len(self.names))]
+            return
+        names = None
+        with open(path) as f:
+            for line in f:
+                if line.startswith("#"):
+                    names = line[1:].split()
+                    continue
+                if line.strip():
+                    ncol = len(line.split())
+                    break
+            else:
+                ncol = len(names or [])
+        if names is None:
+            if config is not None:
+                names = list(leading) + parameter_names(free_parameters(config))
+            else:
+                names = [f"col{k}" for k in range(ncol)]
+        if len(names) != ncol:
+            raise ValueError(f"{path} has {ncol} columns but {len(names)} names")
+        self.names = names
+
+    @property
+    def rows(self):
+        """
+        The number of rows; only known without a pass for a cache.
+        """
+        if self._cache is not None:
+            return len(self._cache[0])
+        return sum(1 for _ in self.chunks())
+
+    def column(self, name):
+        """
+        Returns a memory-mapped column of a cache.
+        """
+        if self._cache is None:
+            raise ValueError("columns can only be memory-mapped from a cache, see to_cache")
+        return self._cache[self.names.index(name)]
+
+    def chunks(self, chunk_rows=100000):
+        """
+        Yield the rows as arrays of shape (<= chunk_rows, n_columns).
+        """
+        if self._cache is not None:
+            for start in range(0, self.rows, chunk_rows):
+                yield np.column_stack([c[start:start + chunk_rows] for c in self._cache])
+            return
+        ncol = len(self.names)
+        with open(self.path) as f:
+            while True:
+                lines = []
+                for line in f:
+                    if line.strip() and not line.startswith("#"):
+                        lines.append(line)
+                        if len(lines) == chunk_rows:
+                            break
+                if not lines:
+                    return
+                yield np.array("".join(lines).split(), dtype=float).reshape(-1, ncol)
+
+    def samples(self, columns, burn=0, chunk_rows=100000):
+        """
+        Yield the named columns chunk by chunk, after burn-in.
+
+        Rows with a step column below burn are skipped (the first burn rows without a step column).
+
+        Yields
+        ------
+        tuple of (numpy.ndarray, numpy.ndarray or None)
+            The samples of shape (m, len(columns)) and the chain index of each row, None without a chain column.
+        """
+        missing = [c for c in columns if c not in self.names]
+        if missing:
+            raise ValueError(f"{self.path} has no columns {missing}")
+        duplicated = sorted({c for c in columns if self.names.count(c) > 1})
+        if duplicated:
+            raise ValueError(f"{self.path} has more than one column named {duplicated}")
+        index = [self.names.index(c) for c in columns]
+        step = self.names.index("step") if "step" in self.names else None
+        chain = self.names.index("chain") if "chain" in self.names else None
+        seen = 0
+        for block in self.chunks(chunk_rows):
+            if step is not None:
+                block = block[block[:, step] >= burn]
+            elif seen < burn:
+                skip = min(burn - seen, len(block))
+                seen += skip
+                block = block[skip:]
+            if len(block):
+                yield block[:, index], None if chain is None else block[:, chain].astype(int)
+
+    def statistics(self, columns=None, burn=0, chunk_rows=100000, batch_size=1000, sketch_k=2048):
+        """
+        Compute the statistics of the chain in one streaming pass.
+
+        Parameters
+        ----------
+        columns : list of str, optional
+            The columns to summarise. Defaults to all columns except step, chain and chi2.
+        burn : int, optional
+            The burn-in to skip, see samples.
+        chunk_rows : int, optional
+            The number of rows read at once.
+        batch_size, sketch_k : int, optional
+            See ChainStatistics and QuantileSketch.
+
+        Returns
+        -------
+        ChainStatistics
+        """
+        if columns is None:
+            columns = [n for n in self.names if n not in ("step", "chain", "chi2")]
+        stats = ChainStatistics(columns, batch_size, sketch_k)
+        for x, chain in self.samples(columns, burn, chunk_rows):
+            stats.update(x, chain)
+        return stats
+
+    def to_cache(self, directory, chunk_rows=100000):
+        """
+        Write the chain as a binary columnar cache (one float64 file per column) and return its reader.
+        """
+        os.makedirs(directory, exist_ok=True)
+        files = [open(os.path.join(directory, f"{k}.f64"), "wb") for k in range(len(self.names))]
+        rows = 0
+        try:
+            for block in self.chunks(chunk_rows):
+                for k, f in enumerate(files):
+                    np.ascontiguousarray(block[:, k], dtype=np.float64).tofile(f)
+                rows += len(block)
+        finally:
+            for f in files:
+                f.close()
+        with open(os.path.join(directory, CACHE_INDEX), "w") as f:
+            json.dump({"names": self.names, "rows": rows}, f)
+        return ChainReader(directory)
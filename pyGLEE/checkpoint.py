@@ -0,0 +1,132 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from .instrument import span, count
+
+
+CHECKPOINT_VERSION = 1
+
+
+class Checkpoint:
+    """
+    A class to save and restore the state of a Python sampler, so an interrupted run continues where it stopped.
+
+    A checkpoint is one compressed .npz file holding the state arrays of the sampler and a JSON 'meta'
+    entry with the sampler kind, the number of completed steps, the random generator state, the
+    configfile text and the sampler's own scalars. It is written to a temporary file next to path and
+    renamed over it, so a run killed while saving leaves the previous checkpoint intact.
+
+    Samplers save every `every` steps, and also once `seconds` have passed since the last save, and
+    always at the end of a run. Resuming from the final checkpoint of a finished run takes no steps.
+
+    Attributes
+    ----------
+    path : str
+        The checkpoint file.
+    every : int or None
+        The number of steps between saves, None to save only on time.
+    seconds : float or None
+        The wall time between saves, None to save only on steps.
+    """
+    def __init__(self, path, every=1000, seconds=None):
+        if every is not None and (not isinstance(every, int) or every < 1):
+            raise ValueError("every must be a positive int or None")
+        if seconds is not None and seconds <= 0:
+            raise ValueError("seconds must be positive or None")
+        self.path = os.path.abspath(path)
+        self.every = every
+        self.seconds = seconds
+        self._saved = time.monotonic()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def due(self, step):
+        """
+        Returns True when a save is due after `step` completed steps.
+        """
+        if self.every is not None and step % self.every == 0:
+            return True
+        return self.seconds is not None and time.monotonic() - self._saved >= self.seconds
+
+    def save(self, kind, config, step, rng, arrays, **state):
+        """
+        Write a checkpoint atomically.
+
+        Parameters
+        ----------
+        kind : str
+            The sampler, 'siman' or 'mcmc'.
+        config : GleeConfig
+            The configuration being sampled.
+        step : int
+            The number of completed steps.
+        rng : numpy.random.Generator
+            The random generator, whose state is saved.
+        arrays : dict of str to numpy.ndarray
+            The state arrays.
+        **state
+            JSON-serialisable scalars of the sampler.
+        """
+        meta = dict(version=CHECKPOINT_VERSION, kind=kind, step=step, rng=rng.bit_generator.state,
+                    config=config.as_string(), state=state, saved=time.time())
+        staging = f"{self.path}.{os.getpid()}.tmp"
+        with span("checkpoint.write", kind=kind, step=step):
+            with open(staging, "wb") as f:
+                np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(staging, self.path)
+        count("checkpoint.writes")
+        self._saved = time.monotonic()
+
+    def load(self):
+        """
+        Returns (meta, arrays) of the checkpoint file.
+        """
+        with np.load(self.path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+        if meta.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{self.path} is not a version {CHECKPOINT_VERSION} checkpoint")
+        return meta, arrays
+
+    def restore(self, kind, config, rng):
+        """
+        Load the checkpoint of a run of `kind` on `config` and set rng to its saved state.
+
+        Returns
+        -------
+        tuple or None
+            (step, state, arrays), or None if there is no checkpoint file yet.
+
+        Raises
+        ------
+        ValueError
+            If the checkpoint was written by another sampler, for another configuration or with
+            another kind of random generator.
+        """
+        if not self.exists():
+            return None
+        meta, arrays = self.load()
+        if meta["kind"] != kind:
+            raise ValueError(f"{self.path} is a {meta['kind']} checkpoint, not {kind}")
+        if meta["config"] != config.as_string():
+            raise ValueError(f"{self.path} was written for another configuration; see resume_config")
+        if meta["rng"]["bit_generator"] != rng.bit_generator.state["bit_generator"]:
+            raise ValueError(f"{self.path} holds a {meta['rng']['bit_generator']} generator state")
+        rng.bit_generator.state = meta["rng"]
+        count("checkpoint.restores")
+        return meta["step"], meta["state"], arrays
+
+
+def resume_config(path):
+    """
+    Returns the GleeConfig a checkpoint was written for, to rebuild the sampler that resumes it.
+    """
+    from .GleeConfig import GleeConfig
+    meta, _ = Checkpoint(path).load()
+    return GleeConfig.from_string(meta["config"])
@@ -0,0 +1,88 @@
+import numpy as np
+
+from .fits_data import open_fits
+
+
+class MaskedChi2:
+    """
+    A class to compute the extended-image chi2 (chi2type 16) over the masked pixels only.
+
+    The selected pixels are indexed once; the data and the weights 1/err^2 are stored as contiguous
+    1-D arrays over those pixels, so scoring a model reads only the masked fraction of the frame.
+    Pixels with a non-positive or non-finite error are left out.
+
+    Attributes
+    ----------
+    shape : tuple of int
+        The (ny, nx) shape of the full images.
+    index : numpy.ndarray
+        The flat indices of the selected pixels.
+    data : numpy.ndarray
+        The data of the selected pixels.
+    weight : numpy.ndarray
+        1/err^2 of the selected pixels.
+    """
+    def __init__(self, data, err, mask):
+        data = np.asarray(data, dtype=float)
+        err = np.asarray(err, dtype=float)
+        mask = np.asarray(mask)
+        if data.ndim != 2 or data.shape != err.shape or data.shape != mask.shape:
+            raise ValueError("data, err and mask must be 2-D images of the same shape")
+        selected = (mask != 0) & np.isfinite(err) & (err > 0) & np.isfinite(data)
+        self.shape = data.shape
+        self.index = np.flatnonzero(selected)
+        self.data = np.ascontiguousarray(data.ravel()[self.index])
+        self.weight = np.ascontiguousarray(err.ravel()[self.index] ** -2.0)
+
+    @classmethod
+    def from_esource(cls, esource, masks=("arcmask", "lensmask")):
+        """
+        Build the chi2 of an ESource from its data and err files.
+
+        Parameters
+        ----------
+        esource : ESource
+            The extended source.
+        masks : tuple of str, optional
+            The ESource mask attributes whose union selects the pixels. Defaults to ("arcmask", "lensmask").
+        """
+        if not masks:
+            raise ValueError("at least one mask is needed")
+        mask = np.zeros(open_fits(esource.data).shape, dtype=bool)
+        for name in masks:
+            if name not in ("arcmask", "lensmask"):
+                raise ValueError("masks must be 'arcmask' and/or 'lensmask'")
+            mask |= open_fits(getattr(esource, name)).data != 0
+        return cls(open_fits(esource.data).data, open_fits(esource.err).data, mask)
+
+    @property
+    def npix(self):
+        return len(self.index)
+
+    def pack(self, images):
+        """
+        Returns the selected pixels of images (..., ny, nx) as an array (..., npix).
+        """
+        images = np.asarray(images)
+        if images.shape[-2:] != self.shape:
+            raise ValueError(f"images must have shape (..., {self.shape[0]}, {self.shape[1]})")
+        return images.reshape(images.shape[:-2] + (-1,))[..., self.index]
+
+    def chi2(self, models, packed=False):
+        """
+        Compute the chi2 of model images.
+
+        Parameters
+        ----------
+        models : numpy.ndarray
+            Model images of shape (ny, nx) or (N, ny, nx), or already packed (npix,) or (N, npix).
+        packed : bool, optional
+            Whether models are already packed. Defaults to False.
+
+        Returns
+        -------
+        float or numpy.ndarray
+            The chi2, one value per model for a batch.
+        """
+        residual = (np.asarray(models) if packed else self.pack(models)) - self.data
+        return np.einsum("...i,...i,i->...", residual, residual, self.weight)
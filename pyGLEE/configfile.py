@@ -0,0 +1,347 @@
+import glob
+import os
+
+from .header import Header
+from .optimisers import Optimisers, SimanParameters, McmcParameters, PtmcmcParameters, CovarianceMatrix
+from .esource import ESource
+from .light_profiles import LIGHT_PROFILES
+from .mass_profiles import MASS_PROFILES
+from .point_sources import PointSource, PointImage
+from .priors import FlatPrior, ExactPrior, NoPrior, GaussianPrior
+from .instrument import traced
+
+
+SIMAN_KEYS = ("siman_iter", "siman_nT", "siman_dS", "siman_Sf", "siman_k", "siman_Ti", "siman_Tf", "siman_Tmin")
+MCMC_KEYS = ("mcmc_n", "mcmc_dS", "mcmc_dSini", "mcmc_k")
+PTMCMC_KEYS = ("ptmcmc_n", "ptmcmc_dS", "ptmcmc_k", "ptmcmc_nT", "ptmcmc_Tmax", "ptmcmc_swap")
+COV_KEYS = ("sampling_f", "sampling_cov")
+
+# ESource keywords holding a plain value, with the converter applied to the token.
+ESOURCE_KEYS = {
+    "ngy": int,
+    "ngx": int,
+    "dx": "number",
+    "data": str,
+    "err": str,
+    "arcmask": str,
+    "lensmask": str,
+    "mod_light": str,
+    "psf": str,
+    "sub_agn_psf": str,
+    "sub_agn_psf_factor": int,
+    "sub_esr_psf": str,
+    "sub_esr_psf_factor": int,
+    "regopt": str,
+    "reglampre": int,
+    "reglamnup": int,
+    "regtype": str,
+    "reglam": int,
+    "reglamlo": "number",
+    "reglamhi": int,
+}
+# ESource keywords holding a value followed by a prior.
+ESOURCE_PRIOR_KEYS = ("z", "dds_ds")
+# PointSource keywords holding a value followed by a prior.
+PSOURCE_PRIOR_KEYS = ("z", "dds_ds", "x", "y", "ddt")
+
+
+def number(token):
+    """
+    Convert a configfile token to an int if it has no fractional part or exponent, to a float otherwise.
+
+    Keeping ints as ints means `str(number(token)) == token` for every token written by `as_string`.
+    """
+    try:
+        return int(token)
+    except ValueError:
+        return float(token)
+
+
+def _convert(token, converter, lineno):
+    try:
+        if converter == "number":
+            return number(token)
+        return converter(token)
+    except ValueError:
+        raise ValueError(f"line {lineno}: cannot read '{token}' as {getattr(converter, '__name__', converter)}") from None
+
+
+def parse_prior(mean, tokens, lineno=None):
+    """
+    Build a Prior from the tokens following a parameter value.
+
+    Parameters
+    ----------
+    mean : int or float
+        The value written in front of the prior.
+    tokens : list of str
+        Whitespace separated tokens, e.g. ['flat:-1.0,1.0', 'label:x', 'step:0.1'].
+        Tokens which are not part of the prior (such as '#x-coord' comments) are ignored.
+    lineno : int, optional
+        Line number used in error messages.
+
+    Returns
+    -------
+    Prior
+        A FlatPrior, ExactPrior, NoPrior or GaussianPrior.
+    """
+    kind = None
+    bounds = ""
+    options = {}
+    for tok in tokens:
+        key, sep, value = tok.partition(":")
+        if not sep:
+            continue
+        if kind is None:
+            if key in ("flat", "exact", "noprior", "gaussian"):
+                kind, bounds = key, value
+            continue
+        if key in ("label", "link"):
+            options[key] = value
+        elif key in ("min", "step"):
+            options[key] = _convert(value, "number", lineno)
+        elif key == "a":
+            link_a = [_convert(v, "number", lineno) for v in value.split(",")]
+            if len(link_a) != 3:
+                raise ValueError(f"line {lineno}: link parameter 'a' needs three numbers, got '{value}'")
+            options["link_a"] = link_a
+    if kind is None:
+        raise ValueError(f"line {lineno}: no prior (flat/exact/noprior/gaussian) found")
+
+    if kind in ("flat", "gaussian"):
+        values = [_convert(v, "number", lineno) for v in bounds.split(",")]
+        if len(values) != 2:
+            raise ValueError(f"line {lineno}: {kind} prior needs two numbers, got '{bounds}'")
+        if kind == "flat":
+            return FlatPrior(mean, values[0], values[1], **options)
+        return GaussianPrior(mean, values[1], centre=values[0], **options)
+    if kind == "exact":
+        return ExactPrior(mean, **options)
+    return NoPrior(mean, **options)
+
+
+def _tokenize(lines):
+    """Yield (lineno, tokens) for every non-empty, non-comment line."""
+    for lineno, line in enumerate(lines, 1):
+        tokens = line.split()
+        if not tokens or tokens[0].startswith("#"):
+            continue
+        yield lineno, tokens
+
+
+def _parse_profiles(stream, n, profiles, kind, where):
+    """Parse n profile blocks: a profile keyword, then one value and prior per parameter."""
+    parsed = []
+    for _ in range(n):
+        lineno, tokens = next(stream, (None, None))
+        if tokens is None:
+            raise ValueError(f"{where}: expected {n} {kind}s, file ended")
+        profile = profiles.get(tokens[0])
+        if profile is None:
+            raise ValueError(f"line {lineno}: unknown {kind} '{tokens[0]}'")
+        priors = {}
+        for name in profile.parameters:
+            lineno, tokens = next(stream, (None, None))
+            if tokens is None:
+                raise ValueError(f"{where}: {kind} '{profile.glee_name}' is missing '{name}'")
+            priors[name] = parse_prior(_convert(tokens[0], "number", lineno), tokens[1:], lineno)
+        parsed.append(profile(**priors))
+    return parsed
+
+
+def _parse_esource(stream, index):
+    fields = {}
+    for lineno, tokens in stream:
+        key = tokens[0]
+        if key == "esource_light":
+            n_light = _convert(tokens[1], int, lineno)
+            break
+        if key in ESOURCE_PRIOR_KEYS:
+            fields[key] = parse_prior(_convert(tokens[1], "number", lineno), tokens[2:], lineno)
+        elif key in ESOURCE_KEYS:
+            if len(tokens) < 2:
+                raise ValueError(f"line {lineno}: '{key}' has no value")
+            fields[key] = _convert(tokens[1], ESOURCE_KEYS[key], lineno)
+        else:
+            raise ValueError(f"line {lineno}: unknown esource keyword '{key}'")
+    else:
+        raise ValueError(f"esource {index}: missing 'esource_light'")
+
+    light_profiles = _parse_profiles(stream, n_light, LIGHT_PROFILES, "light profile", f"esource {index}")
+
+    lineno, tokens = next(stream, (None, None))
+    if tokens is None or tokens[0] != "esource_end":
+        raise ValueError(f"esource {index}: expected 'esource_end'" + (f" at line {lineno}" if lineno else ""))
+
+    missing = [key for key in ESOURCE_KEYS if key != "mod_light" and key not in fields]
+    if missing:
+        raise ValueError(f"esource {index}: missing {', '.join(missing)}")
+    return ESource(light_profiles=light_profiles, **fields)
+
+
+def _parse_image(tokens, lineno):
+    """Parse a point image line: x, y and sigma, then optional 'flux:f,sigma' and 'delay:t,sigma'."""
+    if len(tokens) < 3:
+        raise ValueError(f"line {lineno}: a point image needs x, y and sigma")
+    x, y, sigma = (_convert(token, "number", lineno) for token in tokens[:3])
+    options = {}
+    for tok in tokens[3:]:
+        key, sep, value = tok.partition(":")
+        if key not in ("flux", "delay") or not sep:
+            raise ValueError(f"line {lineno}: unknown image option '{tok}'")
+        values = [_convert(v, "number", lineno) for v in value.split(",")]
+        if len(values) != 2:
+            raise ValueError(f"line {lineno}: {key} needs a value and a sigma, got '{value}'")
+        options[key], options[f"sigma_{key}"] = values
+    return PointImage(x, y, sigma, **options)
+
+
+def _parse_point_source(stream, index):
+    fields = {}
+    for lineno, tokens in stream:
+        key = tokens[0]
+        if key == "psource_images":
+            n_images = _convert(tokens[1], int, lineno)
+            break
+        if key in PSOURCE_PRIOR_KEYS:
+            if len(tokens) < 2:
+                raise ValueError(f"line {lineno}: '{key}' has no value")
+            fields[key] = parse_prior(_convert(tokens[1], "number", lineno), tokens[2:], lineno)
+        else:
+            raise ValueError(f"line {lineno}: unknown psource keyword '{key}'")
+    else:
+        raise ValueError(f"psource {index}: missing 'psource_images'")
+
+    images = []
+    for _ in range(n_images):
+        lineno, tokens = next(stream, (None, None))
+        if tokens is None:
+            raise ValueError(f"psource {index}: expected {n_images} images, file ended")
+        images.append(_parse_image(tokens, lineno))
+
+    lineno, tokens = next(stream, (None, None))
+    if tokens is None or tokens[0] != "psource_end":
+        raise ValueError(f"psource {index}: expected 'psource_end'" + (f" at line {lineno}" if lineno else ""))
+
+    missing = [key for key in ("x", "y") if key not in fields]
+    if missing:
+        raise ValueError(f"psource {index}: missing {', '.join(missing)}")
+    return PointSource(images=images, **fields)
+
+
+@traced("config.parse")
+def parse_lines(lines):
+    """
+    Parse a GLEE configfile in a single pass over its lines.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        The lines of the configfile, e.g. an open file object.
+
+    Returns
+    -------
+    GleeConfig
+        The configuration described by the lines.
+    """
+    from .GleeConfig import GleeConfig
+
+    stream = _tokenize(lines)
+    header = {}
+    siman = {}
+    mcmc = {}
+    ptmcmc = {}
+    cov = {}
+    e_source_list = []
+    lenses = []
+    point_sources = []
+    n_esources = None
+    for lineno, tokens in stream:
+        key = tokens[0]
+        if key == "lenses":
+            lenses = _parse_profiles(stream, _convert(tokens[1], int, lineno), MASS_PROFILES, "mass profile", "lenses")
+            continue
+        if key == "psources":
+            for i in range(_convert(tokens[1], int, lineno)):
+                point_sources.append(_parse_point_source(stream, i))
+            continue
+        if key == "esources":
+            n_esources = _convert(tokens[1], int, lineno)
+            for i in range(n_esources):
+                e_source_list.append(_parse_esource(stream, i))
+            continue
+        if len(tokens) < 2:
+            raise ValueError(f"line {lineno}: '{key}' has no value")
+        if key in ("chi2type", "seed"):
+            header[key] = _convert(tokens[1], int, lineno)
+        elif key == "minimiser":
+            header[key] = tokens[1]
+        elif key in SIMAN_KEYS:
+            siman[key] = _convert(tokens[1], "number", lineno)
+        elif key in MCMC_KEYS:
+            mcmc[key] = _convert(tokens[1], "number", lineno)
+        elif key in PTMCMC_KEYS:
+            ptmcmc[key] = _convert(tokens[1], "number", lineno)
+        elif key in COV_KEYS:
+            cov[key] = tokens[1]
+        else:
+            raise ValueError(f"line {lineno}: unknown keyword '{key}'")
+
+    if n_esources is None:
+        raise ValueError("missing 'esources'")
+    for name, block, keys in (("header", header, ("chi2type", "minimiser", "seed")),
+                              ("siman", siman, SIMAN_KEYS),
+                              ("mcmc", mcmc, MCMC_KEYS),
+                              ("ptmcmc", ptmcmc, PTMCMC_KEYS if ptmcmc else ())):
+        missing = [key for key in keys if key not in block]
+        if missing:
+            raise ValueError(f"{name} is missing {', '.join(missing)}")
+    cov_matrix = CovarianceMatrix(**cov) if cov else None
+    ptmcmc_params = PtmcmcParameters(**ptmcmc) if ptmcmc else None
+    optimisers = Optimisers(SimanParameters(**siman), McmcParameters(**mcmc), cov_matrix, ptmcmc_params)
+    return GleeConfig(Header(optimisers=optimisers, **header), e_source_list, lenses, point_sources)
+
+
+def parse_string(text):
+    """
+    Parse a GLEE configfile given as a string.
+    """
+    return parse_lines(text.splitlines())
+
+
+def parse_file(path):
+    """
+    Parse a GLEE configfile from disk, streaming it line by line.
+    """
+    with open(path) as f:
+        return parse_lines(f)
+
+
+def parse_directory(path, pattern="*", processes=None):
+    """
+    Parse every configfile in a directory.
+
+    Parameters
+    ----------
+    path : str
+        The directory containing the configfiles.
+    pattern : str, optional
+        Glob pattern selecting the configfiles. Defaults to "*".
+    processes : int, optional
+        Number of worker processes. Defaults to None, parsing in this process.
+
+    Yields
+    ------
+    tuple of (str, GleeConfig)
+        The file path and its configuration, in sorted path order.
+    """
+    paths = sorted(p for p in glob.glob(os.path.join(path, pattern)) if os.path.isfile(p))
+    if not processes:
+        for p in paths:
+            yield p, parse_file(p)
+        return
+    from multiprocessing import Pool
+    with Pool(processes) as pool:
+        yield from zip(paths, pool.imap(parse_file, paths, chunksize=max(1, len(paths) // (4 * processes))))
+        pool.close()
+        pool.join()
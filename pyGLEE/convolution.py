@@ -0,0 +1,224 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .light_profiles import PSF
+from .fits_data import open_fits
+
+
+def next_fast_len(n):
+    """
+    Returns the smallest 2^a 3^b 5^c >= n, a size the FFT handles efficiently.
+    """
+    best = 2 * n
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p235 = p35
+            while p235 < n:
+                p235 *= 2
+            best = min(best, p235)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def read_psf(path):
+    """
+    Returns the pixels of a PSF .fits file, from the shared memory-mapped handle.
+    """
+    return open_fits(path).data
+
+
+def read_psf_shape(path):
+    """
+    Returns the shape of a PSF .fits file without reading its pixels.
+    """
+    return open_fits(path).shape
+
+
+def kernel_fft(kernel, padded_shape):
+    """
+    Returns the real FFT of a normalised kernel, zero padded to padded_shape and centred on pixel (0, 0).
+    """
+    kernel = np.asarray(kernel, dtype=float)
+    if kernel.ndim != 2:
+        raise ValueError("the PSF must be a 2-D image")
+    total = kernel.sum()
+    if total <= 0:
+        raise ValueError("the PSF must have a positive sum")
+    ky, kx = kernel.shape
+    padded = np.zeros(padded_shape)
+    padded[:ky, :kx] = kernel / total
+    padded = np.roll(padded, (-(ky // 2), -(kx // 2)), axis=(0, 1))
+    spectrum = np.fft.rfft2(padded)
+    spectrum.setflags(write=False)
+    return spectrum
+
+
+@lru_cache(maxsize=16)
+def _cached_kernel_fft(path, mtime, padded_shape):
+    return kernel_fft(read_psf(path), padded_shape)
+
+
+def _padded_shape(image_shape, kernel_shape):
+    return tuple(next_fast_len(n + k - 1) for n, k in zip(image_shape, kernel_shape))
+
+
+class Convolver:
+    """
+    A class to convolve images of a fixed shape with a PSF through real FFTs.
+
+    The padded input, spectrum and output buffers are allocated on the first call and reused as long
+    as the batch size does not change, so repeated convolutions in a fitting loop do not reallocate them.
+
+    Attributes
+    ----------
+    image_shape : tuple of int
+        The (ny, nx) shape of the images to convolve.
+    padded_shape : tuple of int
+        The shape the images are zero padded to.
+    """
+    def __init__(self, spectrum, image_shape, padded_shape):
+        self.image_shape = tuple(image_shape)
+        self.padded_shape = tuple(padded_shape)
+        if spectrum.shape != (self.padded_shape[0], self.padded_shape[1] // 2 + 1):
+            raise ValueError("spectrum does not match padded_shape")
+        self._kernel = spectrum
+        self._batch = None
+
+    @classmethod
+    def from_array(cls, kernel, image_shape):
+        """
+        Build a Convolver for a PSF given as a 2-D array.
+        """
+        kernel = np.asarray(kernel)
+        padded_shape = _padded_shape(image_shape, kernel.shape)
+        return cls(kernel_fft(kernel, padded_shape), image_shape, padded_shape)
+
+    @classmethod
+    def from_file(cls, path, image_shape):
+        """
+        Build a Convolver for a PSF .fits file.
+
+        The kernel FFT is cached per (PSF file, padded shape) with LRU eviction, and re-read if the file changes.
+        """
+        path = os.path.abspath(path)
+        padded_shape = _padded_shape(image_shape, read_psf_shape(path))
+        spectrum = _cached_kernel_fft(path, os.stat(path).st_mtime_ns, padded_shape)
+        return cls(spectrum, image_shape, padded_shape)
+
+    def _workspace(self, n):
+        if self._batch != n:
+            py, px = self.padded_shape
+            self._real = np.zeros((n, py, px))
+            self._spectrum = np.empty((n, py, px // 2 + 1), dtype=complex)
+            self._out = np.empty((n, py, px))
+            self._batch = n
+        return self._real, self._spectrum, self._out
+
+    def convolve(self, images):
+        """
+        Convolve images with the PSF.
+
+        Parameters
+        ----------
+        images : numpy.ndarray
+            Array of shape (..., ny, nx).
+
+        Returns
+        -------
+        numpy.ndarray
+            The convolved images, same shape as images.
+        """
+        images = np.asarray(images)
+        if images.shape[-2:] != self.image_shape:
+            raise ValueError(f"images must have shape (..., {self.image_shape[0]}, {self.image_shape[1]})")
+        ny, nx = self.image_shape
+        flat = images.reshape((-1, ny, nx))
+        real, spectrum, out = self._workspace(len(flat))
+        # Only the image region is written, the padding stays zero.
+        real[:, :ny, :nx] = flat
+        np.fft.rfft2(real, out=spectrum)
+        spectrum *= self._kernel
+        # irfft2 does not honour out= for 2-D transforms, so the inverse is done one axis at a time.
+        np.fft.ifft(spectrum, axis=-2, out=spectrum)
+        np.fft.irfft(spectrum, n=self.padded_shape[1], axis=-1, out=out)
+        return out[:, :ny, :nx].reshape(images.shape).copy()
+
+
+class ModelImage:
+    """
+    A class to render the PSF-convolved model image of an ESource.
+
+    The light profiles of a LensOnly ESource are lens light: they are rendered on the data grid and
+    convolved with psf. Extended light profiles of other ESources are lensed-source light, rendered
+    on the grid subsampled by sub_esr_psf_factor and convolved with sub_esr_psf. Point (PSF) light
+    profiles are rendered on the grid subsampled by sub_agn_psf_factor and convolved with sub_agn_psf.
+    Every component is block-averaged back to the ngx x ngx data grid and the components are summed.
+
+    Attributes
+    ----------
+    esource : ESource
+        The extended source whose light profiles are rendered.
+    """
+    def __init__(self, esource):
+        self.esource = esource
+        self._stages = {}
+
+    def _stage(self, psf, factor):
+        key = (psf, factor)
+        if key not in self._stages:
+            grid = self.esource.grid(subsampling=factor)
+            self._stages[key] = (grid, Convolver.from_file(psf, grid.shape))
+        return self._stages[key]
+
+    def convolve(self, image, psf, factor=1):
+        """
+        Convolve an image on the grid subsampled by factor with a PSF file and block-average it to the data grid.
+        """
+        grid, convolver = self._stage(psf, factor)
+        return grid.block_average(convolver.convolve(image))
+
+    def kernel(self, profile):
+        """
+        Returns the (PSF file, subsampling factor) a light profile of the ESource is convolved with.
+        """
+        es = self.esource
+        if isinstance(profile, PSF):
+            return es.sub_agn_psf, es.sub_agn_psf_factor
+        if es.mod_light == "LensOnly":
+            return es.psf, 1
+        return es.sub_esr_psf, es.sub_esr_psf_factor
+
+    def render(self, params=None):
+        """
+        Render the convolved model image.
+
+        Parameters
+        ----------
+        params : list of dict, optional
+            One dict per light profile, passed to LightProfile.evaluate. Defaults to the prior means.
+
+        Returns
+        -------
+        numpy.ndarray
+            The model image, of shape (N, ngx, ngx).
+        """
+        es = self.esource
+        if params is None:
+            params = [None] * len(es.light_profiles)
+        if len(params) != len(es.light_profiles):
+            raise ValueError("params must have one entry per light profile")
+        stages = {}
+        for lp, p in zip(es.light_profiles, params):
+            psf, factor = self.kernel(lp)
+            grid, _ = self._stage(psf, factor)
+            image = lp.evaluate(grid, p)
+            stages[(psf, factor)] = stages[(psf, factor)] + image if (psf, factor) in stages else image
+        model = np.zeros((1, es.ngx, es.ngx))
+        for (psf, factor), image in stages.items():
+            model = model + self.convolve(image, psf, factor)
+        return model
@@ -0,0 +1,161 @@
+import numpy as np
+
+from .optimisers import CovarianceMatrix
+from .likelihood import free_parameters, parameter_names
+from .chains import ChainReader
+
+
+def read_cov(path):
+    """
+    Read a .cov file: a whitespace-separated square covariance matrix.
+    """
+    cov = np.atleast_2d(np.loadtxt(path, comments="#"))
+    if cov.shape[0] != cov.shape[1]:
+        raise ValueError(f"{path} does not contain a square matrix")
+    return cov
+
+
+def write_cov(path, cov):
+    """
+    Write a square covariance matrix as a .cov file.
+    """
+    cov = np.atleast_2d(cov)
+    if not path.endswith(".cov"):
+        raise ValueError("path must be a .cov file")
+    if cov.shape[0] != cov.shape[1]:
+        raise ValueError("cov must be a square matrix")
+    np.savetxt(path, cov, fmt="%.10e")
+
+
+class CovarianceEstimator:
+    """
+    A class to estimate the mean and covariance of samples streamed in chunks.
+
+    Chunks are folded in with the pairwise (Welford/Chan) update of the mean and co-moment matrix,
+    so memory is O(n_params^2) however long the chains are. Estimators of separate chains can be merged.
+
+    Attributes
+    ----------
+    count : int
+        The number of samples seen.
+    mean : numpy.ndarray
+        The sample mean, of shape (n_params,).
+    """
+    def __init__(self, n_params):
+        self.count = 0
+        self.mean = np.zeros(n_params)
+        self._comoment = np.zeros((n_params, n_params))
+
+    def _combine(self, count, mean, comoment):
+        if not count:
+            return
+        n = self.count
+        delta = mean - self.mean
+        self.count = n + count
+        self.mean = self.mean + delta * count / self.count
+        self._comoment += comoment + np.outer(delta, delta) * (n * count / self.count)
+
+    def update(self, x):
+        """
+        Add samples of shape (m, n_params).
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        if not len(x):
+            return
+        mean = x.mean(axis=0)
+        centred = x - mean
+        self._combine(len(x), mean, centred.T @ centred)
+
+    def merge(self, other):
+        """
+        Fold in the samples of another estimator, e.g. of a parallel chain.
+        """
+        if other.mean.shape != self.mean.shape:
+            raise ValueError("estimators have different numbers of parameters")
+        self._combine(other.count, other.mean, other._comoment)
+        return self
+
+    @property
+    def covariance(self):
+        if self.count < 2:
+            raise ValueError("at least two samples are needed")
+        return self._comoment / (self.count - 1)
+
+    def write(self, path):
+        """
+        Write the covariance as a .cov file.
+        """
+        write_cov(path, self.covariance)
+
+
+def chain_covariance(path, names, burn=0, config=None, chunk_rows=100000):
+    """
+    Estimate the covariance of the named columns of one chain file, streaming it in chunks.
+
+    config names the columns of chain files without a header, see ChainReader.
+    """
+    estimator = CovarianceEstimator(len(names))
+    for x, _ in ChainReader(path, config).samples(names, burn, chunk_rows):
+        estimator.update(x)
+    return estimator
+
+
+def _chain_covariance(args):
+    return chain_covariance(*args)
+
+
+def config_covariance(config, chain_paths, cov_path, sampling_f="gaussian", burn=0, processes=None,
+                      parameters=None):
+    """
+    Estimate the proposal covariance of a GleeConfig from chain files and point the config at it.
+
+    The columns are the parameters, named by label or parameter path as in the chain header. They
+    default to free_parameters(config), GLEE's parameter order, and only then is Optimisers.cov
+    pointed at the new file, since GLEE reads it. For the Python samplers pass
+    parameters=free_light_parameters(config) and hand the returned matrix to them as cov; the config
+    is then left unchanged. Chains are processed independently, optionally in worker processes, and merged.
+
+    Parameters
+    ----------
+    config : GleeConfig
+        The configuration; its Optimisers.cov is replaced by a CovarianceMatrix for cov_path when
+        the columns are its free parameters.
+    chain_paths : list of str
+        The chain files.
+    cov_path : str
+        The .cov file to write.
+    sampling_f : str, optional
+        The sampling function of the new CovarianceMatrix. Defaults to 'gaussian'.
+    burn : int, optional
+        The burn-in to skip, see ChainReader.samples.
+    processes : int, optional
+        Number of worker processes. Defaults to None, reading in this process.
+    parameters : list of tuple, optional
+        The parameters of the covariance, in order. Defaults to free_parameters(config).
+
+    Returns
+    -------
+    numpy.ndarray
+        The covariance matrix.
+    """
+    free = free_parameters(config)
+    names = parameter_names(free if parameters is None else parameters)
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"parameters share the column names {duplicated}; give them distinct labels")
+    jobs = [(p, names, burn, config) for p in chain_paths]
+    if processes:
+        from multiprocessing import Pool
+        with Pool(processes) as pool:
+            estimators = pool.map(_chain_covariance, jobs)
+            pool.close()
+            pool.join()
+    else:
+        estimators = [_chain_covariance(job) for job in jobs]
+    total = CovarianceEstimator(len(names))
+    for estimator in estimators:
+        total.merge(estimator)
+    total.write(cov_path)
+    if names == parameter_names(free):
+        config.header.optimisers.cov = CovarianceMatrix(sampling_f, cov_path)
+    return total.covariance
@@ -1,7 +1,11 @@
 from .light_profiles import *
 from .priors import *
+from .grid import PixelGrid
+from .fits_data import check_esource
+from .instrument import traced
 
 class ESource:
+    @traced("esource.construct")
     def __init__(self, 
                  ngy, 
                  ngx, 
@@ -129,12 +133,24 @@ class ESource:
         self.reglamhi = reglamhi
         self.light_profiles = light_profiles
 
+    def grid(self, subsampling=1):
+        """
+        Returns the ngx x ngx image pixel grid with pixel size dx, optionally subsampled.
+        """
+        return PixelGrid(self.ngx, self.dx, subsampling=subsampling)
+
+    def check_data(self):
+        """
+        Returns the problems found in the .fits files (see fits_data.check_esource), reading only their headers.
+        """
+        return check_esource(self)
+
     def as_string(self):
         values = []
         if self.z is not None:
             values.append(f" z        {self.z.mean}  {self.z.prior_as_string()}")
         if self.dds_ds is not None:
-            values.append(f" dds_ds      {self.dds_ds.prior_as_string()}")
+            values.append(f" dds_ds      {self.dds_ds.mean}  {self.dds_ds.prior_as_string()}")
         values.append(f" ngy          {self.ngy}")
         values.append(f" ngx          {self.ngx}")
         values.append(f" dx           {self.dx}")
@@ -0,0 +1,244 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .instrument import span, count, traced
+
+
+class FitsImage:
+    """
+    A class to represent a lazily opened, memory-mapped .fits image.
+
+    Only the header is read when the file is opened; the pixels are memory-mapped on first access
+    of `data`. Use `open_fits` to get the handle shared by every ESource referencing the same path.
+    A closed image reopens its file when `header` or `data` is accessed again, and is counted against
+    MAX_OPEN_FILES again. Opening, closing and access are guarded by a per-image lock.
+
+    Attributes
+    ----------
+    path : str
+        The absolute path of the file.
+    shape : tuple of int
+        The (ny, nx) shape of the image, read from the header.
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.mtime = os.stat(self.path).st_mtime_ns
+        self._lock = threading.Lock()
+        self._open()
+        header = self._hdu.header
+        self.shape = tuple(header[f"NAXIS{i}"] for i in range(header["NAXIS"], 0, -1))
+
+    def _open(self):
+        from astropy.io import fits
+        self._hdul = fits.open(self.path, memmap=True, lazy_load_hdus=True)
+        self._hdu = None
+        for hdu in self._hdul:
+            if hdu.header.get("NAXIS", 0) > 0:
+                self._hdu = hdu
+                break
+        if self._hdu is None:
+            self._hdul.close()
+            self._hdul = None
+            raise ValueError(f"{self.path} contains no image")
+
+    def _read(self, attribute):
+        # The header or data of the HDU, read under the lock so a concurrent close cannot intervene.
+        with self._lock:
+            reopened = self._hdul is None
+            if reopened:
+                self._open()
+            value = getattr(self._hdu, attribute)
+        if reopened:
+            _track(self)
+        return value
+
+    @property
+    def header(self):
+        return self._read("header")
+
+    @property
+    def data(self):
+        """
+        The memory-mapped pixels. Read-only views should be assumed.
+        """
+        return self._read("data")
+
+    def close(self):
+        """
+        Close the file. Arrays already read from `data` stay valid.
+        """
+        with self._lock:
+            if self._hdul is not None:
+                self._hdul.close()
+                self._hdul = None
+                self._hdu = None
+
+
+# The number of shared FitsImages kept open; the least recently used are closed beyond it, so
+# checking many configurations that reference different files does not run out of descriptors.
+MAX_OPEN_FILES = 256
+
+_handles = OrderedDict()
+_lock = threading.Lock()
+
+
+def _evict():
+    # Returns the least recently used images beyond MAX_OPEN_FILES, removed from _handles; the
+    # caller closes them after releasing _lock, since closing takes the image lock.
+    evicted = []
+    while len(_handles) > MAX_OPEN_FILES:
+        evicted.append(_handles.popitem(last=False)[1])
+        count("fits.evict")
+    return evicted
+
+
+def _track(image):
+    # Count a reopened image against MAX_OPEN_FILES again; an image superseded by a newer handle
+    # of its path is closed again right away.
+    with _lock:
+        current = _handles.get(image.path)
+        if current is None:
+            _handles[image.path] = image
+            evicted = _evict()
+        elif current is image:
+            _handles.move_to_end(image.path)
+            evicted = []
+        else:
+            evicted = [image]
+    for old in evicted:
+        old.close()
+
+
+def open_fits(path):
+    """
+    Returns the shared FitsImage for a path, opening it on first use or if the file changed on disk.
+    """
+    key = os.path.abspath(path)
+    mtime = os.stat(key).st_mtime_ns
+    evicted = []
+    with _lock:
+        image = _handles.get(key)
+        if image is None or image.mtime != mtime:
+            if image is not None:
+                evicted.append(image)
+            with span("fits.open", path=key):
+                image = _handles[key] = FitsImage(key)
+            count("fits.open")
+            evicted += _evict()
+        else:
+            count("fits.reuse")
+        _handles.move_to_end(key)
+    for old in evicted:
+        old.close()
+    return image
+
+
+def close_all():
+    """
+    Close every shared FitsImage.
+    """
+    with _lock:
+        images = list(_handles.values())
+        _handles.clear()
+    for image in images:
+        image.close()
+
+
+def _check_psf(name, path, factor, problems):
+    try:
+        shape = open_fits(path).shape
+    except (OSError, ValueError) as e:
+        problems.append(f"{name}: {e}")
+        return
+    if len(shape) != 2:
+        problems.append(f"{name}: {path} is {len(shape)}-D, expected a 2-D image")
+        return
+    for side in shape:
+        if side % factor != 0 or (side // factor) % 2 == 0:
+            problems.append(f"{name}: shape {shape} does not fit subsampling factor {factor} "
+                            f"(each side must be {factor} x an odd number)")
+            return
+
+
+def check_esource(esource):
+    """
+    Check the .fits files of an ESource against its settings, reading only their headers.
+
+    The data, err, arcmask and lensmask images must be ngx x ngx, and the PSF sides must be
+    the subsampling factor times an odd number (1 for psf).
+
+    Returns
+    -------
+    list of str
+        The problems found, empty if the files are consistent.
+    """
+    problems = []
+    for name in ("data", "err", "arcmask", "lensmask"):
+        path = getattr(esource, name)
+        try:
+            shape = open_fits(path).shape
+        except (OSError, ValueError) as e:
+            problems.append(f"{name}: {e}")
+            continue
+        if shape != (esource.ngx, esource.ngx):
+            problems.append(f"{name}: shape {shape} does not match ngx={esource.ngx}")
+    _check_psf("psf", esource.psf, 1, problems)
+    _check_psf("sub_agn_psf", esource.sub_agn_psf, esource.sub_agn_psf_factor, problems)
+    _check_psf("sub_esr_psf", esource.sub_esr_psf, esource.sub_esr_psf_factor, problems)
+    return problems
+
+
+@traced("config.check")
+def check_config(config, workers=None):
+    """
+    Check the .fits files of every ESource of a GleeConfig, and its prior links.
+
+    Parameters
+    ----------
+    config : GleeConfig
+        The configuration.
+    workers : int, optional
+        The number of threads reading headers concurrently. Defaults to None, checking the ESources in turn.
+
+    Returns
+    -------
+    list of str
+        The problems found, prefixed with the ESource index for the files.
+    """
+    from .links import check_links
+    if workers and workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(workers) as pool:
+            reports = list(pool.map(check_esource, config.e_source_list))
+    else:
+        reports = [check_esource(esource) for esource in config.e_source_list]
+    return [f"esource {i}: {problem}"
+            for i, problems in enumerate(reports)
+            for problem in problems] + check_links(config)
+
+
+def check_configfiles(paths):
+    """
+    Parse and check many configfiles. Files shared between configfiles are opened once.
+
+    Returns
+    -------
+    dict of str to list of str
+        The problems found per configfile path, only for configfiles with problems.
+    """
+    from .configfile import parse_file
+    report = {}
+    for path in paths:
+        try:
+            config = parse_file(path)
+        except (OSError, TypeError, ValueError) as e:
+            report[path] = [f"cannot parse: {e}"]
+            continue
+        try:
+            problems = check_config(config)
+        except (OSError, TypeError, ValueError) as e:
+            problems = [f"cannot check: {e}"]
+        if problems:
+            report[path] = problems
+    return report
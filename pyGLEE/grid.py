@@ -0,0 +1,108 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=8)
+def _coordinates(shape, dx):
+    ny, nx = shape
+    x = (np.arange(nx) + 0.5) * dx
+    y = (np.arange(ny) + 0.5) * dx
+    xx, yy = np.meshgrid(x, y)
+    xx.setflags(write=False)
+    yy.setflags(write=False)
+    return xx, yy
+
+
+@lru_cache(maxsize=32)
+def _elliptical_radius(shape, dx, x, y, q, pa):
+    xx, yy = _coordinates(shape, dx)
+    cos, sin = np.cos(pa), np.sin(pa)
+    u = (xx - x) * cos + (yy - y) * sin
+    v = -(xx - x) * sin + (yy - y) * cos
+    r = np.sqrt(q * u**2 + v**2 / q)
+    r.setflags(write=False)
+    return r
+
+
+class PixelGrid:
+    """
+    A class to represent the pixel grid a model is evaluated on.
+
+    Coordinates are in the units of dx (usually arcsec), with the origin at the lower-left corner of
+    the image, so the centre of pixel (j, i) is at ((i + 0.5) * dx, (j + 0.5) * dx). A subsampled
+    grid covers the same area with `subsampling` times smaller pixels on a side.
+
+    Attributes
+    ----------
+    nx : int
+        The number of pixels in the 2nd dimension.
+    ny : int
+        The number of pixels in the 1st dimension.
+    dx : float
+        The pixel size.
+    subsampling : int
+        The subsampling factor applied to nx, ny and dx.
+    """
+    def __init__(self, nx, dx, ny=None, subsampling=1):
+        if ny is None:
+            ny = nx
+        if not isinstance(nx, int) or not isinstance(ny, int) or nx <= 0 or ny <= 0:
+            raise TypeError("nx and ny must be positive ints")
+        if not isinstance(dx, (int, float)) or dx <= 0:
+            raise ValueError("dx must be a positive number")
+        if not isinstance(subsampling, int) or subsampling < 1:
+            raise ValueError("subsampling must be a positive int")
+        self.nx = nx * subsampling
+        self.ny = ny * subsampling
+        self.dx = dx / subsampling
+        self.subsampling = subsampling
+
+    @property
+    def shape(self):
+        return (self.ny, self.nx)
+
+    def coordinates(self):
+        """
+        Returns the (read-only, cached) x and y coordinates of the pixel centres, each of shape (ny, nx).
+        """
+        return _coordinates(self.shape, float(self.dx))
+
+    def elliptical_radius(self, x, y, q, pa):
+        """
+        Returns the elliptical radius sqrt(q*u^2 + v^2/q) of every pixel.
+
+        u and v are the coordinates relative to (x, y), rotated by the position angle pa (radians,
+        counter-clockwise from the x axis). The result is cached per (shape, dx, x, y, q, pa) and read-only.
+
+        Parameters
+        ----------
+        x, y, q, pa : float or array of shape (N,)
+            Centre, axis ratio and position angle. Arrays give one geometry per parameter set.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (N, ny, nx).
+        """
+        geometry = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in (x, y, q, pa)))
+        geometry = np.stack(geometry, axis=1)
+        if np.any(geometry[:, 2] <= 0):
+            raise ValueError("q must be positive")
+        unique, inverse = np.unique(geometry, axis=0, return_inverse=True)
+        radii = [_elliptical_radius(self.shape, float(self.dx), *map(float, row)) for row in unique]
+        if len(radii) == 1:
+            return np.broadcast_to(radii[0], (len(geometry),) + self.shape)
+        return np.stack(radii)[inverse.ravel()]
+
+
+    def block_average(self, image):
+        """
+        Average an image (..., ny, nx) on this grid over subsampling x subsampling blocks,
+        giving the image on the grid without subsampling.
+        """
+        s = self.subsampling
+        if s == 1:
+            return image
+        shape = image.shape[:-2] + (self.ny // s, s, self.nx // s, s)
+        return image.reshape(shape).mean(axis=(-3, -1))
@@ -17,21 +17,26 @@ class Header:
         128: time delays
         To combine multiple chi2, add the types together. E.g., to combine image position (chi2type=2) with time delays (chi2type=128), use chi2type of 130 (=2+128). Note that chi2type=3 should not be used, since either the image position chi2 or source position chi2 is used, but not both.
     minimiser : str
-        The minimiser to use. Can be 'siman' but no idea what else.
+        The minimiser to use. Can be 'siman', 'mcmc' or 'ptmcmc' (parallel tempering, which needs
+        the PtmcmcParameters of the optimisers).
     seed : int
         The magical seed.
     """
     def __init__(self, chi2type, minimiser, seed, optimisers):
         if not isinstance(chi2type, int):
             raise TypeError("chi2type must be an integer")        
-        if chi2type not in [1, 2, 4, 8, 16, 32, 64, 128]:
-            raise ValueError("chi2type must be one of [1, 2, 4, 8, 16, 32, 64, 128]")
-        if minimiser not in ['siman', 'mcmc']:
-            raise ValueError("minimiser must be 'siman' or 'mcmc'")
+        if not 0 < chi2type < 256:
+            raise ValueError("chi2type must be a sum of distinct values of [1, 2, 4, 8, 16, 32, 64, 128]")
+        if chi2type & 1 and chi2type & 2:
+            raise ValueError("chi2type cannot combine the source (1) and image (2) position chi2")
+        if minimiser not in ['siman', 'mcmc', 'ptmcmc']:
+            raise ValueError("minimiser must be 'siman', 'mcmc' or 'ptmcmc'")
         if not isinstance(seed, int):
             raise TypeError("seed must be an integer")
         if not isinstance(optimisers, Optimisers):
             raise TypeError("optimisers must be an instance of Optimisers")
+        if minimiser == 'ptmcmc' and optimisers.ptmcmc is None:
+            raise ValueError("the 'ptmcmc' minimiser needs optimisers with ptmcmc_params")
 
         self.chi2type = chi2type
         self.minimiser = minimiser
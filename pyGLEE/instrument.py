@@ -0,0 +1,405 @@
+import atexit
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+
+class _NullSpan:
+    # Returned by span() while instrumentation is disabled; entering and leaving it does nothing.
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    A class to represent one timed section, recorded by its Recorder when the with block ends.
+
+    Attributes
+    ----------
+    name : str
+        The span name, e.g. 'config.as_string'.
+    args : dict
+        Extra fields stored with the span; add more with `set`.
+    start : int
+        The perf_counter_ns at which the block was entered.
+    """
+    __slots__ = ("recorder", "name", "args", "start")
+
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder._finish(self, time.perf_counter_ns(), exc_type)
+        return False
+
+
+class Histogram:
+    """
+    A class to summarise observed values in power-of-two buckets, so its size does not grow with the count.
+
+    Attributes
+    ----------
+    count : int
+        The number of values.
+    total, min, max : float
+        Their sum and range.
+    buckets : dict of int to int
+        Maps e to the number of values v with 2^(e-1) <= |v| < 2^e (e = 0 collects 0 and below 0.5).
+    """
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = {}
+
+    def add(self, value):
+        value = float(value)
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        e = max(math.frexp(value)[1], 0)
+        self.buckets[e] = self.buckets.get(e, 0) + 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def as_dict(self):
+        return {"count": self.count, "total": self.total, "min": self.min, "max": self.max, "mean": self.mean,
+                "buckets": {str(2.0**e): n for e, n in sorted(self.buckets.items())}}
+
+
+class Recorder:
+    """
+    A class to collect spans, counters and histograms of one process.
+
+    The duration of every finished span, in seconds, is also added to the histogram of the span name.
+
+    Attributes
+    ----------
+    spans : list of dict
+        The finished spans, with name, start 'ts' and duration 'dur' in microseconds since the epoch,
+        pid, tid, args and, for spans left through an exception, the exception type as 'error'.
+    counters : dict of str to float
+        The counter totals.
+    histograms : dict of str to Histogram
+        The observed values.
+    max_spans : int or None
+        Spans beyond this number are dropped (and counted in the 'instrument.dropped_spans' counter).
+    """
+    def __init__(self, max_spans=1000000):
+        self.spans = []
+        self.counters = {}
+        self.histograms = {}
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._written = False
+        self._started = time.time()
+        # perf_counter_ns is monotonic but has no fixed origin; anchor it to the epoch so traces
+        # of several processes line up.
+        self._epoch = time.time_ns() - time.perf_counter_ns()
+
+    def span(self, name, **args):
+        return Span(self, name, args)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def _finish(self, span, end, exc_type):
+        duration = end - span.start
+        event = {"name": span.name, "ts": (self._epoch + span.start) / 1e3, "dur": duration / 1e3,
+                 "pid": self._pid, "tid": threading.get_native_id(), "args": span.args}
+        if exc_type is not None:
+            event["error"] = exc_type.__name__
+        self.observe(span.name, duration / 1e9)
+        with self._lock:
+            if self.max_spans is None or len(self.spans) < self.max_spans:
+                self.spans.append(event)
+            else:
+                self.counters["instrument.dropped_spans"] = self.counters.get("instrument.dropped_spans", 0) + 1
+
+    def summary(self):
+        """
+        Returns {'counters': ..., 'histograms': ...} with every histogram as a dict.
+        """
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "histograms": {name: h.as_dict() for name, h in self.histograms.items()}}
+
+    def write_jsonl(self, path):
+        """
+        Write one JSON line per span, then one per counter and histogram, each with a 'type' field.
+        Appends, so several processes or runs can share a file.
+        """
+        summary = self.summary()
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, "a") as f:
+            for event in spans:
+                f.write(json.dumps({"type": "span", **event}, default=str) + "\n")
+            for name, value in summary["counters"].items():
+                f.write(json.dumps({"type": "counter", "name": name, "value": value, "pid": self._pid}) + "\n")
+            for name, histogram in summary["histograms"].items():
+                f.write(json.dumps({"type": "histogram", "name": name, "pid": self._pid, **histogram}) + "\n")
+
+    def write_chrome_trace(self, path):
+        """
+        Write the spans as complete ('X') events of the Chrome trace event format, which chrome://tracing
+        and Perfetto load. Counter totals are written as counter ('C') events, histograms under 'otherData'.
+        """
+        summary = self.summary()
+        with self._lock:
+            spans = list(self.spans)
+        events = [{"ph": "X", "cat": "pyGLEE", **event} for event in spans]
+        end = max((e["ts"] + e["dur"] for e in spans), default=time.time_ns() / 1e3)
+        events += [{"ph": "C", "name": name, "ts": end, "pid": self._pid, "args": {"value": value}}
+                   for name, value in summary["counters"].items()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"histograms": summary["histograms"]}}, f, default=str)
+
+    def write(self, path):
+        """
+        Write a Chrome trace for a '.json' path, JSON lines otherwise.
+        """
+        if path.endswith(".json"):
+            self.write_chrome_trace(path)
+        else:
+            self.write_jsonl(path)
+
+
+_recorder = None
+_path = None
+
+
+def process_path(path, pid=None):
+    """
+    Returns the file a process writes its recording to when tracing to path: 'trace.json' becomes
+    'trace.<pid>.json'.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+
+def _process_files(path, since=None):
+    root, ext = os.path.splitext(path)
+    directory = os.path.dirname(root) or "."
+    prefix = os.path.basename(root) + "."
+    files = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(ext) and name[len(prefix):len(name) - len(ext)].isdigit():
+            file = os.path.join(directory, name)
+            # Whole seconds, for file systems with a coarse modification time.
+            if since is None or os.stat(file).st_mtime >= math.floor(since):
+                files.append(file)
+    return sorted(files)
+
+
+def merge_traces(path, remove=True, since=None):
+    """
+    Merge the per-process files written for path (see enable) into path itself.
+
+    Only files modified at or after `since` are merged, so files left by earlier runs that were
+    killed before merging stay out of the trace (and on disk); the process that called enable
+    passes the time its recorder started.
+
+    For a '.json' path the trace events of all processes are concatenated into one Chrome trace,
+    with the histograms of each process under otherData['histograms'][pid], overwriting path.
+    Otherwise the JSON lines are appended to path, as Recorder.write_jsonl does.
+
+    Parameters
+    ----------
+    path : str
+        The path given to enable.
+    remove : bool, optional
+        Whether to delete the per-process files afterwards. Defaults to True.
+    since : float, optional
+        A time.time() value; defaults to None, merging every per-process file.
+
+    Returns
+    -------
+    list of str
+        The per-process files that were merged.
+    """
+    files = _process_files(path, since)
+    if path.endswith(".json"):
+        events, histograms = [], {}
+        for file in files:
+            with open(file) as f:
+                trace = json.load(f)
+            events += trace["traceEvents"]
+            pid = file[len(os.path.splitext(path)[0]) + 1:-len(".json")]
+            histograms[pid] = trace.get("otherData", {}).get("histograms", {})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"histograms": histograms}}, f, default=str)
+    else:
+        with open(path, "a") as out:
+            for file in files:
+                with open(file) as f:
+                    out.write(f.read())
+    if remove:
+        for file in files:
+            os.remove(file)
+    return files
+
+
+def _write(recorder, path):
+    # Registered both with atexit and as a multiprocessing finalizer, since workers leave through
+    # os._exit, which skips atexit. Recorders a forked child inherited were replaced by _after_fork.
+    if recorder._written or recorder._pid != os.getpid():
+        return
+    recorder._written = True
+    target = process_path(path)
+    # A file of an earlier process with the same pid is replaced, not appended to.
+    if os.path.exists(target):
+        os.remove(target)
+    recorder.write(target)
+    # Only the top-level process merges; workers exit (and write) before their pool is joined.
+    import multiprocessing
+    if multiprocessing.parent_process() is None:
+        merge_traces(path, since=recorder._started)
+
+
+def _after_fork(recorder):
+    # Called in multiprocessing children after their finalizers were cleared. A forked child starts
+    # with a copy of the parent's spans, so it gets an empty recorder of its own; a recorder made by
+    # importing this module while the child was prepared needs its finalizer back.
+    if recorder is not _recorder:
+        return
+    if recorder._pid != os.getpid():
+        enable(_path, recorder.max_spans)
+    else:
+        from multiprocessing import util
+        util.Finalize(None, _write, args=(recorder, _path), exitpriority=0)
+
+
+def enable(path=None, max_spans=1000000):
+    """
+    Start recording with a new Recorder.
+
+    With a path, every process writes its own recording to process_path(path) when it exits, so
+    worker processes started while recording (forked or spawned with PYGLEE_TRACE set) do not
+    overwrite each other; the top-level process then merges them into path with merge_traces.
+    Workers write when they exit normally, e.g. after Pool.close and Pool.join; workers that are
+    killed, as by Pool.terminate (which leaving a `with Pool(...)` block calls), lose their spans.
+
+    Parameters
+    ----------
+    path : str, optional
+        If given, the recording is written there when the interpreter exits (see Recorder.write).
+    max_spans : int or None, optional
+        See Recorder.
+
+    Returns
+    -------
+    Recorder
+        The recorder now in use.
+    """
+    global _recorder, _path
+    recorder = Recorder(max_spans)
+    _recorder = recorder
+    _path = path
+    if path is not None:
+        from multiprocessing import util
+        atexit.register(_write, recorder, path)
+        util.Finalize(None, _write, args=(recorder, path), exitpriority=0)
+        util.register_after_fork(recorder, _after_fork)
+    return recorder
+
+
+def disable():
+    """
+    Stop recording and return the Recorder that was in use, or None.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def recorder():
+    """
+    Returns the Recorder in use, or None while instrumentation is disabled.
+    """
+    return _recorder
+
+
+def span(name, **args):
+    """
+    Returns a context manager timing its with block as a span, a shared no-op while disabled.
+    """
+    r = _recorder
+    if r is None:
+        return _NULL_SPAN
+    return Span(r, name, args)
+
+
+def count(name, value=1):
+    r = _recorder
+    if r is not None:
+        r.count(name, value)
+
+
+def observe(name, value):
+    r = _recorder
+    if r is not None:
+        r.observe(name, value)
+
+
+def traced(name):
+    """
+    Decorator recording every call of a function as a span; while disabled it only adds one check.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            r = _recorder
+            if r is None:
+                return func(*args, **kwargs)
+            with Span(r, name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# PYGLEE_TRACE=<path> records a whole batch job without code changes, written to path at exit; worker
+# processes re-import this module and record themselves, and are merged in (see enable).
+if os.environ.get("PYGLEE_TRACE"):
+    enable(os.environ["PYGLEE_TRACE"])
@@ -0,0 +1,207 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .fits_data import open_fits
+
+
+def mass_key(mass_model, params=None):
+    """
+    Returns a hash of the mass parameters of a MassModel (prior means overridden by params, one dict
+    per profile as for MassModel).
+
+    Only the profile types and parameter values enter, so configurations that differ in light
+    or regularization parameters share the key.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for profile, p in mass_model._each(params):
+        values = profile.parameter_arrays(p)
+        if len(next(iter(values.values()))) != 1:
+            raise ValueError("a lensing operator needs a single set of mass parameters")
+        h.update(profile.glee_name.encode())
+        h.update(np.array([values[name][0] for name in profile.parameters], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def bilinear_matrix(x, y, x0, y0, size, n):
+    """
+    Returns the sparse (len(x), n * n) matrix interpolating an n x n pixel grid bilinearly at (x, y).
+
+    The grid covers the square [x0, x0 + size] x [y0, y0 + size] with pixel centres at
+    x0 + (i + 0.5) * size / n; positions outside the outermost pixel centres get no weight.
+    """
+    from scipy import sparse
+    d = size / n
+    fx = (np.asarray(x) - x0) / d - 0.5
+    fy = (np.asarray(y) - y0) / d - 0.5
+    ix = np.floor(fx).astype(int)
+    iy = np.floor(fy).astype(int)
+    tx, ty = fx - ix, fy - iy
+    inside = (ix >= 0) & (ix < n - 1) & (iy >= 0) & (iy < n - 1)
+    rows = np.flatnonzero(inside)
+    ix, iy, tx, ty = ix[inside], iy[inside], tx[inside], ty[inside]
+    r = np.tile(rows, 4)
+    c = np.concatenate([iy * n + ix, iy * n + ix + 1, (iy + 1) * n + ix, (iy + 1) * n + ix + 1])
+    w = np.concatenate([(1 - tx) * (1 - ty), tx * (1 - ty), (1 - tx) * ty, tx * ty])
+    return sparse.csr_matrix((w, (r, c)), shape=(len(fx), n * n))
+
+
+def psf_matrix(kernel, shape):
+    """
+    Returns the sparse (ny*nx, ny*nx) matrix convolving an image of the given shape with a kernel
+    (odd side lengths, zero padding outside the image).
+    """
+    from scipy import sparse
+    kernel = np.asarray(kernel, dtype=float)
+    ky, kx = kernel.shape
+    if ky % 2 == 0 or kx % 2 == 0:
+        raise ValueError("the kernel must have odd side lengths")
+    ny, nx = shape
+    jj, ii = np.mgrid[:ny, :nx]
+    rows, cols, vals = [], [], []
+    for dy in range(-(ky // 2), ky // 2 + 1):
+        for dx in range(-(kx // 2), kx // 2 + 1):
+            value = kernel[ky // 2 + dy, kx // 2 + dx]
+            if value == 0:
+                continue
+            sj, si = jj - dy, ii - dx
+            ok = (sj >= 0) & (sj < ny) & (si >= 0) & (si < nx)
+            rows.append((jj * nx + ii)[ok])
+            cols.append((sj * nx + si)[ok])
+            vals.append(np.full(ok.sum(), value))
+    return sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(ny * nx, ny * nx))
+
+
+def _dds_ds(esource):
+    # pyGLEE has no cosmology to turn a source redshift into a distance ratio.
+    if esource.dds_ds is None:
+        raise ValueError("the ESource needs dds_ds to be lensed (a redshift z alone cannot be used)")
+    return esource.dds_ds.mean
+
+
+class LensingOperator:
+    """
+    A class to represent the linear map from the source pixels of an ESource to its image pixels.
+
+    The image grid (ngx x ngx pixels of size dx) is subsampled sub_esr_psf_factor times and ray-traced
+    through the mass model, scaled by the ESource dds_ds (required). The ngy x ngy source grid is the square
+    enclosing the traced positions of the masked pixels. Each subpixel interpolates the source
+    bilinearly and the subpixels are averaged back to the data pixels.
+
+    Attributes
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        The (ngx^2, ngy^2) image-from-source matrix; rows of pixels outside the mask are empty.
+    source_origin : tuple of float
+        The lower-left corner of the source grid.
+    source_size : float
+        The side of the source grid.
+    key : str
+        The mass_key the operator was built for.
+    """
+    def __init__(self, esource, mass_model, params=None, mask="arcmask"):
+        from scipy import sparse
+        self.ngx, self.ngy = esource.ngx, esource.ngy
+        self.key = mass_key(mass_model, params)
+        s = esource.sub_esr_psf_factor
+        grid = esource.grid(subsampling=s)
+        selected = np.ones((self.ngx, self.ngx), dtype=bool) if mask is None else open_fits(getattr(esource, mask)).data != 0
+        sub_selected = np.repeat(np.repeat(selected, s, axis=0), s, axis=1).ravel()
+        x, y = (c.ravel()[sub_selected] for c in grid.coordinates())
+        (bx, by), = mass_model.ray_trace((x, y), params, dds_ds=(_dds_ds(esource),))
+        bx, by = bx[0], by[0]
+        if len(bx):
+            centre = ((bx.min() + bx.max()) / 2, (by.min() + by.max()) / 2)
+            half = max(bx.max() - bx.min(), by.max() - by.min()) / 2
+        else:
+            centre, half = (0.0, 0.0), 0.5
+        # Pad by one source pixel so the outermost traced positions still interpolate.
+        self.source_size = 2 * half * self.ngy / max(self.ngy - 2, 1) or 1.0
+        self.source_origin = (centre[0] - self.source_size / 2, centre[1] - self.source_size / 2)
+        sub = bilinear_matrix(bx, by, *self.source_origin, self.source_size, self.ngy)
+        # Rows: traced subpixels -> data pixels, averaging s x s subpixels.
+        sub_index = np.flatnonzero(sub_selected)
+        j, i = np.divmod(sub_index, self.ngx * s)
+        data_index = (j // s) * self.ngx + i // s
+        average = sparse.csr_matrix((np.full(len(sub_index), 1.0 / s**2), (data_index, np.arange(len(sub_index)))),
+                                    shape=(self.ngx**2, len(sub_index)))
+        self.matrix = (average @ sub).tocsr()
+
+    def source_coordinates(self):
+        """
+        Returns the x and y coordinates of the source pixel centres, each of shape (ngy, ngy).
+        """
+        d = self.source_size / self.ngy
+        c = (np.arange(self.ngy) + 0.5) * d
+        return np.meshgrid(self.source_origin[0] + c, self.source_origin[1] + c)
+
+    def lensed_image(self, source):
+        """
+        Returns the (ngx, ngx) image of an (ngy, ngy) source, before PSF convolution.
+        """
+        return (self.matrix @ np.asarray(source, dtype=float).ravel()).reshape(self.ngx, self.ngx)
+
+    def response(self, psf=None):
+        """
+        Returns the (ngx^2, ngy^2) response for SourceSolver: the matrix, convolved with the
+        data-resolution PSF of the given .fits file if psf is given.
+        """
+        if psf is None:
+            return self.matrix
+        kernel = np.asarray(open_fits(psf).data, dtype=float)
+        return (psf_matrix(kernel / kernel.sum(), (self.ngx, self.ngx)) @ self.matrix).tocsr()
+
+
+class LensingCache:
+    """
+    A class to keep the LensingOperators of recent mass models, least recently used evicted first.
+
+    Proposals that only change light or regularization parameters have the same mass_key and reuse
+    the operator instead of ray-tracing again.
+
+    Attributes
+    ----------
+    maxsize : int
+        The number of operators kept.
+    hits, misses : int
+        The cache statistics.
+    """
+    def __init__(self, maxsize=16):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize must be a positive int")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._operators = OrderedDict()
+        self._lock = threading.Lock()
+
+    def operator(self, esource, mass_model, params=None, mask="arcmask"):
+        """
+        Returns the LensingOperator of an ESource for the mass parameters, building it on a miss.
+        """
+        key = (mass_key(mass_model, params), esource.ngx, esource.dx, esource.ngy, esource.sub_esr_psf_factor,
+               _dds_ds(esource), mask and getattr(esource, mask))
+        with self._lock:
+            op = self._operators.get(key)
+            if op is not None:
+                self._operators.move_to_end(key)
+                self.hits += 1
+                return op
+            self.misses += 1
+        op = LensingOperator(esource, mass_model, params, mask)
+        with self._lock:
+            self._operators[key] = op
+            self._operators.move_to_end(key)
+            while len(self._operators) > self.maxsize:
+                self._operators.popitem(last=False)
+        return op
+
+    def __len__(self):
+        return len(self._operators)
+
+    def clear(self):
+        with self._lock:
+            self._operators.clear()
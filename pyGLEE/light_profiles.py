@@ -1,6 +1,12 @@
+import numpy as np
+
 from .priors import *
 
 class LightProfile:
+    __slots__ = ("x", "y", "amp")
+    glee_name = None
+    parameters = ("x", "y", "amp")
+
     def __init__(self, x, y, amp):
         if not isinstance(x, Prior):
             raise TypeError("x must have a prior")
@@ -14,7 +20,91 @@ class LightProfile:
         self.y = y
         self.amp = amp
 
+    @classmethod
+    def from_priors(cls, **columns):
+        """
+        Build many light profiles at once, validating whole columns instead of every object.
+
+        Args:
+            **columns: One list of Prior per name in `parameters`, all of the same length N.
+
+        Returns:
+            list: The N light profiles.
+        """
+        missing = set(cls.parameters) - set(columns)
+        if missing:
+            raise TypeError(f"{cls.__name__} needs priors for {sorted(missing)}")
+        unknown = set(columns) - set(cls.parameters)
+        if unknown:
+            raise ValueError(f"{cls.__name__} has no parameters {sorted(unknown)}")
+        columns = {name: list(column) for name, column in columns.items()}
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError("all columns must have the same length")
+        for name, column in columns.items():
+            if not all(isinstance(p, Prior) for p in column):
+                raise TypeError(f"{name} must have priors")
+        if np.any(np.array([p.mean for p in columns["amp"]], dtype=float) < 0):
+            raise ValueError("amp must be positive")
+        profiles = []
+        for priors in zip(*columns.values()):
+            profile = cls.__new__(cls)
+            for name, prior in zip(columns, priors):
+                object.__setattr__(profile, name, prior)
+            profiles.append(profile)
+        return profiles
+
+    def parameter_arrays(self, params=None):
+        """
+        Returns the parameters as float arrays of a common shape (N,).
+
+        Parameters not given in params are taken from the prior means.
+
+        Args:
+            params (dict, optional): Maps parameter names to a number or an array of shape (N,).
+
+        Returns:
+            dict: Maps every name in `parameters` to an array of shape (N,).
+        """
+        params = params or {}
+        unknown = set(params) - set(self.parameters)
+        if unknown:
+            raise ValueError(f"{type(self).__name__} has no parameters {sorted(unknown)}")
+        values = [np.atleast_1d(np.asarray(params[name] if name in params else getattr(self, name).mean, dtype=float))
+                  for name in self.parameters]
+        return dict(zip(self.parameters, np.broadcast_arrays(*values)))
+
+    def evaluate(self, grid, params=None):
+        """
+        Evaluate the surface brightness on every pixel of a grid.
+
+        Args:
+            grid (PixelGrid): The pixel grid, e.g. from ESource.grid().
+            params (dict, optional): Maps parameter names to a number or an array of shape (N,)
+                to evaluate N parameter sets at once. Defaults to the prior means.
+
+        Returns:
+            numpy.ndarray: The surface brightness, of shape (N, ny, nx).
+        """
+        p = self.parameter_arrays(params)
+        return self.surface_brightness(grid, p)
+
+    def surface_brightness(self, grid, p):
+        raise NotImplementedError(f"{type(self).__name__} cannot be evaluated")
+
+    @staticmethod
+    def _radius(grid, p):
+        return grid.elliptical_radius(p["x"], p["y"], p["q"], p["pa"])
+
+    @staticmethod
+    def _column(value):
+        return value[:, None, None]
+
 class Sersic(LightProfile): 
+    __slots__ = ("q", "pa", "r_eff", "n_sersic")
+    glee_name = "sersic"
+    parameters = ("x", "y", "q", "pa", "amp", "r_eff", "n_sersic")
+
     def __init__(self, x, y, amp, q, pa, r_eff, n_sersic):
         """
         Initialize a Sersic light profile.
@@ -59,6 +149,15 @@ class Sersic(LightProfile):
             {self.r_eff.mean}  #r_eff     {self.r_eff.prior_as_string()}
             {self.n_sersic.mean}  #n_sersic  {self.n_sersic.prior_as_string()}"""
         return glee_string
+
+    def surface_brightness(self, grid, p):
+        """
+        I(r) = amp * exp(-b_n * ((r / r_eff)^(1/n) - 1)), with b_n from Ciotti & Bertin (1999).
+        """
+        n = self._column(p["n_sersic"])
+        b = 2 * n - 1 / 3 + 4 / (405 * n) + 46 / (25515 * n**2)
+        r = self._radius(grid, p) / self._column(p["r_eff"])
+        return self._column(p["amp"]) * np.exp(-b * (r ** (1 / n) - 1))
     
 class PSF(LightProfile):
     """
@@ -68,6 +167,10 @@ class PSF(LightProfile):
     y: The y-coordinate of the object.
     amp: The amplitude of the object.
     """    
+    __slots__ = ()
+    glee_name = "psf"
+    parameters = ("x", "y", "amp")
+
     def __init__(self, x, y, amp):
         super().__init__(x, y, amp)
     def as_string(self):
@@ -85,6 +188,30 @@ class PSF(LightProfile):
             {self.amp.mean}  #amp       {self.amp.prior_as_string()}"""
         return glee_string
 
+    def surface_brightness(self, grid, p):
+        """
+        A point source: amp is shared bilinearly between the four pixels around (x, y).
+
+        On a subsampled grid the deposited value is scaled by subsampling^2, so that
+        block-averaging back to the data grid conserves amp.
+        """
+        n = len(p["amp"])
+        amp = p["amp"] * grid.subsampling**2
+        image = np.zeros((n,) + grid.shape)
+        fx = p["x"] / grid.dx - 0.5
+        fy = p["y"] / grid.dx - 0.5
+        ix = np.floor(fx).astype(int)
+        iy = np.floor(fy).astype(int)
+        tx = fx - ix
+        ty = fy - iy
+        rows = np.arange(n)
+        for dy, wy in ((0, 1 - ty), (1, ty)):
+            for dx, wx in ((0, 1 - tx), (1, tx)):
+                jy, jx = iy + dy, ix + dx
+                inside = (jy >= 0) & (jy < grid.ny) & (jx >= 0) & (jx < grid.nx)
+                np.add.at(image, (rows[inside], jy[inside], jx[inside]), (amp * wy * wx)[inside])
+        return image
+
 class Gaussian(LightProfile):
     """
     Initialize a Gaussian light profile.
@@ -96,6 +223,10 @@ class Gaussian(LightProfile):
     pa: The position angle of the object.
     sigma: The sigma of the object.
     """    
+    __slots__ = ("q", "pa", "sigma")
+    glee_name = "gaussian"
+    parameters = ("x", "y", "q", "pa", "amp", "sigma")
+
     def __init__(self, x, y, amp, q, pa, sigma):
         super().__init__(x, y, amp)
         if not isinstance(q, Prior):
@@ -124,6 +255,13 @@ class Gaussian(LightProfile):
             {self.amp.mean}  #amp       {self.amp.prior_as_string()}
             {self.sigma.mean}  #sigma      {self.sigma.prior_as_string()}"""
         return glee_string
+
+    def surface_brightness(self, grid, p):
+        """
+        I(r) = amp * exp(-r^2 / (2 sigma^2)).
+        """
+        r = self._radius(grid, p) / self._column(p["sigma"])
+        return self._column(p["amp"]) * np.exp(-0.5 * r**2)
     
 class Moffat(LightProfile):
     """
@@ -137,6 +275,10 @@ class Moffat(LightProfile):
     alpha: The alpha structural parameter.
     beta: The alpha structural parameter.
     """    
+    __slots__ = ("q", "pa", "alpha", "beta")
+    glee_name = "moffat"
+    parameters = ("x", "y", "q", "pa", "amp", "alpha", "beta")
+
     def __init__(self, x, y, amp, q, pa, alpha, beta):
         super().__init__(x, y, amp)
         self.q=q
@@ -162,6 +304,13 @@ class Moffat(LightProfile):
             {self.beta.mean}  #beta      {self.beta.prior_as_string()}"""
         return glee_string
 
+    def surface_brightness(self, grid, p):
+        """
+        I(r) = amp * (1 + (r / alpha)^2)^(-beta).
+        """
+        r = self._radius(grid, p) / self._column(p["alpha"])
+        return self._column(p["amp"]) * (1 + r**2) ** -self._column(p["beta"])
+
 class piemd(LightProfile): 
     """
     Initialize a piemd light profile.
@@ -173,6 +322,10 @@ class piemd(LightProfile):
     pa: The position angle of the object.
     w: Magical parameter (ask Sherry for more information)
     """       
+    __slots__ = ("q", "pa", "w")
+    glee_name = "piemd"
+    parameters = ("x", "y", "q", "pa", "amp", "w")
+
     def __init__(self, x, y, amp, q, pa, w):
         super().__init__(x, y, amp)
         self.q=q
@@ -195,3 +348,14 @@ class piemd(LightProfile):
             {self.amp.mean}  #amp       {self.amp.prior_as_string()}
             {self.w.mean}  #w      {self.w.prior_as_string()}"""
         return glee_string
+
+    def surface_brightness(self, grid, p):
+        """
+        I(r) = amp / sqrt(r^2 + w^2).
+        """
+        r = self._radius(grid, p)
+        return self._column(p["amp"]) / np.sqrt(r**2 + self._column(p["w"]) ** 2)
+
+
+# Maps the profile keyword used in GLEE configfiles to its class.
+LIGHT_PROFILES = {lp.glee_name: lp for lp in (Sersic, PSF, Gaussian, Moffat, piemd)}
@@ -0,0 +1,153 @@
+import copy
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from .parameters import (is_free, all_parameters, free_parameters, free_light_parameters, default_step,
+                         parameter_names, parameter_owner, ParameterVector)
+from .convolution import ModelImage
+from .chi2 import MaskedChi2
+
+
+class LightChi2:
+    """
+    A class to compute the summed chi2 of the LensOnly ESources for batches of parameter vectors.
+
+    Linked parameters follow their links (see LinkResolver); all other parameters stay at their prior means.
+
+    With workers, the ESources are rendered, convolved and compared to their data in a thread pool.
+    NumPy releases the GIL in the FFTs and array arithmetic, so the wall time of a batch approaches
+    that of the slowest ESource. ESources reading the same data, err and mask files share one MaskedChi2.
+    The pool is started on the first call; shut it down with close() or by using the LightChi2 as a
+    context manager (a later call starts a new one).
+
+    Attributes
+    ----------
+    config : GleeConfig
+        The configuration whose light profiles are evaluated.
+    parameters : list of tuple
+        The free parameters, as returned by free_light_parameters; column k of a parameter vector is parameters[k].
+    links : LinkResolver
+        The compiled links of the configuration.
+    workers : int or None
+        The number of threads evaluating ESources concurrently; None or 1 evaluates them in turn.
+    """
+    def __init__(self, config, parameters, workers=None):
+        from .links import LinkResolver
+        self.config = config
+        self.parameters = parameters
+        self.links = LinkResolver(config)
+        keys = [p[:3] for p in self.links.parameters]
+        self._free = np.array([keys.index(p[:3]) for p in parameters], dtype=int)
+        self._base = self.links.means()
+        varying = set(self._free.tolist()) | set(self.links.linked.tolist())
+        self._sources = []
+        chi2s = {}
+        for i, es in enumerate(config.e_source_list):
+            if es.mod_light != "LensOnly":
+                continue
+            columns = [{} for _ in es.light_profiles]
+            for k in varying:
+                si, j, name = keys[k]
+                if si is not None and si == i and j is not None:
+                    columns[j][name] = k
+            files = tuple(os.path.abspath(getattr(es, name)) for name in ("data", "err", "arcmask", "lensmask"))
+            if files not in chi2s:
+                chi2s[files] = MaskedChi2.from_esource(es)
+            self._sources.append((ModelImage(es), chi2s[files], columns))
+        self.workers = workers
+        self._pool = None
+
+    @staticmethod
+    def _source_chi2(source, full):
+        model, chi2, columns = source
+        params = [{name: full[:, k] for name, k in col.items()} for col in columns]
+        return chi2.chi2(model.render(params))
+
+    def __call__(self, x):
+        """
+        Returns the chi2 of every row of x, an array of shape (N, n_params).
+        """
+        x = np.atleast_2d(x)
+        full = np.tile(self._base, (len(x), 1))
+        full[:, self._free] = x
+        full = self.links.resolve(full)
+        if self.workers and self.workers > 1 and len(self._sources) > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(min(self.workers, len(self._sources)))
+            terms = self._pool.map(self._source_chi2, self._sources, repeat(full))
+        else:
+            terms = (self._source_chi2(source, full) for source in self._sources)
+        total = np.zeros(len(x))
+        for term in terms:
+            total = total + term
+        return total
+
+    def close(self):
+        """
+        Shut down the thread pool, if one was started.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Energy:
+    """
+    A class to compute the energy E = chi2/2 + sum(((x - mu) / sigma)^2) / 2 of parameter vectors.
+
+    The second term runs over the Gaussian priors. Vectors outside a flat prior's bounds or below
+    a prior's min get an infinite energy.
+
+    Attributes
+    ----------
+    chi2 : callable
+        Maps an array (N, n_params) to the N chi2 values.
+    start : numpy.ndarray
+        The prior means.
+    step : numpy.ndarray
+        The step sizes, see default_step.
+    lower, upper : numpy.ndarray
+        The bounds from the flat priors and min (+-inf where unbounded).
+    """
+    def __init__(self, parameters, chi2):
+        vector = ParameterVector(parameters)
+        self.chi2 = chi2
+        self.start = vector.mean
+        self.step = vector.step
+        self.lower, self.upper = vector.bounds
+        self._gaussian = vector.gaussian
+        self._mu = vector.centre[self._gaussian]
+        self._sigma = vector.sigma[self._gaussian]
+
+    def __call__(self, x):
+        """
+        Returns (energy, chi2) of every row of x; both are inf where x violates a bound.
+        """
+        inside = np.all((x >= self.lower) & (x <= self.upper), axis=1)
+        chi2 = np.full(len(x), np.inf)
+        if inside.any():
+            chi2[inside] = self.chi2(x[inside])
+        penalty = 0.5 * np.sum(((x[:, self._gaussian] - self._mu) / self._sigma) ** 2, axis=1)
+        return 0.5 * chi2 + penalty, chi2
+
+
+def config_with_values(config, parameters, values):
+    """
+    Returns a copy of config with the given values as the means of the free parameters.
+
+    Only the means (the starting values) change; flat bounds and Gaussian centres are kept, so the
+    priors of a later stage are those of the original configuration.
+    """
+    config = copy.deepcopy(config)
+    for parameter, value in zip(parameters, values):
+        getattr(parameter_owner(config, parameter), parameter[2]).mean = float(value)
+    return config
@@ -0,0 +1,116 @@
+import numpy as np
+
+from .parameters import all_parameters, parameter_path
+
+
+class LinkResolver:
+    """
+    A class to resolve the prior links of a GleeConfig on batches of parameter vectors.
+
+    A prior with link=<label> takes the value y = a + b * x^c of the parameter labelled <label>,
+    with [a, b, c] = link_a (y = x without link_a). The links are compiled once into a DAG sorted
+    into levels: every link of a level only reads parameters that are free or resolved at an
+    earlier level, so each level is applied to the whole batch in one vectorised assignment.
+
+    Attributes
+    ----------
+    parameters : list of tuple
+        All parameters, as returned by all_parameters; column k of a parameter vector is parameters[k].
+    levels : list of tuple of numpy.ndarray
+        (target columns, source columns, a, b, c) per level.
+    """
+    def __init__(self, config):
+        self.parameters = all_parameters(config)
+        problems = link_problems(self.parameters)
+        if problems:
+            raise ValueError("; ".join(problems))
+        labels = {prior.label: k for k, (*_, prior) in enumerate(self.parameters) if prior.label}
+        source = {k: labels[prior.link] for k, (*_, prior) in enumerate(self.parameters) if prior.link is not None}
+        depth = {}
+        for k in source:
+            chain = [k]
+            while chain[-1] in source and chain[-1] not in depth:
+                chain.append(source[chain[-1]])
+            d = depth.get(chain[-1], 0)
+            for node in reversed(chain[:-1]):
+                d += 1
+                depth[node] = d
+        self.levels = []
+        for level in range(1, max(depth.values(), default=0) + 1):
+            targets = np.array(sorted(k for k, d in depth.items() if d == level))
+            coefficients = np.array([self.parameters[k][-1].link_a or [0, 1, 1] for k in targets], dtype=float)
+            self.levels.append((targets, np.array([source[k] for k in targets]), *coefficients.T))
+
+    @property
+    def linked(self):
+        """
+        The columns set by a link.
+        """
+        return np.concatenate([level[0] for level in self.levels]) if self.levels else np.array([], dtype=int)
+
+    def means(self):
+        """
+        Returns the prior means as a parameter vector.
+        """
+        return np.array([prior.mean for *_, prior in self.parameters], dtype=float)
+
+    def resolve(self, values):
+        """
+        Apply the links to parameter vectors.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Parameter vectors of shape (n_params,) or (N, n_params), ordered as parameters.
+
+        Returns
+        -------
+        numpy.ndarray
+            A copy with every linked column replaced by its effective value.
+        """
+        values = np.array(values, dtype=float)
+        batch = np.atleast_2d(values)
+        for targets, sources, a, b, c in self.levels:
+            batch[:, targets] = a + b * batch[:, sources] ** c
+        return values
+
+
+def link_problems(parameters):
+    """
+    Returns the broken links among parameters (as returned by all_parameters): links to unknown
+    or ambiguous (shared by several parameters) labels, and cycles.
+    """
+    problems = []
+    names = [parameter_path(p) for p in parameters]
+    labels = {}
+    for k, (*_, prior) in enumerate(parameters):
+        if prior.label:
+            labels.setdefault(prior.label, []).append(k)
+    source = {}
+    for k, (*_, prior) in enumerate(parameters):
+        if prior.link is None:
+            continue
+        if prior.link not in labels:
+            problems.append(f"{names[k]} links to unknown label '{prior.link}'")
+        elif len(labels[prior.link]) > 1:
+            problems.append(f"{names[k]} links to label '{prior.link}' used by "
+                            + " and ".join(names[n] for n in labels[prior.link]))
+        else:
+            source[k] = labels[prior.link][0]
+    reported = set()
+    for k in source:
+        path = [k]
+        while path[-1] in source and source[path[-1]] not in path:
+            path.append(source[path[-1]])
+        if path[-1] in source and not reported.intersection(path):
+            cycle = path[path.index(source[path[-1]]):]
+            reported.update(cycle)
+            problems.append("link cycle: " + " -> ".join(names[n] for n in cycle + [cycle[0]]))
+    return problems
+
+
+def check_links(config):
+    """
+    Returns the broken links of a GleeConfig, see link_problems.
+    """
+    return link_problems(all_parameters(config))
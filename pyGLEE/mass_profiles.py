@@ -1,2 +1,468 @@
+import numpy as np
+
+from .priors import Prior
+from .grid import PixelGrid
+
+
 class NoMass():
-    pass
\ No newline at end of file
+    pass
+
+
+def _points(where):
+    """Returns the x and y coordinate arrays of a PixelGrid or of an (x, y) tuple."""
+    if isinstance(where, PixelGrid):
+        return where.coordinates()
+    x, y = where
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    return x, y
+
+
+class MassProfile:
+    """
+    A class to represent a lens mass profile.
+
+    Deflections, convergences and potential derivatives are for the reference source plane
+    (dds_ds = 1); for an ESource they scale linearly with its dds_ds, so a field computed once
+    serves every ESource.
+
+    Every method takes the positions as a PixelGrid or an (x, y) tuple of arrays, and params as
+    for LightProfile.evaluate; the results have shape (N,) + the shape of the positions.
+    """
+    __slots__ = ()
+    glee_name = None
+    parameters = ()
+
+    def __init__(self, **priors):
+        for name in self.parameters:
+            if not isinstance(priors[name], Prior):
+                raise TypeError(f"{name} must have a prior")
+            setattr(self, name, priors[name])
+
+    def as_string(self):
+        """
+        Returns a GLEE string of the mass profile: its keyword, then one line per parameter with
+        the mean value and the prior.
+        """
+        lines = [f"      {self.glee_name}"]
+        for name in self.parameters:
+            prior = getattr(self, name)
+            lines.append(f"            {prior.mean}  #{name:<9} {prior.prior_as_string()}")
+        return "\n".join(lines)
+
+    def parameter_arrays(self, params=None):
+        """
+        Returns the parameters as float arrays of a common shape (N,), see LightProfile.parameter_arrays.
+        """
+        params = params or {}
+        unknown = set(params) - set(self.parameters)
+        if unknown:
+            raise ValueError(f"{type(self).__name__} has no parameters {sorted(unknown)}")
+        values = [np.atleast_1d(np.asarray(params[name] if name in params else getattr(self, name).mean, dtype=float))
+                  for name in self.parameters]
+        return dict(zip(self.parameters, np.broadcast_arrays(*values)))
+
+    def _prepare(self, where, params):
+        x, y = _points(where)
+        p = self.parameter_arrays(params)
+        shape = (-1,) + (1,) * x.ndim
+        return x, y, {name: value.reshape(shape) for name, value in p.items()}
+
+    def deflection(self, where, params=None):
+        """
+        Returns the deflection angles (alpha_x, alpha_y).
+        """
+        x, y, p = self._prepare(where, params)
+        return tuple(np.broadcast_to(a, (len(next(iter(p.values()))),) + x.shape) for a in self._deflection(x, y, p))
+
+    def convergence(self, where, params=None):
+        """
+        Returns the convergence kappa.
+        """
+        x, y, p = self._prepare(where, params)
+        return np.broadcast_to(self._convergence(x, y, p), (len(next(iter(p.values()))),) + x.shape)
+
+    def potential(self, where, params=None):
+        """
+        Returns the lensing potential psi, up to a constant per profile.
+        """
+        x, y, p = self._prepare(where, params)
+        return np.broadcast_to(self._potential(x, y, p), (len(next(iter(p.values()))),) + x.shape)
+
+    def hessian(self, where, params=None):
+        """
+        Returns the second derivatives of the lensing potential (psi_xx, psi_xy, psi_yy).
+        """
+        x, y, p = self._prepare(where, params)
+        return tuple(np.broadcast_to(h, (len(next(iter(p.values()))),) + x.shape) for h in self._hessian(x, y, p))
+
+    def magnification(self, where, params=None, dds_ds=1.0):
+        """
+        Returns the signed magnification 1 / det(I - dds_ds * hessian).
+        """
+        return _magnification(self.hessian(where, params), dds_ds)
+
+    def _hessian(self, x, y, p, rtol=1e-5):
+        # Central differences of the analytic deflection, for profiles without an analytic hessian.
+        # The step scales with the distance from the centre, on which the deflection varies, with a
+        # floor relative to the Einstein radius and the coordinates, above their round-off.
+        h = (rtol * np.hypot(x - p["x"], y - p["y"]) + 1e-8 * p.get("theta_e", 1.0)
+             + 1e-9 * (np.abs(x) + np.abs(y)))
+        ax_px, ay_px = self._deflection(x + h, y, p)
+        ax_mx, ay_mx = self._deflection(x - h, y, p)
+        ax_py, ay_py = self._deflection(x, y + h, p)
+        ax_my, ay_my = self._deflection(x, y - h, p)
+        xx = (ax_px - ax_mx) / (2 * h)
+        yy = (ay_py - ay_my) / (2 * h)
+        xy = ((ax_py - ax_my) + (ay_px - ay_mx)) / (4 * h)
+        return xx, xy, yy
+
+    @staticmethod
+    def _frame(x, y, p):
+        # Coordinates (u, v) along the major and minor axes, with q <= 1: a profile with q > 1 is
+        # the same as one with 1/q rotated by 90 degrees.
+        q = p["q"]
+        flip = q > 1
+        pa = np.where(flip, p["pa"] + np.pi / 2, p["pa"])
+        q = np.where(flip, 1 / q, q)
+        cos, sin = np.cos(pa), np.sin(pa)
+        dx, dy = x - p["x"], y - p["y"]
+        return dx * cos + dy * sin, -dx * sin + dy * cos, q, cos, sin
+
+    @staticmethod
+    def _rotate(au, av, cos, sin):
+        return au * cos - av * sin, au * sin + av * cos
+
+    @staticmethod
+    def _rotate_hessian(huu, huv, hvv, cos, sin):
+        # The hessian in the (u, v) frame of _frame, rotated back to (x, y).
+        cc, ss, cs = cos**2, sin**2, cos * sin
+        return (cc * huu - 2 * cs * huv + ss * hvv,
+                cs * (huu - hvv) + (cc - ss) * huv,
+                ss * huu + 2 * cs * huv + cc * hvv)
+
+
+def _magnification(hessian, dds_ds=1.0):
+    xx, xy, yy = hessian
+    with np.errstate(divide="ignore"):
+        return 1 / ((1 - dds_ds * xx) * (1 - dds_ds * yy) - (dds_ds * xy) ** 2)
+
+
+class PIEMD(MassProfile):
+    """
+    A pseudo-isothermal elliptical mass distribution; an SIE for w = 0.
+
+    kappa = theta_e / (2 sqrt(w^2 + q u^2 + v^2 / q)), with (u, v) along the major and minor axes,
+    so theta_e is the Einstein radius of the singular (w = 0) profile. The deflection, potential
+    and hessian are the analytic ones of Kassiola & Kovner (1993), in the form of Keeton (2001).
+
+    Parameters:
+    x, y: The centre.
+    q: The axis ratio.
+    pa: The position angle in radians.
+    theta_e: The Einstein radius.
+    w: The core radius.
+    """
+    __slots__ = ("x", "y", "q", "pa", "theta_e", "w")
+    glee_name = "piemd"
+    parameters = ("x", "y", "q", "pa", "theta_e", "w")
+
+    def __init__(self, x, y, q, pa, theta_e, w):
+        super().__init__(x=x, y=y, q=q, pa=pa, theta_e=theta_e, w=w)
+
+    @staticmethod
+    def _local(x, y, p):
+        # Keeton's (u, v, q, b, s, psi), with b and s the Einstein and core radii in his convention.
+        u, v, q, cos, sin = MassProfile._frame(x, y, p)
+        q = np.minimum(q, 1 - 1e-7)
+        b = p["theta_e"] / np.sqrt(q)
+        s = p["w"] / np.sqrt(q)
+        psi = np.sqrt(q**2 * (s**2 + u**2) + v**2)
+        return u, v, q, b, s, psi, cos, sin
+
+    @staticmethod
+    def _local_deflection(u, v, q, b, s, psi):
+        e = np.sqrt(1 - q**2)
+        return (b * q / e * np.arctan(e * u / (psi + s)),
+                b * q / e * np.arctanh(e * v / (psi + q**2 * s)))
+
+    def _deflection(self, x, y, p):
+        u, v, q, b, s, psi, cos, sin = PIEMD._local(x, y, p)
+        return self._rotate(*PIEMD._local_deflection(u, v, q, b, s, psi), cos, sin)
+
+    def _potential(self, x, y, p):
+        u, v, q, b, s, psi, _, _ = PIEMD._local(x, y, p)
+        au, av = PIEMD._local_deflection(u, v, q, b, s, psi)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            core = np.where(s > 0, b * q * s / 2 * np.log((psi + s)**2 + (1 - q**2) * u**2), 0.0)
+        return u * au + v * av - core
+
+    def _hessian(self, x, y, p):
+        u, v, q, b, s, psi, cos, sin = PIEMD._local(x, y, p)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = b * q / (psi * (u**2 + v**2 + 2 * s * psi + (1 + q**2) * s**2))
+        return self._rotate_hessian(scale * (q**2 * s**2 + v**2 + s * psi), -scale * u * v,
+                                    scale * (s**2 + u**2 + s * psi), cos, sin)
+
+    def _convergence(self, x, y, p):
+        u, v, q, _, _ = self._frame(x, y, p)
+        with np.errstate(divide="ignore"):
+            return p["theta_e"] / (2 * np.sqrt(p["w"] ** 2 + q * u**2 + v**2 / q))
+
+
+class SIE(MassProfile):
+    """
+    A singular isothermal ellipsoid: a PIEMD without core (w = 0).
+
+    Parameters:
+    x, y: The centre.
+    q: The axis ratio.
+    pa: The position angle in radians.
+    theta_e: The Einstein radius.
+    """
+    __slots__ = ("x", "y", "q", "pa", "theta_e")
+    glee_name = "sie"
+    parameters = ("x", "y", "q", "pa", "theta_e")
+
+    def __init__(self, x, y, q, pa, theta_e):
+        super().__init__(x=x, y=y, q=q, pa=pa, theta_e=theta_e)
+
+    def _deflection(self, x, y, p):
+        return PIEMD._deflection(self, x, y, dict(p, w=np.zeros_like(p["theta_e"])))
+
+    def _convergence(self, x, y, p):
+        return PIEMD._convergence(self, x, y, dict(p, w=np.zeros_like(p["theta_e"])))
+
+    def _potential(self, x, y, p):
+        return PIEMD._potential(self, x, y, dict(p, w=np.zeros_like(p["theta_e"])))
+
+    def _hessian(self, x, y, p):
+        return PIEMD._hessian(self, x, y, dict(p, w=np.zeros_like(p["theta_e"])))
+
+
+class PowerLaw(MassProfile):
+    """
+    An elliptical power-law mass distribution.
+
+    kappa = (3 - gamma) / 2 * (theta_e / sqrt(q u^2 + v^2 / q))^(gamma - 1), with gamma the slope of
+    the 3-D density (2 is isothermal). The deflection is the analytic series of Tessore & Metcalf
+    (2015), summed until its terms drop below 1e-12, and the potential is (x alpha_x + y alpha_y)
+    / (3 - gamma). The hessian is a central difference of the deflection.
+
+    Parameters:
+    x, y: The centre.
+    q: The axis ratio.
+    pa: The position angle in radians.
+    theta_e: The Einstein radius.
+    gamma: The 3-D density slope, between 1 and 3.
+    """
+    __slots__ = ("x", "y", "q", "pa", "theta_e", "gamma")
+    glee_name = "spemd"
+    parameters = ("x", "y", "q", "pa", "theta_e", "gamma")
+
+    def __init__(self, x, y, q, pa, theta_e, gamma):
+        super().__init__(x=x, y=y, q=q, pa=pa, theta_e=theta_e, gamma=gamma)
+        if not 1 < gamma.mean < 3:
+            raise ValueError("gamma must be between 1 and 3")
+
+    def _deflection(self, x, y, p):
+        u, v, q, cos, sin = self._frame(x, y, p)
+        t = p["gamma"] - 1
+        b = p["theta_e"] * np.sqrt(q)
+        R = np.maximum(np.sqrt(q**2 * u**2 + v**2), 1e-12)
+        phase = (q * u + 1j * v) / R
+        phase2 = phase**2
+        f = (1 - q) / (1 + q)
+        term = phase
+        omega = phase.copy()
+        fmax = float(np.max(f))
+        n_terms = 1 if fmax == 0 else int(min(500, np.ceil(np.log(1e-12) / np.log(fmax)) + 1))
+        for n in range(1, n_terms):
+            term = -f * (2 * n - (2 - t)) / (2 * n + (2 - t)) * phase2 * term
+            omega = omega + term
+        alpha = 2 * b / (1 + q) * (b / R) ** (t - 1) * omega
+        return self._rotate(alpha.real, alpha.imag, cos, sin)
+
+    def _potential(self, x, y, p):
+        ax, ay = self._deflection(x, y, p)
+        return ((x - p["x"]) * ax + (y - p["y"]) * ay) / (3 - p["gamma"])
+
+    def _convergence(self, x, y, p):
+        u, v, q, _, _ = self._frame(x, y, p)
+        t = p["gamma"] - 1
+        with np.errstate(divide="ignore"):
+            return (2 - t) / 2 * (p["theta_e"] / np.sqrt(q * u**2 + v**2 / q)) ** t
+
+
+class NFW(MassProfile):
+    """
+    A spherical Navarro-Frenk-White profile (Golse & Kneib 2002), with analytic deflection,
+    convergence, potential and hessian.
+
+    kappa = 2 kappa_s (1 - F(X)) / (X^2 - 1), X = r / r_s.
+
+    Parameters:
+    x, y: The centre.
+    kappa_s: The characteristic convergence.
+    r_s: The scale radius.
+    """
+    __slots__ = ("x", "y", "kappa_s", "r_s")
+    glee_name = "nfw"
+    parameters = ("x", "y", "kappa_s", "r_s")
+
+    def __init__(self, x, y, kappa_s, r_s):
+        super().__init__(x=x, y=y, kappa_s=kappa_s, r_s=r_s)
+
+    @staticmethod
+    def _F(X):
+        X = np.maximum(X, 1e-12)
+        inside = X < 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            Fi = np.arccosh(1 / np.where(inside, X, 0.5)) / np.sqrt(1 - np.where(inside, X, 0.5) ** 2)
+            Fo = np.arccos(1 / np.where(inside, 2.0, X)) / np.sqrt(np.where(inside, 2.0, X) ** 2 - 1)
+        F = np.where(inside, Fi, Fo)
+        return np.where(np.abs(X - 1) < 1e-6, 1 - 2 * (X - 1) / 3, F)
+
+    def _geometry(self, x, y, p):
+        dx, dy = x - p["x"], y - p["y"]
+        r = np.maximum(np.hypot(dx, dy), 1e-12)
+        return dx, dy, r, r / p["r_s"]
+
+    def _mean_convergence(self, X, p):
+        # Mean convergence within X: 4 kappa_s (ln(X / 2) + F(X)) / X^2.
+        return 4 * p["kappa_s"] * (np.log(X / 2) + self._F(X)) / X**2
+
+    def _deflection(self, x, y, p):
+        dx, dy, r, X = self._geometry(x, y, p)
+        scale = self._mean_convergence(X, p)
+        return scale * dx, scale * dy
+
+    def _convergence(self, x, y, p):
+        _, _, _, X = self._geometry(x, y, p)
+        near = np.abs(X - 1) < 1e-6
+        with np.errstate(invalid="ignore", divide="ignore"):
+            kappa = 2 * p["kappa_s"] * (1 - self._F(X)) / (X**2 - 1)
+        return np.where(near, 2 * p["kappa_s"] / 3 * np.ones_like(X), kappa)
+
+    def _potential(self, x, y, p):
+        # 2 kappa_s r_s^2 (ln^2(X / 2) - arccosh^2(1 / X)) inside X = 1, with +arccos^2(1 / X) outside.
+        _, _, _, X = self._geometry(x, y, p)
+        angle = np.where(X < 1, -np.arccosh(1 / np.minimum(X, 1)) ** 2, np.arccos(1 / np.maximum(X, 1)) ** 2)
+        return 2 * p["kappa_s"] * p["r_s"] ** 2 * (np.log(X / 2) ** 2 + angle)
+
+    def _hessian(self, x, y, p):
+        dx, dy, r, X = self._geometry(x, y, p)
+        kappa = self._convergence(x, y, p)
+        gamma = self._mean_convergence(X, p) - kappa
+        cos2 = (dx**2 - dy**2) / r**2
+        sin2 = 2 * dx * dy / r**2
+        return kappa - gamma * cos2, -gamma * sin2, kappa + gamma * cos2
+
+
+class Shear(MassProfile):
+    """
+    An external shear with potential psi = gamma / 2 (cos 2phi (dx^2 - dy^2) + 2 sin 2phi dx dy),
+    dx and dy relative to the reference point (x, y). The convergence is zero.
+
+    Parameters:
+    x, y: The reference point.
+    gamma: The shear strength.
+    phi: The shear angle in radians.
+    """
+    __slots__ = ("x", "y", "gamma", "phi")
+    glee_name = "shear"
+    parameters = ("x", "y", "gamma", "phi")
+
+    def __init__(self, x, y, gamma, phi):
+        super().__init__(x=x, y=y, gamma=gamma, phi=phi)
+
+    def _components(self, p):
+        return p["gamma"] * np.cos(2 * p["phi"]), p["gamma"] * np.sin(2 * p["phi"])
+
+    def _deflection(self, x, y, p):
+        g1, g2 = self._components(p)
+        dx, dy = x - p["x"], y - p["y"]
+        return g1 * dx + g2 * dy, g2 * dx - g1 * dy
+
+    def _convergence(self, x, y, p):
+        return np.zeros_like(x - p["x"])
+
+    def _potential(self, x, y, p):
+        g1, g2 = self._components(p)
+        dx, dy = x - p["x"], y - p["y"]
+        return (g1 * (dx**2 - dy**2) + 2 * g2 * dx * dy) / 2
+
+    def _hessian(self, x, y, p):
+        g1, g2 = self._components(p)
+        zero = np.zeros_like(x - p["x"])
+        return zero + g1, zero + g2, zero - g1
+
+
+class MassModel:
+    """
+    A class to represent the sum of the mass profiles of a lens.
+
+    The methods take params as a list with one dict (see MassProfile) per profile, or None for the
+    prior means, and sum the profiles. The reference deflection is computed once and scaled by
+    dds_ds for every ESource.
+
+    Attributes
+    ----------
+    profiles : list of MassProfile
+        The mass profiles.
+    """
+    def __init__(self, profiles):
+        if not all(isinstance(p, MassProfile) for p in profiles):
+            raise TypeError("profiles must be a list of MassProfile instances")
+        self.profiles = list(profiles)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.lenses)
+
+    def _each(self, params):
+        params = params or [None] * len(self.profiles)
+        if len(params) != len(self.profiles):
+            raise ValueError("params needs one entry per mass profile")
+        return zip(self.profiles, params)
+
+    def deflection(self, where, params=None, dds_ds=1.0):
+        """
+        Returns the summed deflection angles (alpha_x, alpha_y), scaled by dds_ds.
+        """
+        ax = ay = 0.0
+        for profile, p in self._each(params):
+            dx, dy = profile.deflection(where, p)
+            ax, ay = ax + dx, ay + dy
+        return dds_ds * np.asarray(ax), dds_ds * np.asarray(ay)
+
+    def convergence(self, where, params=None, dds_ds=1.0):
+        return dds_ds * sum(np.asarray(profile.convergence(where, p)) for profile, p in self._each(params))
+
+    def potential(self, where, params=None, dds_ds=1.0):
+        return dds_ds * sum(np.asarray(profile.potential(where, p)) for profile, p in self._each(params))
+
+    def hessian(self, where, params=None):
+        total = [0.0, 0.0, 0.0]
+        for profile, p in self._each(params):
+            total = [t + h for t, h in zip(total, profile.hessian(where, p))]
+        return tuple(np.asarray(t) for t in total)
+
+    def magnification(self, where, params=None, dds_ds=1.0):
+        return _magnification(self.hessian(where, params), dds_ds)
+
+    def ray_trace(self, where, params=None, dds_ds=(1.0,)):
+        """
+        Map positions to the source planes of several ESources with one deflection evaluation.
+
+        Returns
+        -------
+        list of tuple of numpy.ndarray
+            The source-plane positions (beta_x, beta_y) = (x, y) - dds_ds * alpha, one per dds_ds.
+        """
+        x, y = _points(where)
+        ax, ay = self.deflection(where, params)
+        return [(x - d * ax, y - d * ay) for d in dds_ds]
+
+
+# Maps the profile keyword used in GLEE configfiles to its class.
+MASS_PROFILES = {mp.glee_name: mp for mp in (PIEMD, SIE, PowerLaw, NFW, Shear)}
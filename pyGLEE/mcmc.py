@@ -0,0 +1,250 @@
+import os
+
+import numpy as np
+
+from .likelihood import free_light_parameters, LightChi2, Energy, parameter_names
+from .covariance import read_cov
+
+
+TARGET_ACCEPTANCE = 0.25
+
+
+class ChainWriter:
+    """
+    A class to append chain samples to a text file in blocks, keeping memory bounded.
+
+    Each row is "step chain chi2 <parameters...>"; the first line is a '#' header naming the columns.
+    With an offset, an existing file is cut to its first offset bytes (see tell) and appended to.
+    """
+    def __init__(self, path, names, buffer_steps=100, offset=None):
+        self.path = path
+        self.buffer_steps = buffer_steps
+        self._rows = []
+        if offset is None:
+            self._file = open(path, "w")
+            self._file.write("# step chain chi2 " + " ".join(names) + "\n")
+        else:
+            os.truncate(path, offset)
+            self._file = open(path, "a")
+
+    def append(self, step, x, chi2):
+        n = len(x)
+        self._rows.append(np.column_stack([np.full(n, step), np.arange(n), chi2, x]))
+        if len(self._rows) >= self.buffer_steps:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            block = np.concatenate(self._rows)
+            fmt = ["%d", "%d"] + ["%.10g"] * (block.shape[1] - 2)
+            np.savetxt(self._file, block, fmt=fmt)
+            self._rows = []
+        self._file.flush()
+
+    def tell(self):
+        """
+        Write the buffered rows and return the size of the file in bytes.
+        """
+        self.flush()
+        return self._file.tell()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def proposal_factor(optimisers, energy, cov=None):
+    """
+    Returns the sampling function and the Cholesky factor of the proposal covariance: cov if given,
+    else the sampling_cov of the Optimisers' CovarianceMatrix, else diag(energy.step^2).
+    """
+    sampling_f = "gaussian"
+    if cov is None and optimisers.cov is not None:
+        sampling_f = optimisers.cov.sampling_f
+        cov = read_cov(optimisers.cov.sampling_cov)
+    if cov is None:
+        cov = np.diag(energy.step ** 2)
+    cov = np.asarray(cov, dtype=float)
+    n = len(energy.start)
+    if cov.shape != (n, n):
+        raise ValueError(f"the covariance matrix is {cov.shape}, expected ({n}, {n}) for the free parameters")
+    return sampling_f, np.linalg.cholesky(cov)
+
+
+def proposal_noise(rng, sampling_f, chol, n):
+    """
+    Returns n proposal steps of unit scale, standard normal ('gaussian') or uniform with unit
+    variance ('flat') draws correlated by the Cholesky factor chol.
+    """
+    shape = (n, len(chol))
+    if sampling_f == "flat":
+        u = rng.uniform(-np.sqrt(3), np.sqrt(3), shape)
+    else:
+        u = rng.standard_normal(shape)
+    return u @ chol.T
+
+
+class McmcSampler:
+    """
+    A class to run McmcParameters in Python on many chains at once, as one (n_chains, n_params) array.
+
+    Proposals are x + mcmc_dS * L u, with L the Cholesky factor of the sampling_cov covariance (or of
+    diag(step^2) without a CovarianceMatrix) and u standard normal ('gaussian') or uniform with unit
+    variance ('flat'). A proposal is accepted with probability exp(-dE / mcmc_k), with the energy of
+    Energy. During burn-in the global step scale is adapted towards a 25% acceptance rate; after
+    burn-in it is kept fixed and the samples are written to disk in blocks.
+
+    With mcmc_dSini 0 all chains start at the prior means; with 1 each starts one random proposal step away.
+
+    Attributes
+    ----------
+    config : GleeConfig
+        The configuration to sample. Not modified.
+    n_chains : int
+        The number of chains.
+    parameters : list of tuple
+        The free parameters, as returned by free_light_parameters.
+    energy : Energy
+        The energy of parameter vectors.
+    dS : float
+        The current global step scale.
+    x : numpy.ndarray
+        The current state of the chains, after run().
+    acceptance : float
+        The acceptance rate after burn-in, after run().
+    """
+    def __init__(self, config, n_chains=100, chi2=None, parameters=None, cov=None):
+        if not isinstance(n_chains, int) or n_chains < 1:
+            raise ValueError("n_chains must be a positive int")
+        optimisers = config.header.optimisers
+        self.config = config
+        self.mcmc = optimisers.mcmc
+        self.n_chains = n_chains
+        self.parameters = free_light_parameters(config) if parameters is None else parameters
+        if not self.parameters:
+            raise ValueError("there are no free parameters to sample")
+        self.chi2 = LightChi2(config, self.parameters) if chi2 is None else chi2
+        self.energy = Energy(self.parameters, self.chi2)
+
+        self.sampling_f, self.chol = proposal_factor(optimisers, self.energy, cov)
+        self.dS = float(self.mcmc.mcmc_dS)
+        self.x = None
+        self.acceptance = None
+
+    def _proposal_noise(self, rng):
+        return proposal_noise(rng, self.sampling_f, self.chol, self.n_chains)
+
+    def _step(self, rng, x, e, chi2):
+        proposal = x + self.dS * self._proposal_noise(rng)
+        e_new, chi2_new = self.energy(proposal)
+        with np.errstate(invalid="ignore", over="ignore"):
+            accept = (e_new <= e) | (rng.random(self.n_chains) < np.exp(-(e_new - e) / self.mcmc.mcmc_k))
+        x[accept] = proposal[accept]
+        e[accept] = e_new[accept]
+        chi2[accept] = chi2_new[accept]
+        return accept
+
+    def run(self, path, n_burn=None, adapt_every=50, buffer_steps=100, rng=None, checkpoint=None):
+        """
+        Run mcmc_n steps per chain after burn-in, writing the samples to path.
+
+        Parameters
+        ----------
+        path : str
+            The chain file to write, see ChainWriter.
+        n_burn : int, optional
+            The number of burn-in steps. Defaults to mcmc_n // 5.
+        adapt_every : int, optional
+            The number of burn-in steps between step scale updates. Defaults to 50.
+        buffer_steps : int, optional
+            The number of steps kept in memory before writing. Defaults to 100.
+        rng : numpy.random.Generator, optional
+            The random generator. Defaults to one seeded with Header.seed.
+        checkpoint : Checkpoint, optional
+            Saves the chains, the step scale, the generator state and the length of the chain file.
+            If its file exists, the run continues from it, with its n_burn and adapt_every, cutting
+            the chain file back to the saved length; the result and the chain file are the same as
+            those of an uninterrupted run.
+
+        Returns
+        -------
+        numpy.ndarray
+            The final state of the chains, of shape (n_chains, n_params).
+        """
+        try:
+            return self._run(path, n_burn, adapt_every, buffer_steps, rng, checkpoint)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Shut down the thread pool of the chi2, if it has one; run() does this when it returns.
+        """
+        close = getattr(self.chi2, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self, path, n_burn=None, adapt_every=50, buffer_steps=100, rng=None, checkpoint=None):
+        if rng is None:
+            rng = np.random.default_rng(self.config.header.seed)
+        if n_burn is None:
+            n_burn = self.mcmc.mcmc_n // 5
+        restored = checkpoint.restore("mcmc", self.config, rng) if checkpoint is not None else None
+        if restored is None:
+            start, accepted, offset = 0, 0, None
+            x = np.tile(self.energy.start, (self.n_chains, 1))
+            if self.mcmc.mcmc_dSini == 1:
+                x = x + self.dS * self._proposal_noise(rng)
+            e, chi2 = self.energy(x)
+        else:
+            start, state, arrays = restored
+            if arrays["x"].shape != (self.n_chains, len(self.parameters)):
+                raise ValueError(f"the checkpoint holds chains of shape {arrays['x'].shape}")
+            x, e, chi2 = arrays["x"], arrays["e"], arrays["chi2"]
+            n_burn, adapt_every = state["n_burn"], state["adapt_every"]
+            self.dS, accepted, offset = state["dS"], state["accepted"], state["offset"]
+        total = n_burn + self.mcmc.mcmc_n
+        saved = start
+
+        def save(n):
+            nonlocal saved
+            checkpoint.save("mcmc", self.config, n, rng, dict(x=x, e=e, chi2=chi2), n_burn=n_burn,
+                            adapt_every=adapt_every, dS=self.dS, accepted=int(accepted),
+                            offset=writer.tell() if writer is not None else None)
+            saved = n
+
+        writer = None
+        for i in range(start, n_burn):
+            accepted += self._step(rng, x, e, chi2).sum()
+            if (i + 1) % adapt_every == 0:
+                rate = accepted / (adapt_every * self.n_chains)
+                self.dS *= np.exp(2 * (rate - TARGET_ACCEPTANCE))
+                accepted = 0
+            if checkpoint is not None and checkpoint.due(i + 1):
+                save(i + 1)
+
+        if start <= n_burn:
+            accepted = 0
+        with ChainWriter(path, parameter_names(self.parameters), buffer_steps, offset) as writer:
+            for i in range(max(start - n_burn, 0), self.mcmc.mcmc_n):
+                accepted += self._step(rng, x, e, chi2).sum()
+                writer.append(i, x, chi2)
+                if checkpoint is not None and checkpoint.due(n_burn + i + 1):
+                    save(n_burn + i + 1)
+            if checkpoint is not None and saved != total:
+                save(total)
+        self.acceptance = accepted / max(1, self.mcmc.mcmc_n * self.n_chains)
+        self.x = x
+        return x
@@ -0,0 +1,352 @@
+import asyncio
+import glob
+import inspect
+import math
+import os
+import re
+import tempfile
+import time
+
+from .runner import JobResult, write_configfile
+from .instrument import span, count
+
+
+_NUMBER = r"([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|[+-]?inf|nan)"
+
+# The values read from GLEE output lines, e.g. the siman progress line "T = 0.5  chi2 = 1523.4";
+# override per runner. The temperature is an upper-case T followed by '=' or ':', or the word temp or
+# temperature, so a lower-case "t = 3" (a time) or a configfile echo such as "siman_Tmin 1" is not read.
+PROGRESS_PATTERNS = {
+    "chi2": re.compile(r"(?i)\bchi\^?2\b\s*[:=]?\s*" + _NUMBER),
+    "temperature": re.compile(r"(?:\bT\s*[:=]|(?i:\btemp(?:erature)?\b)\s*[:=]?)\s*" + _NUMBER),
+}
+
+
+def parse_progress(line, patterns=PROGRESS_PATTERNS):
+    """
+    Returns the values found in one output line, as a dict of name to float (empty if none matched).
+
+    Parameters
+    ----------
+    line : str
+        The line.
+    patterns : dict of str to re.Pattern, optional
+        One pattern per value, its first group being the number. Defaults to PROGRESS_PATTERNS.
+    """
+    values = {}
+    for name, pattern in patterns.items():
+        match = pattern.search(line)
+        if match:
+            values[name] = float(match.group(1))
+    return values
+
+
+class Progress:
+    """
+    A class to represent one progress line of a running job.
+
+    Attributes
+    ----------
+    job : str
+        The job name.
+    source : str
+        'stdout' or the name of the watched output file the line was read from.
+    line : str
+        The line.
+    values : dict of str to float
+        The values parsed from the line.
+    elapsed : float
+        The seconds since the job started.
+    """
+    __slots__ = ("job", "source", "line", "values", "elapsed")
+
+    def __init__(self, job, source, line, values, elapsed):
+        self.job = job
+        self.source = source
+        self.line = line
+        self.values = values
+        self.elapsed = elapsed
+
+    @property
+    def chi2(self):
+        return self.values.get("chi2")
+
+    @property
+    def temperature(self):
+        return self.values.get("temperature")
+
+
+class Trajectory:
+    """
+    A class to represent the progress of one job so far, as passed to the stopping rules.
+
+    Attributes
+    ----------
+    job : str
+        The job name.
+    events : list of Progress
+        Every progress line, oldest first.
+    chi2 : list of float
+        The chi2 values, oldest first.
+    best : list of float
+        best[i] is the lowest of chi2[:i + 1], so rules compare windows in constant time.
+    """
+    def __init__(self, job):
+        self.job = job
+        self.events = []
+        self.chi2 = []
+        self.best = []
+
+    def add(self, event):
+        self.events.append(event)
+        if event.chi2 is not None:
+            self.chi2.append(event.chi2)
+            self.best.append(event.chi2 if not self.best else min(self.best[-1], event.chi2))
+
+
+class Stall:
+    """
+    A stopping rule: the best chi2 improved by no more than tolerance over the last window chi2 values.
+    """
+    def __init__(self, window, tolerance=0.0):
+        if not isinstance(window, int) or window < 1:
+            raise ValueError("window must be a positive int")
+        self.window = window
+        self.tolerance = tolerance
+
+    def __call__(self, trajectory):
+        best = trajectory.best
+        if len(best) > self.window and best[-self.window - 1] - best[-1] <= self.tolerance:
+            return f"chi2 stalled at {best[-1]:g} for {self.window} steps"
+
+
+class Diverge:
+    """
+    A stopping rule: the chi2 is not finite, or above factor times the best (positive) chi2 so far.
+    """
+    def __init__(self, factor=10.0):
+        if factor <= 1:
+            raise ValueError("factor must be larger than 1")
+        self.factor = factor
+
+    def __call__(self, trajectory):
+        if not trajectory.chi2:
+            return None
+        chi2, best = trajectory.chi2[-1], trajectory.best[-1]
+        if not math.isfinite(chi2):
+            return f"chi2 is {chi2}"
+        if best > 0 and chi2 > self.factor * best:
+            return f"chi2 {chi2:g} diverged from the best {best:g}"
+
+
+class Ceiling:
+    """
+    A stopping rule: after `after` chi2 values the best chi2 is still above max_chi2.
+    """
+    def __init__(self, max_chi2, after):
+        if not isinstance(after, int) or after < 1:
+            raise ValueError("after must be a positive int")
+        self.max_chi2 = max_chi2
+        self.after = after
+
+    def __call__(self, trajectory):
+        best = trajectory.best
+        if len(best) >= self.after and best[-1] > self.max_chi2:
+            return f"chi2 {best[-1]:g} still above {self.max_chi2:g} after {len(best)} steps"
+
+
+class AsyncGleeRunner:
+    """
+    A class to run and watch GLEE jobs from one asyncio event loop.
+
+    stdout, and any output files matching the watch patterns, are read as the job writes them. Lines
+    with values matching the patterns become Progress events, passed to the callbacks of the run
+    (plain functions or coroutine functions) and then to its stopping rules. A rule is a callable
+    taking the Trajectory and returning a reason string to terminate the job, or None; see Stall,
+    Diverge and Ceiling. A terminated job is sent SIGTERM, and SIGKILL after grace seconds.
+
+    Jobs use the same scratch layout as GleeRunner (stdout.txt, stderr.txt and the configfile in
+    <scratch>/<name>) and return JobResults, with `stopped` set to the reason of early termination.
+
+    Attributes
+    ----------
+    executable : str
+        The GLEE executable (or a stub with the same interface).
+    max_concurrent : int
+        The maximum number of concurrent GLEE processes. Defaults to the number of CPUs divided by threads_per_job.
+    scratch : str
+        The directory holding the job scratch directories.
+    timeout : float or None
+        The per-job timeout in seconds; a job that exceeds it is terminated and its returncode is None.
+    args : tuple of str
+        Extra arguments passed before the configfile.
+    threads_per_job : int
+        Exported as OMP_NUM_THREADS to every job.
+    watch : tuple of str
+        Glob patterns, relative to the job directory, of output files to tail.
+    poll : float
+        The seconds between checks of the watched files.
+    patterns : dict of str to re.Pattern
+        The values parsed from the lines, see parse_progress.
+    grace : float
+        The seconds between SIGTERM and SIGKILL.
+    """
+    def __init__(self, executable="glee", max_concurrent=None, scratch=None, timeout=None, args=(), threads_per_job=1,
+                 watch=(), poll=1.0, patterns=None, grace=5.0):
+        if max_concurrent is None:
+            max_concurrent = max(1, (os.cpu_count() or 1) // threads_per_job)
+        if not isinstance(max_concurrent, int) or max_concurrent < 1:
+            raise ValueError("max_concurrent must be a positive int")
+        self.executable = executable
+        self.max_concurrent = max_concurrent
+        self.scratch = os.path.abspath(scratch or tempfile.mkdtemp(prefix="pyglee_"))
+        self.timeout = timeout
+        self.args = tuple(args)
+        self.threads_per_job = threads_per_job
+        self.watch = tuple(watch)
+        self.poll = poll
+        self.patterns = PROGRESS_PATTERNS if patterns is None else patterns
+        self.grace = grace
+        os.makedirs(self.scratch, exist_ok=True)
+        self._count = 0
+        self._semaphore = None
+
+    def _name(self, name):
+        self._count += 1
+        return name or f"job{self._count:06d}"
+
+    async def run(self, config, name=None, callbacks=(), rules=()):
+        """
+        Run GLEE on a configuration, watching its progress.
+
+        Parameters
+        ----------
+        config : GleeConfig
+            The configuration.
+        name : str, optional
+            The job name, also its scratch directory name.
+        callbacks : list of callable, optional
+            Called with every Progress event; coroutine functions are awaited.
+        rules : list of callable, optional
+            The stopping rules.
+
+        Returns
+        -------
+        JobResult
+            The outcome of the job.
+        """
+        name = self._name(name)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self._semaphore:
+            workdir, configfile = write_configfile(config, self.scratch, name)
+            with span("glee.run", job=name, monitored=True) as s:
+                result = await self._run(name, workdir, configfile, callbacks, rules)
+                s.set(returncode=result.returncode, stopped=result.stopped)
+            count("glee.runs")
+            if result.stopped is not None:
+                count("glee.stopped")
+            return result
+
+    async def map(self, configs, names=None, callbacks=(), rules=()):
+        """
+        Run GLEE on many configurations at once and return their JobResults in order.
+        """
+        names = names or [None] * len(configs)
+        return await asyncio.gather(*(self.run(config, name, callbacks, rules) for config, name in zip(configs, names)))
+
+    async def _run(self, name, workdir, configfile, callbacks, rules):
+        trajectory = Trajectory(name)
+        stopped = stopping = None
+        start = time.perf_counter()
+        env = dict(os.environ, OMP_NUM_THREADS=str(self.threads_per_job))
+
+        async def handle(source, line):
+            nonlocal stopped, stopping
+            values = parse_progress(line, self.patterns)
+            if not values:
+                return
+            event = Progress(name, source, line, values, time.perf_counter() - start)
+            trajectory.add(event)
+            for callback in callbacks:
+                result = callback(event)
+                if inspect.isawaitable(result):
+                    await result
+            if stopped is None and process.returncode is None:
+                for rule in rules:
+                    reason = rule(trajectory)
+                    if reason:
+                        stopped = reason
+                        stopping = asyncio.ensure_future(self._terminate(process))
+                        break
+
+        async def read_stdout(out):
+            async for raw in process.stdout:
+                line = raw.decode(errors="replace")
+                out.write(line)
+                await handle("stdout", line.rstrip("\n"))
+            await process.wait()
+
+        with open(os.path.join(workdir, "stdout.txt"), "w") as out, \
+                open(os.path.join(workdir, "stderr.txt"), "w") as err:
+            process = await asyncio.create_subprocess_exec(self.executable, *self.args, os.path.basename(configfile),
+                                                           cwd=workdir, stdout=asyncio.subprocess.PIPE, stderr=err,
+                                                           env=env)
+            done = asyncio.Event()
+            tail = asyncio.ensure_future(self._tail(workdir, handle, done)) if self.watch else None
+            timed_out = False
+            try:
+                await asyncio.wait_for(read_stdout(out), self.timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+            finally:
+                if stopping is not None:
+                    await stopping
+                if process.returncode is None:
+                    await self._terminate(process)
+                if tail is not None:
+                    # Let the tail read what was written since its last poll before it returns.
+                    done.set()
+                    await tail
+        returncode = None if timed_out else process.returncode
+        return JobResult(name, workdir, configfile, returncode, 1, time.perf_counter() - start, stopped=stopped)
+
+    async def _tail(self, workdir, handle, done):
+        # Reads the watched files every poll seconds until done is set, then once more, and passes
+        # on the incomplete last lines the job left.
+        offsets = {}
+        partial = {}
+        finished = False
+        while not finished:
+            try:
+                await asyncio.wait_for(done.wait(), self.poll)
+                finished = True
+            except asyncio.TimeoutError:
+                pass
+            for pattern in self.watch:
+                for path in glob.glob(os.path.join(workdir, pattern)):
+                    try:
+                        with open(path, "rb") as f:
+                            f.seek(offsets.get(path, 0))
+                            chunk = f.read()
+                    except OSError:
+                        continue
+                    if not chunk:
+                        continue
+                    offsets[path] = offsets.get(path, 0) + len(chunk)
+                    *lines, partial[path] = (partial.get(path, "") + chunk.decode(errors="replace")).split("\n")
+                    for line in lines:
+                        await handle(os.path.basename(path), line)
+        for path, line in partial.items():
+            if line:
+                await handle(os.path.basename(path), line)
+
+    async def _terminate(self, process):
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), self.grace)
+        except ProcessLookupError:
+            pass
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
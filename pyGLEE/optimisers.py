@@ -113,6 +113,68 @@ class McmcParameters:
         values.append(f"mcmc_k {self.mcmc_k}")
         return "\n".join(values)
 
+class PtmcmcParameters:
+    """
+    A class to represent the parameters for parallel-tempering Markov Chain Monte Carlo.
+
+    Attributes
+    ----------
+    ptmcmc_n : int
+        The number of steps per chain.
+    ptmcmc_dS : float
+        The global scaling of step size at T = 1; hotter chains start at dS * sqrt(T).
+    ptmcmc_k : int
+        The analogous of Boltzmann constant factor in e[-E/kT].
+    ptmcmc_nT : int
+        The number of temperatures of the ladder, at least 2.
+    ptmcmc_Tmax : float
+        The temperature of the hottest chains. The ladder starts geometric between 1 and Tmax.
+    ptmcmc_swap : int
+        The number of steps between swap moves of neighbouring temperatures.
+    """
+    def __init__(self,
+                 ptmcmc_n,
+                 ptmcmc_dS,
+                 ptmcmc_k,
+                 ptmcmc_nT,
+                 ptmcmc_Tmax,
+                 ptmcmc_swap):
+        if not isinstance(ptmcmc_n, int):
+            raise TypeError("ptmcmc_n must be int")
+        if not isinstance(ptmcmc_dS, (int, float)):
+            raise TypeError("ptmcmc_dS must be int or float")
+        if not isinstance(ptmcmc_k, int):
+            raise TypeError("ptmcmc_k must be int")
+        if not isinstance(ptmcmc_nT, int):
+            raise TypeError("ptmcmc_nT must be int")
+        if not isinstance(ptmcmc_Tmax, (int, float)):
+            raise TypeError("ptmcmc_Tmax must be int or float")
+        if not isinstance(ptmcmc_swap, int):
+            raise TypeError("ptmcmc_swap must be int")
+        if ptmcmc_nT < 2:
+            raise ValueError("ptmcmc_nT must be at least 2")
+        if ptmcmc_Tmax <= 1:
+            raise ValueError("ptmcmc_Tmax must be larger than 1")
+        if ptmcmc_swap < 1:
+            raise ValueError("ptmcmc_swap must be at least 1")
+
+        self.ptmcmc_n = ptmcmc_n
+        self.ptmcmc_dS = ptmcmc_dS
+        self.ptmcmc_k = ptmcmc_k
+        self.ptmcmc_nT = ptmcmc_nT
+        self.ptmcmc_Tmax = ptmcmc_Tmax
+        self.ptmcmc_swap = ptmcmc_swap
+
+    def as_string(self):
+        values = []
+        values.append(f"ptmcmc_n {self.ptmcmc_n}")
+        values.append(f"ptmcmc_dS {self.ptmcmc_dS}")
+        values.append(f"ptmcmc_k {self.ptmcmc_k}")
+        values.append(f"ptmcmc_nT {self.ptmcmc_nT}")
+        values.append(f"ptmcmc_Tmax {self.ptmcmc_Tmax}")
+        values.append(f"ptmcmc_swap {self.ptmcmc_swap}")
+        return "\n".join(values)
+
 class CovarianceMatrix:
     """
     A class to represent a covariance matrix.
@@ -165,7 +227,8 @@ cov = CovarianceMatrix(sampling_f='gaussian',
 
 class Optimisers:
     """
-    A class to represent the optimizers which includes Simulated Annealing and Markov Chain Monte Carlo parameters.
+    A class to represent the optimizers which includes Simulated Annealing and Markov Chain Monte Carlo parameters,
+    and optionally parallel-tempering Markov Chain Monte Carlo parameters.
 
     Attributes
     ----------
@@ -175,24 +238,32 @@ class Optimisers:
         The parameters for Markov Chain Monte Carlo.
     cov_matrix : CovarianceMatrix, optional
         The covariance matrix, if provided.
+    ptmcmc_params : PtmcmcParameters, optional
+        The parameters for parallel-tempering Markov Chain Monte Carlo, required by the 'ptmcmc' minimiser.
     """
-    def __init__(self, siman_params, mcmc_params, cov_matrix=None):
+    def __init__(self, siman_params, mcmc_params, cov_matrix=None, ptmcmc_params=None):
         if not isinstance(siman_params, SimanParameters):
             raise TypeError("siman_params must be an instance of SimanParameters")
         if not isinstance(mcmc_params, McmcParameters):
             raise TypeError("mcmc_params must be an instance of McmcParameters")
         if cov_matrix is not None and not isinstance(cov_matrix, CovarianceMatrix):
             raise TypeError("cov_matrix must be an instance of CovarianceMatrix or None")
+        if ptmcmc_params is not None and not isinstance(ptmcmc_params, PtmcmcParameters):
+            raise TypeError("ptmcmc_params must be an instance of PtmcmcParameters or None")
 
         self.siman = siman_params
         self.mcmc = mcmc_params
         self.cov = cov_matrix
+        self.ptmcmc = ptmcmc_params
     
     def as_string(self):
         values = []
         values.append(self.siman.as_string())
         values.append("")  # Add a break
         values.append(self.mcmc.as_string())
+        if self.ptmcmc is not None:
+            values.append("")  # Add a break
+            values.append(self.ptmcmc.as_string())
         if self.cov is not None:
             values.append("")  # Add a break
             values.append(self.cov.as_string())
@@ -0,0 +1,216 @@
+import numpy as np
+
+from .priors import FlatPrior, ExactPrior, GaussianPrior
+
+
+def is_free(prior):
+    """
+    Whether a prior is a free parameter: not exact and not linked to another parameter.
+    """
+    return prior is not None and not isinstance(prior, ExactPrior) and prior.link is None
+
+
+def all_parameters(config):
+    """
+    List every prior-carrying parameter of a GleeConfig in configfile order.
+
+    Returns
+    -------
+    list of tuple
+        (esource index, light profile index, parameter name, prior) per parameter. The light
+        profile index is None for ESource parameters (z, dds_ds). Lens parameters come first,
+        as (None, mass profile index, parameter name, prior), then point-source parameters
+        (z, dds_ds, x, y, ddt) as ('psource', point source index, parameter name, prior).
+    """
+    params = []
+    for j, mp in enumerate(getattr(config, "lenses", [])):
+        for name in mp.parameters:
+            params.append((None, j, name, getattr(mp, name)))
+    for j, ps in enumerate(getattr(config, "point_sources", [])):
+        for name in ("z", "dds_ds", "x", "y", "ddt"):
+            if getattr(ps, name) is not None:
+                params.append(("psource", j, name, getattr(ps, name)))
+    for i, es in enumerate(config.e_source_list):
+        for name in ("z", "dds_ds"):
+            if getattr(es, name) is not None:
+                params.append((i, None, name, getattr(es, name)))
+        for j, lp in enumerate(es.light_profiles):
+            for name in lp.parameters:
+                params.append((i, j, name, getattr(lp, name)))
+    return params
+
+
+def free_parameters(config):
+    """
+    List the free parameters of a GleeConfig in configfile order, in the format of all_parameters.
+    """
+    return [p for p in all_parameters(config) if is_free(p[-1])]
+
+
+def free_light_parameters(config):
+    """
+    List the free light-profile parameters of the LensOnly ESources of a GleeConfig.
+
+    Returns
+    -------
+    list of tuple
+        (esource index, light profile index, parameter name, prior) per free parameter.
+    """
+    return [p for p in free_parameters(config)
+            if p[0] not in (None, "psource") and p[1] is not None
+            and config.e_source_list[p[0]].mod_light == "LensOnly"]
+
+
+def default_step(prior):
+    """
+    Returns the step size of a prior: its step if given, else a tenth of the flat range,
+    the Gaussian sigma, or a tenth of |mean| (1 if the mean is 0).
+    """
+    if prior.step is not None:
+        return float(prior.step)
+    if isinstance(prior, FlatPrior):
+        return 0.1 * (prior.upper - prior.lower)
+    if isinstance(prior, GaussianPrior):
+        return float(prior.sigma)
+    return 0.1 * abs(prior.mean) or 1.0
+
+
+def parameter_names(parameters):
+    """
+    Returns a name per parameter: its prior label, or its path (see parameter_path).
+    """
+    return [prior.label or parameter_path((i, j, name, prior)) for i, j, name, prior in parameters]
+
+
+def parameter_path(parameter):
+    """
+    Returns the path of a parameter tuple, such as "esource[0].light[1].r_eff", "lens[0].theta_e"
+    or "psource[0].x".
+    """
+    i, j, name, _ = parameter
+    if i is None:
+        return f"lens[{j}].{name}"
+    if i == "psource":
+        return f"psource[{j}].{name}"
+    return f"esource[{i}].{name}" if j is None else f"esource[{i}].light[{j}].{name}"
+
+
+def parameter_owner(config, parameter):
+    """
+    Returns the object holding the prior of a parameter tuple: a MassProfile, PointSource, ESource
+    or LightProfile.
+    """
+    i, j, _, _ = parameter
+    if i is None:
+        return config.lenses[j]
+    if i == "psource":
+        return config.point_sources[j]
+    return config.e_source_list[i] if j is None else config.e_source_list[i].light_profiles[j]
+
+
+class ParameterVector:
+    """
+    A class to map the priors of a GleeConfig to flat float64 arrays.
+
+    The index is built once. `bind` makes `mean` the storage of the prior means: every prior reads
+    and writes its mean at its index of the array, so writing a new vector (`values = x`) updates
+    the whole config in place without rebuilding any Prior.
+
+    Attributes
+    ----------
+    parameters : list of tuple
+        The parameters, in the format of all_parameters; element k of every array belongs to parameters[k].
+    names : list of str
+        The parameter names, see parameter_names.
+    mean : numpy.ndarray
+        The prior means.
+    lower, upper : numpy.ndarray
+        The flat prior bounds (+-inf for other priors).
+    sigma, centre : numpy.ndarray
+        The Gaussian prior sigmas and centres (nan for other priors).
+    step : numpy.ndarray
+        The step sizes, see default_step.
+    min : numpy.ndarray
+        The prior minima (-inf where not set).
+    gaussian : numpy.ndarray
+        The indices of the Gaussian priors.
+    """
+    def __init__(self, parameters):
+        priors = [p[-1] for p in parameters]
+        self.parameters = list(parameters)
+        self.names = parameter_names(self.parameters)
+        self.mean = np.array([p.mean for p in priors], dtype=np.float64)
+        self.lower = np.array([p.lower if isinstance(p, FlatPrior) else -np.inf for p in priors], dtype=np.float64)
+        self.upper = np.array([p.upper if isinstance(p, FlatPrior) else np.inf for p in priors], dtype=np.float64)
+        self.sigma = np.array([p.sigma if isinstance(p, GaussianPrior) else np.nan for p in priors], dtype=np.float64)
+        self.centre = np.array([p.centre if isinstance(p, GaussianPrior) else np.nan for p in priors],
+                               dtype=np.float64)
+        self.step = np.array([default_step(p) for p in priors], dtype=np.float64)
+        self.min = np.array([-np.inf if p.min is None else p.min for p in priors], dtype=np.float64)
+        self.gaussian = np.flatnonzero([isinstance(p, GaussianPrior) for p in priors])
+        self._bound = False
+
+    @classmethod
+    def from_config(cls, config, parameters=None, bind=True):
+        """
+        Build the vector of a GleeConfig.
+
+        Parameters
+        ----------
+        config : GleeConfig
+            The configuration.
+        parameters : list of tuple, optional
+            The parameters to index. Defaults to the free parameters of config.
+        bind : bool, optional
+            Whether to bind the priors to the vector. Defaults to True.
+        """
+        vector = cls(free_parameters(config) if parameters is None else parameters)
+        if bind:
+            vector.bind()
+        return vector
+
+    def __len__(self):
+        return len(self.mean)
+
+    @property
+    def bound(self):
+        return self._bound
+
+    @property
+    def values(self):
+        """
+        The current parameter vector, the `mean` array itself.
+        """
+        return self.mean
+
+    @values.setter
+    def values(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if x.shape != self.mean.shape:
+            raise ValueError(f"expected a vector of shape {self.mean.shape}, got {x.shape}")
+        self.mean[...] = x
+
+    @property
+    def bounds(self):
+        """
+        The effective (lower, upper) bounds: the flat prior bounds combined with the minima.
+        """
+        return np.maximum(self.lower, self.min), self.upper
+
+    def bind(self):
+        """
+        Make the priors read and write their means in `mean`. Returns the vector.
+        """
+        for k, (*_, prior) in enumerate(self.parameters):
+            prior._bind(self.mean, k)
+        self._bound = True
+        return self
+
+    def release(self):
+        """
+        Give the priors their current means back as plain numbers and unbind them.
+        """
+        for k, (*_, prior) in enumerate(self.parameters):
+            if prior._values is self.mean:
+                prior._release()
+        self._bound = False
@@ -0,0 +1,401 @@
+from functools import lru_cache
+
+import numpy as np
+
+from .priors import Prior
+
+
+# The chi2 types (Header.chi2type bits) computed by PointChi2.
+POINT_CHI2_TYPES = {1: "source position", 2: "image position", 4: "flux", 128: "time delay"}
+
+# Days per (Mpc / c) * arcsec^2, converting a Fermat potential difference in arcsec^2 times a
+# time-delay distance in Mpc into a time delay.
+DELAY_DAYS = 3.0856775814913673e22 / 299792458.0 * (np.pi / 648000) ** 2 / 86400
+
+
+class PointImage:
+    """
+    A class to represent an observed image of a point source.
+
+    Attributes
+    ----------
+    x, y : float
+        The observed position.
+    sigma : float
+        The positional uncertainty.
+    flux, sigma_flux : float or None
+        The measured flux and its uncertainty, if any.
+    delay, sigma_delay : float or None
+        The measured arrival time (days, any common zero point) and its uncertainty, if any.
+    """
+    __slots__ = ("x", "y", "sigma", "flux", "sigma_flux", "delay", "sigma_delay")
+
+    def __init__(self, x, y, sigma, flux=None, sigma_flux=None, delay=None, sigma_delay=None):
+        for name, value in (("x", x), ("y", y), ("sigma", sigma)):
+            if not isinstance(value, (int, float)):
+                raise TypeError(f"{name} must be int or float")
+        if sigma <= 0:
+            raise ValueError("sigma must be positive")
+        for name, value, error in (("flux", flux, sigma_flux), ("delay", delay, sigma_delay)):
+            if (value is None) != (error is None):
+                raise ValueError(f"{name} and sigma_{name} must be given together")
+            if value is not None:
+                if not isinstance(value, (int, float)) or not isinstance(error, (int, float)):
+                    raise TypeError(f"{name} and sigma_{name} must be int or float")
+                if error <= 0:
+                    raise ValueError(f"sigma_{name} must be positive")
+        self.x = x
+        self.y = y
+        self.sigma = sigma
+        self.flux = flux
+        self.sigma_flux = sigma_flux
+        self.delay = delay
+        self.sigma_delay = sigma_delay
+
+    def as_string(self):
+        """
+        Returns a GLEE string of the image: position and sigma, then 'flux:f,sigma' and 'delay:t,sigma' if measured.
+        """
+        line = f"      {self.x}  {self.y}  {self.sigma}"
+        if self.flux is not None:
+            line += f"  flux:{self.flux},{self.sigma_flux}"
+        if self.delay is not None:
+            line += f"  delay:{self.delay},{self.sigma_delay}"
+        return line
+
+
+class PointSource:
+    """
+    A class to represent a point source (e.g. a quasar) and its observed images.
+
+    Attributes
+    ----------
+    x, y : Prior
+        The source-plane position.
+    images : list of PointImage
+        The observed images.
+    dds_ds : Prior or None
+        The Dds/Ds ratio relative to the reference source plane of the lens (compulsory unless z given).
+    z : Prior or None
+        The redshift (compulsory unless dds_ds given).
+    ddt : Prior or None
+        The time-delay distance in Mpc, needed for the time-delay chi2.
+    """
+    __slots__ = ("x", "y", "images", "dds_ds", "z", "ddt")
+    parameters = ("x", "y")
+
+    def __init__(self, x, y, images, dds_ds=None, z=None, ddt=None):
+        if not isinstance(x, Prior):
+            raise TypeError("x must have a prior")
+        if not isinstance(y, Prior):
+            raise TypeError("y must have a prior")
+        if not isinstance(images, list) or not all(isinstance(im, PointImage) for im in images):
+            raise TypeError("images must be a list of PointImage instances")
+        for name, value in (("dds_ds", dds_ds), ("z", z), ("ddt", ddt)):
+            if value is not None and not isinstance(value, Prior):
+                raise TypeError(f"{name} must have a prior")
+        if z is None and dds_ds is None:
+            raise ValueError("Either z or dds_ds must be provided.")
+        self.x = x
+        self.y = y
+        self.images = images
+        self.dds_ds = dds_ds
+        self.z = z
+        self.ddt = ddt
+
+    def observed(self):
+        """
+        Returns the observed image positions and sigmas as arrays (x, y, sigma).
+        """
+        return tuple(np.array([getattr(im, name) for im in self.images], dtype=float) for name in ("x", "y", "sigma"))
+
+    def as_string(self):
+        values = []
+        for name in ("z", "dds_ds"):
+            prior = getattr(self, name)
+            if prior is not None:
+                values.append(f" {name:<8} {prior.mean}  {prior.prior_as_string()}")
+        for name in ("x", "y"):
+            prior = getattr(self, name)
+            values.append(f" {name:<8} {prior.mean}  {prior.prior_as_string()}")
+        if self.ddt is not None:
+            values.append(f" ddt      {self.ddt.mean}  {self.ddt.prior_as_string()}")
+        values.append(f" psource_images  {len(self.images)}")
+        for im in self.images:
+            values.append(im.as_string())
+        return "\n".join(values)
+
+
+@lru_cache(maxsize=8)
+def _triangles(n):
+    # Vertex indices of the two triangles of every cell of an n x n grid: (v00, v01, v11) and (v00, v11, v10).
+    v = np.arange((n + 1) ** 2).reshape(n + 1, n + 1)
+    v00, v01, v10, v11 = v[:-1, :-1].ravel(), v[:-1, 1:].ravel(), v[1:, :-1].ravel(), v[1:, 1:].ravel()
+    return np.concatenate([v00, v00]), np.concatenate([v01, v11]), np.concatenate([v11, v10])
+
+
+class ImageFinder:
+    """
+    A class to solve the lens equation beta = theta - dds_ds * alpha(theta) for the images of point sources.
+
+    The square image region is covered by n x n cells, each split into two triangles, and the grid
+    vertices are ray-traced once. For a source position, the triangles whose source-plane image
+    contains it give the starting points, which are refined together by Newton iterations. Each
+    iteration ray-traces the points and their central-difference stencils in one call, giving the
+    residual and the Jacobian d(beta)/d(theta) together. Finding the images of another source
+    position reuses the grid.
+
+    Attributes
+    ----------
+    centre : tuple of float
+        The centre of the image region.
+    size : float
+        The side of the image region.
+    n : int
+        The number of cells on a side.
+    dds_ds : float
+        The Dds/Ds ratio of the source plane.
+    """
+    def __init__(self, mass_model, params=None, centre=(0.0, 0.0), size=10.0, n=100, dds_ds=1.0, tol=1e-10,
+                 max_iter=20):
+        if not isinstance(n, int) or n < 2:
+            raise ValueError("n must be an int of at least 2")
+        if size <= 0:
+            raise ValueError("size must be positive")
+        self.mass_model = mass_model
+        self.params = params
+        self.centre = (float(centre[0]), float(centre[1]))
+        self.size = float(size)
+        self.n = n
+        self.dds_ds = float(dds_ds)
+        self.tol = tol
+        self.max_iter = max_iter
+        c = np.linspace(-self.size / 2, self.size / 2, n + 1)
+        X, Y = np.meshgrid(self.centre[0] + c, self.centre[1] + c)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            (BX, BY), = mass_model.ray_trace((X, Y), params, dds_ds=(self.dds_ds,))
+        self._vertices = (X.ravel(), Y.ravel())
+        bx, by = BX[0].ravel(), BY[0].ravel()
+        self._triangles = _triangles(n)
+        self._traced = tuple((bx[i], by[i]) for i in self._triangles)
+        (x0, y0), (x1, y1), (x2, y2) = self._traced
+        self._box = (np.minimum(np.minimum(x0, x1), x2), np.maximum(np.maximum(x0, x1), x2),
+                     np.minimum(np.minimum(y0, y1), y2), np.maximum(np.maximum(y0, y1), y2))
+        self._area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+
+    def _start(self, beta_x, beta_y):
+        # Starting points from the source-plane triangles containing beta, by barycentric interpolation.
+        xmin, xmax, ymin, ymax = self._box
+        k = np.flatnonzero((xmin <= beta_x) & (beta_x <= xmax) & (ymin <= beta_y) & (beta_y <= ymax)
+                           & (self._area != 0))
+        (x0, y0), (x1, y1), (x2, y2) = ((bx[k], by[k]) for bx, by in self._traced)
+        area = self._area[k]
+        w1 = ((beta_x - x0) * (y2 - y0) - (x2 - x0) * (beta_y - y0)) / area
+        w2 = ((x1 - x0) * (beta_y - y0) - (beta_x - x0) * (y1 - y0)) / area
+        w0 = 1 - w1 - w2
+        eps = -1e-9
+        inside = (w0 >= eps) & (w1 >= eps) & (w2 >= eps)
+        k = k[inside]
+        vx, vy = self._vertices
+        i0, i1, i2 = (i[k] for i in self._triangles)
+        w0, w1, w2 = w0[inside], w1[inside], w2[inside]
+        return w0 * vx[i0] + w1 * vx[i1] + w2 * vx[i2], w0 * vy[i0] + w1 * vy[i1] + w2 * vy[i2]
+
+    def find(self, beta_x, beta_y):
+        """
+        Returns the images of a source position as arrays (x, y, magnification), sorted by x.
+
+        Images are found inside the image region only; starting points that do not converge to
+        tol (in the source plane) within max_iter Newton steps are dropped.
+        """
+        x, y = self._start(float(beta_x), float(beta_y))
+        d = self.dds_ds
+        h = 1e-6 * self.size
+        found_x, found_y = [], []
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for _ in range(self.max_iter + 1):
+                if not len(x):
+                    break
+                (bx, by), = self.mass_model.ray_trace((np.concatenate([x, x + h, x - h, x, x]),
+                                                       np.concatenate([y, y, y, y + h, y - h])),
+                                                      self.params, dds_ds=(d,))
+                bx, by = bx[0].reshape(5, -1), by[0].reshape(5, -1)
+                rx, ry = beta_x - bx[0], beta_y - by[0]
+                converged = np.abs(rx) + np.abs(ry) < self.tol
+                found_x.append(x[converged])
+                found_y.append(y[converged])
+                active = ~converged & np.isfinite(rx) & np.isfinite(ry)
+                a11, a21 = (bx[1] - bx[2]) / (2 * h), (by[1] - by[2]) / (2 * h)
+                a12, a22 = (bx[3] - bx[4]) / (2 * h), (by[3] - by[4]) / (2 * h)
+                det = a11 * a22 - a12 * a21
+                x = x[active] + ((a22 * rx - a12 * ry) / det)[active]
+                y = y[active] + ((a11 * ry - a21 * rx) / det)[active]
+        x, y = np.concatenate(found_x), np.concatenate(found_y)
+        half = self.size / 2
+        inside = (np.abs(x - self.centre[0]) <= half) & (np.abs(y - self.centre[1]) <= half)
+        x, y = x[inside], y[inside]
+        # Neighbouring triangles converge to the same image; keep one per image.
+        order = np.lexsort((y, x))
+        x, y = x[order], y[order]
+        keep = []
+        merge = 1e-6 * self.size
+        for i in range(len(x)):
+            if all(abs(x[i] - x[j]) > merge or abs(y[i] - y[j]) > merge for j in keep):
+                keep.append(i)
+        x, y = x[keep], y[keep]
+        mu = self.mass_model.magnification((x, y), self.params, dds_ds=d)[0] if len(x) else np.zeros(0)
+        return x, y, mu
+
+
+def match_images(predicted_x, predicted_y, observed_x, observed_y):
+    """
+    Match observed images to predicted ones one to one, nearest pairs first, using a KD-tree.
+
+    Returns
+    -------
+    numpy.ndarray
+        The index of the predicted image matched to each observed image, -1 where none is left.
+    """
+    from scipy.spatial import cKDTree
+    match = np.full(len(observed_x), -1)
+    if not len(predicted_x) or not len(observed_x):
+        return match
+    tree = cKDTree(np.column_stack([predicted_x, predicted_y]))
+    k = min(len(predicted_x), len(observed_x))
+    distance, index = tree.query(np.column_stack([observed_x, observed_y]), k=k)
+    distance, index = distance.reshape(len(observed_x), k), index.reshape(len(observed_x), k)
+    observed = np.repeat(np.arange(len(observed_x)), k)
+    taken = set()
+    for i in np.argsort(distance.ravel(), kind="stable"):
+        o, p = observed[i], index.ravel()[i]
+        if match[o] < 0 and p not in taken:
+            match[o] = p
+            taken.add(p)
+    return match
+
+
+def fermat_differences(mass_model, params, x, y, beta_x, beta_y, dds_ds=1.0, nodes=16, segments=4):
+    """
+    Returns the Fermat potential of the images (x, y) relative to the first one, in arcsec^2.
+
+    The potential differences are line integrals of the deflection along straight paths from the
+    first image, so they need only the deflections of the mass profiles. The integrals use composite
+    Gauss-Legendre quadrature, with extra breakpoints where a path passes closest to a profile
+    centre, since the deflection of a cuspy profile jumps there.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    dx, dy = x - x[0], y - y[0]
+    length2 = np.where(dx**2 + dy**2 > 0, dx**2 + dy**2, 1.0)
+    breaks = [np.broadcast_to(np.linspace(0, 1, segments + 1), (len(x), segments + 1))]
+    for profile, p in mass_model._each(params):
+        p = profile.parameter_arrays(p)
+        if "x" in p and "y" in p:
+            t = ((p["x"][0] - x[0]) * dx + (p["y"][0] - y[0]) * dy) / length2
+            breaks.append(np.clip(t, 0, 1)[:, None])
+    breaks = np.sort(np.concatenate(breaks, axis=1), axis=1)
+    u, w = np.polynomial.legendre.leggauss(nodes)
+    a, h = breaks[:, :-1, None], np.diff(breaks, axis=1)[:, :, None] / 2
+    t = (a + h * (u + 1)).reshape(len(x), -1)
+    w = (h * w).reshape(len(x), -1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ax, ay = mass_model.deflection((x[0] + dx[:, None] * t, y[0] + dy[:, None] * t), params)
+    psi = np.sum((ax[0] * dx[:, None] + ay[0] * dy[:, None]) * w, axis=1)
+    geometry = ((x - beta_x) ** 2 + (y - beta_y) ** 2) / 2
+    return geometry - geometry[0] - dds_ds * psi
+
+
+class PointChi2:
+    """
+    A class to compute the point-source chi2 terms selected by the bits of a chi2type.
+
+    - 1: source position; the observed images are mapped to the source plane and their offsets from
+      the source position are projected back through the inverse magnification tensor.
+    - 2: image position; the images predicted by an ImageFinder are matched to the observed ones
+      (see match_images). A missing image gives an infinite chi2.
+    - 4: flux; |magnification| times the source flux, which is solved for analytically.
+    - 128: time delay; the Fermat potential differences times the time-delay distance ddt, against
+      the measured delays relative to the first image with a delay, with the sigma_delay of the later image.
+
+    Magnifications and Fermat potentials are evaluated at the observed positions. Other bits are ignored.
+
+    Attributes
+    ----------
+    point_sources : list of PointSource
+        The point sources.
+    chi2type : int
+        The chi2 bitmask.
+    n : int
+        The cells on a side of the image finder grid.
+    """
+    def __init__(self, point_sources, chi2type, n=60):
+        if not isinstance(chi2type, int) or chi2type <= 0:
+            raise ValueError("chi2type must be a positive int")
+        if chi2type & 1 and chi2type & 2:
+            raise ValueError("the source and image position chi2 (1 and 2) cannot be combined")
+        for ps in point_sources:
+            if ps.dds_ds is None:
+                raise ValueError("point sources need dds_ds to be evaluated")
+            if chi2type & 128 and ps.ddt is None and any(im.delay is not None for im in ps.images):
+                raise ValueError("the time-delay chi2 needs ddt for point sources with delays")
+        self.point_sources = point_sources
+        self.chi2type = chi2type
+        self.n = n
+        self._regions = []
+        for ps in point_sources:
+            ox, oy, _ = ps.observed()
+            centre = (ox.mean(), oy.mean())
+            extent = np.max(np.hypot(ox - centre[0], oy - centre[1]), initial=0.0)
+            self._regions.append((centre, max(3 * extent, 1.0)))
+
+    def terms(self, mass_model, params=None):
+        """
+        Returns the chi2 per selected type, summed over the point sources, as a dict of type to float.
+        """
+        terms = {t: 0.0 for t in POINT_CHI2_TYPES if self.chi2type & t}
+        for ps, (centre, size) in zip(self.point_sources, self._regions):
+            d = ps.dds_ds.mean
+            bx, by = ps.x.mean, ps.y.mean
+            ox, oy, sigma = ps.observed()
+            if self.chi2type & (1 | 4):
+                xx, xy, yy = (h[0] for h in mass_model.hessian((ox, oy), params))
+                a11, a12, a22 = 1 - d * xx, -d * xy, 1 - d * yy
+                det = a11 * a22 - a12**2
+            if self.chi2type & 1:
+                (sx, sy), = mass_model.ray_trace((ox, oy), params, dds_ds=(d,))
+                ex, ey = bx - sx[0], by - sy[0]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    dx, dy = (a22 * ex - a12 * ey) / det, (a11 * ey - a12 * ex) / det
+                terms[1] += float(np.sum((dx**2 + dy**2) / sigma**2))
+            if self.chi2type & 2:
+                finder = ImageFinder(mass_model, params, centre, size, self.n, d)
+                px, py, _ = finder.find(bx, by)
+                match = match_images(px, py, ox, oy)
+                if np.any(match < 0):
+                    terms[2] = np.inf
+                else:
+                    terms[2] += float(np.sum(((px[match] - ox)**2 + (py[match] - oy)**2) / sigma**2))
+            if self.chi2type & 4:
+                k = [i for i, im in enumerate(ps.images) if im.flux is not None]
+                if k:
+                    f = np.array([ps.images[i].flux for i in k])
+                    s = np.array([ps.images[i].sigma_flux for i in k])
+                    with np.errstate(divide="ignore"):
+                        mu = np.abs(1 / det[k])
+                    source = np.sum(f * mu / s**2) / np.sum(mu**2 / s**2)
+                    terms[4] += float(np.sum((f - source * mu)**2 / s**2))
+            if self.chi2type & 128:
+                k = [i for i, im in enumerate(ps.images) if im.delay is not None]
+                if len(k) > 1:
+                    phi = fermat_differences(mass_model, params, ox[k], oy[k], bx, by, d)
+                    model = DELAY_DAYS * ps.ddt.mean * phi[1:]
+                    t = np.array([ps.images[i].delay for i in k])
+                    s = np.array([ps.images[i].sigma_delay for i in k])
+                    terms[128] += float(np.sum((model - (t[1:] - t[0]))**2 / s[1:]**2))
+        return terms
+
+    def __call__(self, mass_model, params=None):
+        """
+        Returns the total point-source chi2 for the mass parameters (prior means overridden by params,
+        one dict per mass profile as for MassModel).
+        """
+        return sum(self.terms(mass_model, params).values())
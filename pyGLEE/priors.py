@@ -1,7 +1,16 @@
+import numpy as np
+
+
 class Prior():
     """ 
     A class to represent a prior for a parameter in GLEE.
+
+    Priors are slotted (no per-instance __dict__) to keep large ensembles of configurations small;
+    use `from_arrays` on a subclass to build many priors with one vectorised validation.
     """
+    __slots__ = ("_mean", "_values", "_index", "label", "type", "step", "link", "link_a", "min")
+    _glee_type = ""
+
     def __init__(self, mean, label="", type="", step=None, link=None, link_a=None, min=None):
         if not isinstance(mean, (int, float)):
             raise TypeError("mean must be a number")
@@ -18,6 +27,8 @@ class Prior():
                 raise TypeError("link_a must be a list of three numbers")
         if min is not None and not isinstance(min, (int, float)):
             raise TypeError("min must be a number")
+        self._values = None
+        self._index = None
         self.mean = mean
         self.label = label
         self.type = type
@@ -26,9 +37,100 @@ class Prior():
         self.link_a = link_a
         self.min = min
 
+    @property
+    def mean(self):
+        """
+        The mean value; read from and written to the array of a bound ParameterVector if bound.
+
+        While the array holds the value last set on the prior, that value is returned as it was
+        given (an int stays an int), so binding does not change as_string or config_hash.
+        """
+        if self._values is None:
+            return self._mean
+        value = self._values[self._index]
+        if value == self._mean:
+            return self._mean
+        return float(value)
+
+    @mean.setter
+    def mean(self, value):
+        self._mean = value
+        if self._values is not None:
+            self._values[self._index] = value
+
+    def _bind(self, values, index):
+        self._values = values
+        self._index = index
+
+    def _release(self):
+        if self._values is not None:
+            self._mean = self.mean
+            self._values = None
+            self._index = None
+
+    @classmethod
+    def _from_columns(cls, columns, label="", step=None, min=None):
+        """
+        Build priors from validated columns, skipping the per-object checks of __init__.
+
+        Args:
+            columns (dict): Maps field names (mean and the bounds of the subclass) to arrays.
+            label (str or list of str, optional): One label for all priors or one per prior.
+            step (float or array, optional): The step sizes. Defaults to None.
+            min (float or array, optional): The minima. Defaults to None.
+
+        Returns:
+            list: The priors.
+        """
+        optional = {"step": step, "min": min}
+        arrays = {}
+        for name, values in list(columns.items()) + [(k, v) for k, v in optional.items() if v is not None]:
+            values = np.asarray(values)
+            if values.dtype.kind not in "biuf":
+                raise TypeError(f"{name} must be numbers")
+            if values.ndim > 1:
+                raise ValueError(f"{name} must be a number or a 1-D array")
+            arrays[name] = values
+        if not isinstance(label, str):
+            label = list(label)
+            if not all(isinstance(l, str) for l in label):
+                raise TypeError("label must be a string or a list of strings")
+            arrays["label"] = np.asarray(label, dtype=object)
+        try:
+            n = np.broadcast_shapes(*(a.shape for a in arrays.values()), (1,))[0]
+        except ValueError:
+            raise ValueError("all arrays must have the same length") from None
+        if "lower" in arrays and np.any(np.broadcast_to(arrays["lower"] >= arrays["upper"], (n,))):
+            raise ValueError("lower bound must be less than upper bound")
+        def column(name, default=None):
+            if name in arrays:
+                return np.broadcast_to(arrays[name], (n,)).tolist()
+            return [default] * n
+
+        extra = [(name, column(name)) for name in columns if name != "mean"]
+        new = cls.__new__
+        glee_type = cls._glee_type
+        priors = []
+        for mean, label, step, min in zip(column("mean"), column("label", label), column("step"), column("min")):
+            prior = new(cls)
+            prior._values = prior._index = prior.link = prior.link_a = None
+            prior._mean = mean
+            prior.label = label
+            prior.type = glee_type
+            prior.step = step
+            prior.min = min
+            priors.append(prior)
+        for name, column in extra:
+            for prior, value in zip(priors, column):
+                setattr(prior, name, value)
+        return priors
+
 
 
 class FlatPrior(Prior):
+    __slots__ = ("lower", "upper")
+    _glee_type = "flat"
+
     def __init__(self, mean, lower, upper, label="", step=None, link=None, link_a=None, min=None):
         """
         Initialize a FlatPrior object.
@@ -57,6 +159,21 @@ class FlatPrior(Prior):
         self.lower = lower
         self.upper = upper
 
+    @classmethod
+    def from_arrays(cls, mean, lower, upper, label="", step=None, min=None):
+        """
+        Build many FlatPriors at once, validating whole arrays instead of every object.
+
+        Args:
+            mean, lower, upper (float or array): The means and bounds, broadcast to a common length.
+            label (str or list of str, optional): One label for all priors or one per prior. Defaults to "".
+            step, min (float or array, optional): Defaults to None.
+
+        Returns:
+            list of FlatPrior: The priors.
+        """
+        return cls._from_columns({"mean": mean, "lower": lower, "upper": upper}, label, step, min)
+
     def prior_as_string(self):
         """
         Convert the prior to a string representation for GLEE.
@@ -82,8 +199,19 @@ class ExactPrior(Prior):
         link_a (arr, optional): The link parameter for the prior. For a linked value x, new value y=a+bx^c .Defaults to None.
         min (float, optional): The minimum value for the prior. Defaults to None.
     """    
+    __slots__ = ()
+    _glee_type = "exact"
+
     def __init__(self, mean, label="", step=None, link=None, link_a=None, min=None):
         super().__init__(mean, label=label, type="exact", step=step, link=link, link_a=link_a, min=min)
+
+    @classmethod
+    def from_arrays(cls, mean, label="", step=None, min=None):
+        """
+        Build many ExactPriors at once, see FlatPrior.from_arrays.
+        """
+        return cls._from_columns({"mean": mean}, label, step, min)
+
     def prior_as_string(self):
         """
         Convert the prior to a string representation for GLEE.
@@ -109,8 +237,19 @@ class NoPrior(Prior):
         link_a (arr, optional): The link parameter for the prior. For a linked value x, new value y=a+bx^c .Defaults to None.
         min (float, optional): The minimum value for the prior. Defaults to None.
     """    
+    __slots__ = ()
+    _glee_type = "noprior"
+
     def __init__(self, mean, label="", step=None, link=None, link_a=None, min=None):
         super().__init__(mean, label=label, type="noprior", step=step, link=link, link_a=link_a, min=min)
+
+    @classmethod
+    def from_arrays(cls, mean, label="", step=None, min=None):
+        """
+        Build many NoPriors at once, see FlatPrior.from_arrays.
+        """
+        return cls._from_columns({"mean": mean}, label, step, min)
+
     def prior_as_string(self):
         """
         Convert the prior to a string representation for GLEE.
@@ -125,19 +264,36 @@ class GaussianPrior(Prior):
     """
     Initialize a NoPrior object.
     Args:
-        mean (float): The mean value of the prior.
+        mean (float): The mean value of the prior, the starting value of the parameter.
         sigma (float): The sigma value for the prior. 
+        centre (float, optional): The centre of the Gaussian. Defaults to mean; kept when the mean is
+            moved, e.g. to a best fit, so the prior itself does not move.
         type (str, fixed): The type of the prior. Set to "gaussian".
         step (float, optional): The step size for the prior. Defaults to None.
         link (str, optional): The link for the prior. Defaults to None.
         link_a (arr, optional): The link parameter for the prior. For a linked value x, new value y=a+bx^c .Defaults to None.
         min (float, optional): The minimum value for the prior. Defaults to None.
     """    
-    def __init__(self, mean, sigma, label="", step=None, link=None, link_a=None, min=None):
+    __slots__ = ("sigma", "centre")
+    _glee_type = "gaussian"
+
+    def __init__(self, mean, sigma, label="", step=None, link=None, link_a=None, min=None, centre=None):
         super().__init__(mean, label=label, type="gaussian", step=step, link=link, link_a=link_a, min=min)
         if not isinstance(sigma, (int, float)):
             raise TypeError("sigma must be a number")
+        if centre is not None and not isinstance(centre, (int, float)):
+            raise TypeError("centre must be a number")
         self.sigma = sigma
+        self.centre = mean if centre is None else centre
+
+    @classmethod
+    def from_arrays(cls, mean, sigma, label="", step=None, min=None, centre=None):
+        """
+        Build many GaussianPriors at once, see FlatPrior.from_arrays.
+        """
+        return cls._from_columns({"mean": mean, "sigma": sigma, "centre": mean if centre is None else centre},
+                                 label, step, min)
+
     def prior_as_string(self):
         """
         Convert the prior to a string representation for GLEE.
@@ -145,5 +301,5 @@ class GaussianPrior(Prior):
         Returns:
             str: The string representation of the prior.
         """
-        glee_string = f"""{self.type}:{self.mean},{self.sigma}  {f"label:{self.label}" if self.label else ""}    {f"min:{self.min}" if self.min is not None else ""}  {f"step:{self.step}" if self.step is not None else ""}   {f"link:{self.link}" if self.link is not None else ""} {f"a:{self.link_a[0]},{self.link_a[1]},{self.link_a[2]}" if self.link_a is not None else ""}"""        
+        glee_string = f"""{self.type}:{self.centre},{self.sigma}  {f"label:{self.label}" if self.label else ""}    {f"min:{self.min}" if self.min is not None else ""}  {f"step:{self.step}" if self.step is not None else ""}   {f"link:{self.link}" if self.link is not None else ""} {f"a:{self.link_a[0]},{self.link_a[1]},{self.link_a[2]}" if self.link_a is not None else ""}"""        
         return glee_string
@@ -0,0 +1,216 @@
+import numpy as np
+
+from .likelihood import free_light_parameters, LightChi2, Energy, parameter_names
+from .mcmc import ChainWriter, TARGET_ACCEPTANCE, proposal_factor, proposal_noise
+
+
+class ParallelTempering:
+    """
+    A class to run PtmcmcParameters in Python: a ladder of ptmcmc_nT temperatures with n_chains chains
+    each, stepped together as one (ptmcmc_nT * n_chains, n_params) array.
+
+    At temperature T a proposal x + dS(T) L u (see McmcSampler) is accepted with probability
+    exp(-dE / (ptmcmc_k T)), with the energy of Energy, so one likelihood call moves every chain of
+    the ladder. Every ptmcmc_swap steps, from the hottest pair down, each chain at T(i) is paired with
+    a random chain at T(i+1) and the two swap states with probability
+    exp((1/T(i) - 1/T(i+1)) (E(i) - E(i+1)) / ptmcmc_k), letting the cold chains jump between modes the
+    hot chains reach.
+
+    All chains start one random T = 1 proposal step away from the prior means, and proposals with an
+    infinite energy are always rejected. The ladder starts geometric between 1 and ptmcmc_Tmax.
+    During burn-in the spacing of the intermediate temperatures is adapted towards equal swap rates
+    between all neighbours (Vousden, Farr & Mandel 2016), with T = 1 and ptmcmc_Tmax fixed, and the
+    step scale of each temperature towards a 25% acceptance rate. After burn-in both are kept fixed
+    and the T = 1 samples are written to disk in blocks, in the chain file format of McmcSampler.
+
+    Attributes
+    ----------
+    config : GleeConfig
+        The configuration to sample. Not modified.
+    n_chains : int
+        The number of chains per temperature.
+    parameters : list of tuple
+        The free parameters, as returned by free_light_parameters.
+    energy : Energy
+        The energy of parameter vectors.
+    temperatures : numpy.ndarray
+        The current temperature ladder, coldest first.
+    dS : numpy.ndarray
+        The current step scale of each temperature.
+    x : numpy.ndarray
+        The current state of the T = 1 chains, after run().
+    acceptance : numpy.ndarray
+        The acceptance rate of each temperature after burn-in, after run().
+    swap_acceptance : numpy.ndarray
+        The swap acceptance rate of each pair of neighbouring temperatures after burn-in, after run().
+    """
+    def __init__(self, config, n_chains=20, chi2=None, parameters=None, cov=None):
+        if not isinstance(n_chains, int) or n_chains < 1:
+            raise ValueError("n_chains must be a positive int")
+        optimisers = config.header.optimisers
+        if optimisers.ptmcmc is None:
+            raise ValueError("the optimisers have no PtmcmcParameters")
+        self.config = config
+        self.ptmcmc = optimisers.ptmcmc
+        self.n_chains = n_chains
+        self.parameters = free_light_parameters(config) if parameters is None else parameters
+        if not self.parameters:
+            raise ValueError("there are no free parameters to sample")
+        self.chi2 = LightChi2(config, self.parameters) if chi2 is None else chi2
+        self.energy = Energy(self.parameters, self.chi2)
+        self.sampling_f, self.chol = proposal_factor(optimisers, self.energy, cov)
+        p = self.ptmcmc
+        self.temperatures = np.geomspace(1.0, float(p.ptmcmc_Tmax), p.ptmcmc_nT)
+        self.dS = p.ptmcmc_dS * np.sqrt(self.temperatures)
+        self.x = None
+        self.acceptance = None
+        self.swap_acceptance = None
+
+    def _step(self, rng, x, e, chi2):
+        nT, n, m = x.shape
+        noise = proposal_noise(rng, self.sampling_f, self.chol, nT * n).reshape(nT, n, m)
+        proposal = x + self.dS[:, None, None] * noise
+        e_new, chi2_new = (a.reshape(nT, n) for a in self.energy(proposal.reshape(nT * n, m)))
+        kT = self.ptmcmc.ptmcmc_k * self.temperatures[:, None]
+        with np.errstate(invalid="ignore", over="ignore"):
+            accept = np.isfinite(e_new) & ((e_new <= e) | (rng.random((nT, n)) < np.exp(-(e_new - e) / kT)))
+        x[accept] = proposal[accept]
+        e[accept] = e_new[accept]
+        chi2[accept] = chi2_new[accept]
+        return accept.sum(axis=1)
+
+    def _swap(self, rng, x, e, chi2):
+        # Returns the number of accepted swaps of each pair (i, i + 1).
+        beta = 1 / (self.ptmcmc.ptmcmc_k * self.temperatures)
+        accepted = np.zeros(len(beta) - 1, dtype=int)
+        for i in range(len(beta) - 2, -1, -1):
+            partner = rng.permutation(self.n_chains)
+            with np.errstate(invalid="ignore", over="ignore"):
+                accept = rng.random(self.n_chains) < np.exp((beta[i] - beta[i + 1]) * (e[i] - e[i + 1, partner]))
+            cold, hot = np.nonzero(accept)[0], partner[accept]
+            for a in (x, e, chi2):
+                a[i, cold], a[i + 1, hot] = a[i + 1, hot], a[i, cold]
+            accepted[i] = len(cold)
+        return accepted
+
+    def _adapt_ladder(self, rates, kappa):
+        # Each intermediate spacing grows where the pair below it swaps more often than the pair above.
+        T = self.temperatures
+        spacing = np.diff(T)[:-1] * np.exp(kappa * (rates[:-1] - rates[1:]))
+        inner = T[0] + np.cumsum(spacing)
+        if len(inner) and inner[-1] < T[-1]:
+            self.temperatures = np.concatenate([T[:1], inner, T[-1:]])
+
+    def run(self, path, n_burn=None, adapt_every=50, adapt_lag=1000, adapt_time=10, buffer_steps=100, rng=None,
+            checkpoint=None):
+        """
+        Run ptmcmc_n steps per chain after burn-in, writing the T = 1 samples to path.
+
+        Parameters
+        ----------
+        path : str
+            The chain file to write, see ChainWriter.
+        n_burn : int, optional
+            The number of burn-in steps. Defaults to ptmcmc_n // 5.
+        adapt_every : int, optional
+            The number of burn-in steps between step scale updates. Defaults to 50.
+        adapt_lag, adapt_time : float, optional
+            After t swap moves the ladder moves by kappa = adapt_lag / (adapt_lag + t) / adapt_time
+            times the swap rate differences. Default to 1000 and 10.
+        buffer_steps : int, optional
+            The number of steps kept in memory before writing. Defaults to 100.
+        rng : numpy.random.Generator, optional
+            The random generator. Defaults to one seeded with Header.seed.
+        checkpoint : Checkpoint, optional
+            As for McmcSampler.run, with the ladder and step scales also saved.
+
+        Returns
+        -------
+        numpy.ndarray
+            The final state of the T = 1 chains, of shape (n_chains, n_params).
+        """
+        try:
+            return self._run(path, n_burn, adapt_every, adapt_lag, adapt_time, buffer_steps, rng, checkpoint)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Shut down the thread pool of the chi2, if it has one; run() does this when it returns.
+        """
+        close = getattr(self.chi2, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self, path, n_burn=None, adapt_every=50, adapt_lag=1000, adapt_time=10, buffer_steps=100, rng=None,
+            checkpoint=None):
+        if rng is None:
+            rng = np.random.default_rng(self.config.header.seed)
+        p = self.ptmcmc
+        if n_burn is None:
+            n_burn = p.ptmcmc_n // 5
+        nT, n = p.ptmcmc_nT, self.n_chains
+        restored = checkpoint.restore("ptmcmc", self.config, rng) if checkpoint is not None else None
+        if restored is None:
+            start, offset, swaps = 0, None, 0
+            accepted, swapped = np.zeros(nT, dtype=int), np.zeros(nT - 1, dtype=int)
+            noise = proposal_noise(rng, self.sampling_f, self.chol, nT * n).reshape(nT, n, -1)
+            x = self.energy.start + p.ptmcmc_dS * noise
+            e, chi2 = (a.reshape(nT, n) for a in self.energy(x.reshape(nT * n, -1)))
+        else:
+            start, state, arrays = restored
+            if arrays["x"].shape != (nT, n, len(self.parameters)):
+                raise ValueError(f"the checkpoint holds chains of shape {arrays['x'].shape}")
+            x, e, chi2 = arrays["x"], arrays["e"], arrays["chi2"]
+            self.temperatures, self.dS = arrays["temperatures"], arrays["dS"]
+            accepted, swapped = arrays["accepted"], arrays["swapped"]
+            n_burn, adapt_every = state["n_burn"], state["adapt_every"]
+            adapt_lag, adapt_time = state["adapt_lag"], state["adapt_time"]
+            swaps, offset = state["swaps"], state["offset"]
+        total = n_burn + p.ptmcmc_n
+        saved = start
+
+        def save(step):
+            nonlocal saved
+            checkpoint.save("ptmcmc", self.config, step, rng,
+                            dict(x=x, e=e, chi2=chi2, temperatures=self.temperatures, dS=self.dS,
+                                 accepted=accepted, swapped=swapped),
+                            n_burn=n_burn, adapt_every=adapt_every, adapt_lag=adapt_lag, adapt_time=adapt_time,
+                            swaps=swaps, offset=writer.tell() if writer is not None else None)
+            saved = step
+
+        writer = None
+        for i in range(start, n_burn):
+            accepted += self._step(rng, x, e, chi2)
+            if (i + 1) % p.ptmcmc_swap == 0:
+                rates = self._swap(rng, x, e, chi2) / n
+                self._adapt_ladder(rates, adapt_lag / (adapt_lag + swaps) / adapt_time)
+                swaps += 1
+            if (i + 1) % adapt_every == 0:
+                self.dS = self.dS * np.exp(2 * (accepted / (adapt_every * n) - TARGET_ACCEPTANCE))
+                accepted[:] = 0
+            if checkpoint is not None and checkpoint.due(i + 1):
+                save(i + 1)
+
+        if start <= n_burn:
+            accepted[:] = 0
+        with ChainWriter(path, parameter_names(self.parameters), buffer_steps, offset) as writer:
+            for i in range(max(start - n_burn, 0), p.ptmcmc_n):
+                accepted += self._step(rng, x, e, chi2)
+                if (n_burn + i + 1) % p.ptmcmc_swap == 0:
+                    swapped += self._swap(rng, x, e, chi2)
+                writer.append(i, x[0], chi2[0])
+                if checkpoint is not None and checkpoint.due(n_burn + i + 1):
+                    save(n_burn + i + 1)
+            if checkpoint is not None and saved != total:
+                save(total)
+        self.acceptance = accepted / max(1, p.ptmcmc_n * n)
+        self.swap_acceptance = swapped / max(1, (total // p.ptmcmc_swap - n_burn // p.ptmcmc_swap) * n)
+        self.x = x[0]
+        return self.x
@@ -0,0 +1,342 @@
+import glob
+import os
+import subprocess
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .configfile import parse_file
+from .cache import RESULT_INDEX, run_key
+from .instrument import span, count
+
+
+class JobResult:
+    """
+    A class to represent the outcome of one GLEE run.
+
+    Attributes
+    ----------
+    name : str
+        The job name.
+    workdir : str
+        The scratch directory the job ran in.
+    configfile : str
+        The path of the configfile GLEE was run on.
+    returncode : int or None
+        The exit code of the last attempt, None if it timed out.
+    attempts : int
+        The number of attempts made.
+    elapsed : float
+        The wall time of the last attempt, in seconds.
+    cached : bool
+        Whether the output was restored from a RunCache instead of running GLEE.
+    stopped : str or None
+        Why a monitored run was terminated early (see AsyncGleeRunner), None if it was not.
+    """
+    def __init__(self, name, workdir, configfile, returncode, attempts, elapsed, cached=False, stopped=None):
+        self.name = name
+        self.workdir = workdir
+        self.configfile = configfile
+        self.returncode = returncode
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.cached = cached
+        self.stopped = stopped
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    @property
+    def timed_out(self):
+        return self.returncode is None
+
+    @property
+    def stdout(self):
+        return os.path.join(self.workdir, "stdout.txt")
+
+    @property
+    def stderr(self):
+        return os.path.join(self.workdir, "stderr.txt")
+
+    def output_files(self, pattern="*"):
+        """
+        Returns the files in the scratch directory matching pattern, oldest first.
+        """
+        return sorted(glob.glob(os.path.join(self.workdir, pattern)), key=os.path.getmtime)
+
+    def read_config(self, pattern):
+        """
+        Parse the newest output file matching pattern as a GleeConfig, e.g. the best-fit configfile GLEE writes.
+        """
+        files = self.output_files(pattern)
+        if not files:
+            raise FileNotFoundError(f"job '{self.name}' wrote no file matching '{pattern}'")
+        return parse_file(files[-1])
+
+
+class JobFailed(RuntimeError):
+    """
+    Raised when a job or pipeline stage fails after all retries.
+    """
+    def __init__(self, result):
+        reason = "timed out" if result.timed_out else f"exited with {result.returncode}"
+        super().__init__(f"job '{result.name}' {reason} after {result.attempts} attempt(s), see {result.workdir}")
+        self.result = result
+
+
+def next_stage(pattern, minimiser="mcmc"):
+    """
+    Returns a pipeline stage building the next configuration from the output of the previous job.
+
+    The newest file matching pattern in the previous job's scratch directory is parsed and its
+    minimiser is set, e.g. to feed the best-fit siman configfile into an mcmc run.
+    """
+    def stage(result):
+        config = result.read_config(pattern)
+        config.header.minimiser = minimiser
+        return config
+    return stage
+
+
+def write_configfile(config, scratch, name):
+    """
+    Write a configuration to <scratch>/<name>/<name>.config and return the job directory and configfile path.
+    """
+    workdir = os.path.join(scratch, name)
+    os.makedirs(workdir, exist_ok=True)
+    configfile = os.path.join(workdir, f"{name}.config")
+    with span("glee.write_config", job=name), open(configfile, "w") as f:
+        f.write(config.as_string())
+    return workdir, configfile
+
+
+def clear_outputs(workdir, configfile):
+    """
+    Remove everything in a job directory but its configfile, e.g. the partial output of a failed attempt.
+    """
+    for entry in os.scandir(workdir):
+        if entry.path == configfile:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.remove(entry.path)
+
+
+class GleeRunner:
+    """
+    A class to run GLEE on many configurations with a bounded pool of concurrent processes.
+
+    Each job gets its own scratch directory holding its configfile, stdout.txt, stderr.txt and GLEE's
+    output; job names are therefore unique per runner, and reusing one raises ValueError. A job is
+    retried if it exits with an error or exceeds its timeout; the output of the failed attempt is
+    removed first, so only files of the final attempt are left (or cached). Pipelines run their
+    stages one after the other in a single pool slot, so at most max_workers GLEE processes run at
+    any time.
+
+    Attributes
+    ----------
+    executable : str
+        The GLEE executable (or a stub with the same interface).
+    max_workers : int
+        The maximum number of concurrent GLEE processes. Defaults to the number of CPUs divided by threads_per_job.
+    scratch : str
+        The directory holding the job scratch directories.
+    timeout : float or None
+        The per-attempt timeout in seconds.
+    retries : int
+        The number of retries after a failed attempt.
+    args : tuple of str
+        Extra arguments passed before the configfile.
+    threads_per_job : int
+        Exported as OMP_NUM_THREADS to every job, to avoid oversubscribing the cores.
+    cache : RunCache or None
+        If given, a job whose run_key (config_hash, executable and args) is cached is restored
+        instead of run, successful jobs are stored, and identical jobs running at the same time run only once.
+    hash_content : bool
+        Whether config_hash digests the contents of the referenced files rather than their stat.
+    """
+    def __init__(self, executable="glee", max_workers=None, scratch=None, timeout=None, retries=0, args=(),
+                 threads_per_job=1, cache=None, hash_content=False):
+        if max_workers is None:
+            max_workers = max(1, (os.cpu_count() or 1) // threads_per_job)
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise ValueError("max_workers must be a positive int")
+        if not isinstance(retries, int) or retries < 0:
+            raise ValueError("retries must be a non-negative int")
+        self.executable = executable
+        self.max_workers = max_workers
+        self.scratch = os.path.abspath(scratch or tempfile.mkdtemp(prefix="pyglee_"))
+        self.timeout = timeout
+        self.retries = retries
+        self.args = tuple(args)
+        self.threads_per_job = threads_per_job
+        self.cache = cache
+        self.hash_content = hash_content
+        self._inflight = {}
+        self._names = set()
+        self._lock = threading.Lock()
+        os.makedirs(self.scratch, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers)
+        self._count = 0
+
+    def _name(self, name):
+        with self._lock:
+            self._count += 1
+            return name or f"job{self._count:06d}"
+
+    def _claim(self, *names):
+        # Reserve the scratch directories of new jobs, so no two jobs write to the same one.
+        with self._lock:
+            reused = [name for name in names if name in self._names]
+            if reused:
+                raise ValueError(f"job name(s) {reused} already used by this runner")
+            self._names.update(names)
+
+    def run(self, config, name):
+        """
+        Run GLEE on a configuration in this thread and return its JobResult.
+        """
+        self._claim(name)
+        return self._execute(config, name)
+
+    def _execute(self, config, name):
+        if self.cache is None:
+            return self._run(config, name)
+        key = run_key(config, self.executable, self.args, self.hash_content)
+        while True:
+            entry = self.cache.get(key)
+            if entry is not None:
+                count("glee.cache_hits")
+                with span("glee.restore", job=name, key=key):
+                    return self._restore(config, name, entry)
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None and key not in self.cache:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            if event is not None:
+                event.wait()
+        try:
+            result = self._run(config, name)
+            if result.ok:
+                self.cache.put(key, result.workdir, name=name, returncode=result.returncode,
+                               attempts=result.attempts, elapsed=result.elapsed)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def _write_config(self, config, name):
+        return write_configfile(config, self.scratch, name)
+
+    def _restore(self, config, name, entry):
+        # Copy the cached output, renaming files named after the original job: the job name followed
+        # by the end of the name, '.' or '_' (e.g. job1.config, job1_siman.dat but not job10.config).
+        old = entry["name"]
+        workdir = os.path.join(self.scratch, name)
+        os.makedirs(workdir, exist_ok=True)
+        for root, _, files in os.walk(entry["path"]):
+            relative = os.path.relpath(root, entry["path"])
+            os.makedirs(os.path.join(workdir, relative), exist_ok=True)
+            for f in files:
+                if root == entry["path"] and f == RESULT_INDEX:
+                    continue
+                renamed = f.startswith(old) and (len(f) == len(old) or f[len(old)] in "._")
+                target = name + f[len(old):] if renamed else f
+                shutil.copy2(os.path.join(root, f), os.path.join(workdir, relative, target))
+        workdir, configfile = self._write_config(config, name)
+        return JobResult(name, workdir, configfile, entry["returncode"], entry["attempts"], entry["elapsed"],
+                         cached=True)
+
+    def _run(self, config, name):
+        workdir, configfile = self._write_config(config, name)
+        env = dict(os.environ, OMP_NUM_THREADS=str(self.threads_per_job))
+        for attempt in range(1, self.retries + 2):
+            if attempt > 1:
+                clear_outputs(workdir, configfile)
+            start = time.perf_counter()
+            with span("glee.run", job=name, attempt=attempt) as s, \
+                    open(os.path.join(workdir, "stdout.txt"), "w") as out, \
+                    open(os.path.join(workdir, "stderr.txt"), "w") as err:
+                try:
+                    returncode = subprocess.run([self.executable, *self.args, os.path.basename(configfile)],
+                                                cwd=workdir, stdout=out, stderr=err, env=env,
+                                                timeout=self.timeout).returncode
+                except subprocess.TimeoutExpired:
+                    returncode = None
+                s.set(returncode=returncode)
+            count("glee.runs")
+            result = JobResult(name, workdir, configfile, returncode, attempt, time.perf_counter() - start)
+            if result.ok:
+                break
+        return result
+
+    def submit(self, config, name=None):
+        """
+        Queue a GLEE run.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the JobResult, also when the job failed.
+        """
+        name = self._name(name)
+        self._claim(name)
+        return self._pool.submit(self._execute, config, name)
+
+    def _run_pipeline(self, config, stages, name):
+        results = []
+        for i, stage in enumerate([None] + list(stages)):
+            if stage is not None:
+                config = stage(results[-1])
+            result = self._execute(config, f"{name}_stage{i}")
+            results.append(result)
+            if not result.ok:
+                raise JobFailed(result)
+        return results
+
+    def submit_pipeline(self, config, stages, name=None):
+        """
+        Queue a staged pipeline, e.g. siman followed by mcmc.
+
+        Parameters
+        ----------
+        config : GleeConfig
+            The configuration of the first stage.
+        stages : list of callable
+            One function per following stage, building its GleeConfig from the previous JobResult
+            (see next_stage).
+        name : str, optional
+            The pipeline name; stage i runs in the scratch directory "<name>_stage<i>".
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the list of JobResults, or raises JobFailed if a stage failed.
+        """
+        name = self._name(name)
+        stages = list(stages)
+        self._claim(*(f"{name}_stage{i}" for i in range(len(stages) + 1)))
+        return self._pool.submit(self._run_pipeline, config, stages, name)
+
+    def map(self, configs, names=None):
+        """
+        Run GLEE on many configurations and return their JobResults in order.
+        """
+        names = names or [None] * len(configs)
+        futures = [self.submit(config, name) for config, name in zip(configs, names)]
+        return [f.result() for f in futures]
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,171 @@
+import numpy as np
+
+from .likelihood import free_light_parameters, LightChi2, Energy, config_with_values
+
+
+class Annealer:
+    """
+    A class to run the simulated annealing schedule of SimanParameters in Python, on many walkers at once.
+
+    The (j+1)-th temperature is T(j) = siman_Ti / siman_Tf^j, for all T(j) >= siman_Tmin, and the step
+    scale at that temperature is dS(j) = siman_dS / siman_Sf^j times each parameter's step. siman_nT
+    steps are taken per temperature. A proposal is accepted with probability exp(-dE / (siman_k T)),
+    with energy E = chi2/2 plus the Gaussian prior terms; proposals outside a flat prior's bounds or
+    below a prior's min are rejected. The whole schedule is repeated siman_iter times, restarting at
+    siman_Ti from each walker's best point.
+
+    Attributes
+    ----------
+    config : GleeConfig
+        The configuration to anneal. Not modified.
+    n_walkers : int
+        The number of independent walkers.
+    parameters : list of tuple
+        The free parameters, as returned by free_light_parameters.
+    energy : Energy
+        The energy of parameter vectors.
+    best_x : numpy.ndarray
+        The best parameter vector of each walker, of shape (n_walkers, n_params), after run().
+    best_energy : numpy.ndarray
+        The energy of best_x, after run().
+    best_chi2 : numpy.ndarray
+        The chi2 of best_x, after run().
+    """
+    def __init__(self, config, n_walkers=1, chi2=None, parameters=None):
+        if not isinstance(n_walkers, int) or n_walkers < 1:
+            raise ValueError("n_walkers must be a positive int")
+        siman = config.header.optimisers.siman
+        if siman.siman_Ti < siman.siman_Tmin:
+            raise ValueError("siman_Ti must be at least siman_Tmin")
+        if siman.siman_Tf <= 1 and siman.siman_Ti > siman.siman_Tmin:
+            raise ValueError("siman_Tf must be > 1 for T(j) = siman_Ti / siman_Tf^j to reach siman_Tmin")
+        self.config = config
+        self.siman = siman
+        self.n_walkers = n_walkers
+        self.parameters = free_light_parameters(config) if parameters is None else parameters
+        if not self.parameters:
+            raise ValueError("there are no free parameters to anneal")
+        self.chi2 = LightChi2(config, self.parameters) if chi2 is None else chi2
+        self.energy = Energy(self.parameters, self.chi2)
+        self.best_x = None
+        self.best_energy = None
+        self.best_chi2 = None
+
+    def temperatures(self):
+        """
+        Returns the temperatures T(j) = siman_Ti / siman_Tf^j >= siman_Tmin of one annealing.
+        """
+        s = self.siman
+        temps = [float(s.siman_Ti)]
+        while s.siman_Tf > 1 and s.siman_Ti / s.siman_Tf ** len(temps) >= s.siman_Tmin:
+            temps.append(s.siman_Ti / s.siman_Tf ** len(temps))
+        return np.array(temps)
+
+    def step_scales(self):
+        """
+        Returns the global step scales dS(j) = siman_dS / siman_Sf^j matching temperatures().
+        """
+        s = self.siman
+        return s.siman_dS / s.siman_Sf ** np.arange(len(self.temperatures()))
+
+    def run(self, rng=None, checkpoint=None):
+        """
+        Run the annealing schedule.
+
+        Parameters
+        ----------
+        rng : numpy.random.Generator, optional
+            The random generator. Defaults to one seeded with Header.seed.
+        checkpoint : Checkpoint, optional
+            Saves the walkers, their best points and the generator state. If its file exists, the
+            run continues from it and gives the same result as an uninterrupted run.
+
+        Returns
+        -------
+        GleeConfig
+            A copy of the configuration with the best walker's parameters as prior means.
+        """
+        try:
+            return self._run(rng, checkpoint)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Shut down the thread pool of the chi2, if it has one; run() does this when it returns.
+        """
+        close = getattr(self.chi2, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self, rng=None, checkpoint=None):
+        if rng is None:
+            rng = np.random.default_rng(self.config.header.seed)
+        s = self.siman
+        temps = self.temperatures()
+        scales = self.step_scales()
+        per_iter = len(temps) * s.siman_nT
+        total = s.siman_iter * per_iter
+        restored = checkpoint.restore("siman", self.config, rng) if checkpoint is not None else None
+        if restored is None:
+            start = 0
+            x = np.tile(self.energy.start, (self.n_walkers, 1))
+            e, chi2 = self.energy(x)
+            best_x, best_e, best_chi2 = x.copy(), e.copy(), chi2.copy()
+        else:
+            start, _, arrays = restored
+            if arrays["x"].shape != (self.n_walkers, len(self.parameters)):
+                raise ValueError(f"the checkpoint holds walkers of shape {arrays['x'].shape}")
+            x, e, chi2 = arrays["x"], arrays["e"], arrays["chi2"]
+            best_x, best_e, best_chi2 = arrays["best_x"], arrays["best_e"], arrays["best_chi2"]
+
+        saved = start
+
+        def save(n):
+            # The iteration and temperature index the run continues at.
+            nonlocal saved
+            j = n % per_iter // s.siman_nT
+            checkpoint.save("siman", self.config, n, rng,
+                            dict(x=x, e=e, chi2=chi2, best_x=best_x, best_e=best_e, best_chi2=best_chi2),
+                            iteration=n // per_iter, j=j, T=float(temps[j]), dS=float(scales[j]))
+            saved = n
+
+        with np.errstate(invalid="ignore", over="ignore"):
+            # One flat loop over (iteration, temperature index j, step), so a checkpoint can stop anywhere.
+            for n in range(start, total):
+                j = n % per_iter // s.siman_nT
+                T, dS = temps[j], scales[j]
+                proposal = x + (dS * self.energy.step) * rng.standard_normal(x.shape)
+                e_new, chi2_new = self.energy(proposal)
+                accept = (e_new <= e) | (rng.random(self.n_walkers) < np.exp(-(e_new - e) / (s.siman_k * T)))
+                x[accept] = proposal[accept]
+                e[accept] = e_new[accept]
+                chi2[accept] = chi2_new[accept]
+                better = e < best_e
+                best_x[better] = x[better]
+                best_e[better] = e[better]
+                best_chi2[better] = chi2[better]
+                if (n + 1) % per_iter == 0:
+                    x, e, chi2 = best_x.copy(), best_e.copy(), best_chi2.copy()
+                if checkpoint is not None and checkpoint.due(n + 1):
+                    save(n + 1)
+        if checkpoint is not None and saved != total:
+            save(total)
+        self.best_x = best_x
+        self.best_energy = best_e
+        self.best_chi2 = best_chi2
+        return self.best_config()
+
+    def best_config(self):
+        """
+        Returns a copy of the configuration with the parameters of the overall best walker as prior means.
+        """
+        if self.best_x is None:
+            raise RuntimeError("run() has not been called")
+        return config_with_values(self.config, self.parameters, self.best_x[np.argmin(self.best_energy)])
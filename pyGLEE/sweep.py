@@ -0,0 +1,213 @@
+import os
+import re
+
+import numpy as np
+
+from .priors import Prior, FlatPrior
+from .instrument import span
+
+
+# Short names accepted in parameter paths, e.g. "esource[0].light[1].r_eff.mean" or "psource[0].image[2].x".
+PATH_ALIASES = {"esource": "e_source_list", "light": "light_profiles", "lens": "lenses", "psource": "point_sources",
+                "image": "images"}
+
+_STEP = re.compile(r"^(\w+)(?:\[(-?\d+)\])?$")
+
+
+def resolve_path(config, path):
+    """
+    Find the object and attribute name a parameter path points to.
+
+    Parameters
+    ----------
+    config : GleeConfig
+        The configuration to look into.
+    path : str
+        Dotted path such as "header.seed", "esource[0].reglam" or "esource[0].light[1].r_eff.mean".
+
+    Returns
+    -------
+    tuple of (object, str)
+        The owner of the attribute and the attribute name.
+    """
+    obj = config
+    steps = path.split(".")
+    for i, step in enumerate(steps):
+        match = _STEP.match(step)
+        if match is None:
+            raise ValueError(f"invalid parameter path '{path}'")
+        name, index = match.groups()
+        name = PATH_ALIASES.get(name, name)
+        if i == len(steps) - 1 and index is None:
+            if not hasattr(obj, name):
+                raise ValueError(f"'{path}': {type(obj).__name__} has no attribute '{name}'")
+            return obj, name
+        try:
+            obj = getattr(obj, name)
+            if index is not None:
+                obj = obj[int(index)]
+        except (AttributeError, IndexError):
+            raise ValueError(f"'{path}': cannot resolve '{step}'") from None
+    raise ValueError(f"'{path}' does not point to an attribute")
+
+
+class _Slot:
+    """Placeholder written by as_string in place of a swept value."""
+    def __init__(self, index):
+        self.index = index
+
+    def __format__(self, spec):
+        return f"\x00{self.index}\x00"
+
+    def __str__(self):
+        return format(self)
+
+
+def _render(segments, slots, columns, i):
+    parts = [segments[0]]
+    for slot, segment in zip(slots, segments[1:]):
+        parts.append(str(columns[slot][i]))
+        parts.append(segment)
+    return "".join(parts)
+
+
+def _write_chunk(args):
+    segments, slots, columns, names = args
+    for i, name in enumerate(names):
+        with open(name, "w") as f:
+            f.write(_render(segments, slots, columns, i))
+    return len(names)
+
+
+class Sweep:
+    """
+    A class to write many variants of one GleeConfig which differ only in a few values.
+
+    The template is rendered once with placeholders for the swept fields and split into its static
+    text segments. A variant is then the static segments joined with the formatted override values,
+    so writing it costs in the number of swept fields, not in the size of the configuration.
+
+    Attributes
+    ----------
+    template : GleeConfig
+        The configuration the variants are built from.
+    overrides : dict of str to numpy.ndarray
+        One 1-D array per parameter path, all of the same length.
+    n : int
+        The number of variants.
+    """
+    def __init__(self, template, overrides):
+        if not isinstance(overrides, dict) or not overrides:
+            raise TypeError("overrides must be a non-empty dict of parameter path to array")
+        columns = {}
+        targets = {}
+        for path, values in overrides.items():
+            values = np.asarray(values)
+            if values.ndim != 1:
+                raise ValueError(f"'{path}': overrides must be 1-D arrays")
+            if not (np.issubdtype(values.dtype, np.number) or values.dtype.kind == "U"):
+                raise TypeError(f"'{path}': overrides must be numbers or strings")
+            owner, name = resolve_path(template, path)
+            current = getattr(owner, name)
+            if isinstance(current, Prior) or isinstance(current, (list, tuple)):
+                raise ValueError(f"'{path}' points to a {type(current).__name__}, not a value")
+            if isinstance(current, int) and not isinstance(current, bool) and values.dtype.kind not in "iu":
+                raise TypeError(f"'{path}' is an integer field, overrides must be an integer array")
+            columns[path] = values
+            targets[path] = (owner, name)
+        lengths = {len(v) for v in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError("all override arrays must have the same length")
+
+        self.template = template
+        self.overrides = columns
+        self.n = lengths.pop()
+        self._check_bounds(targets)
+        self._split(targets)
+
+    def _check_bounds(self, targets):
+        """Check the flat prior bounds of all variants at once."""
+        priors = {}
+        for path, (owner, name) in targets.items():
+            if isinstance(owner, FlatPrior) and name in ("lower", "upper"):
+                priors.setdefault(id(owner), (owner, {}))[1][name] = self.overrides[path]
+        for owner, bounds in priors.values():
+            lower = bounds.get("lower", owner.lower)
+            upper = bounds.get("upper", owner.upper)
+            bad = np.flatnonzero(np.broadcast_to(np.asarray(lower) >= np.asarray(upper), (self.n,)))
+            if bad.size:
+                raise ValueError(f"lower bound must be less than upper bound (variant {bad[0]})")
+
+    def _split(self, targets):
+        paths = list(targets)
+        saved = []
+        bound = []
+        try:
+            for k, path in enumerate(paths):
+                owner, name = targets[path]
+                if isinstance(owner, Prior) and name == "mean" and owner._values is not None:
+                    # A bound mean lives in a float array; unbind it so the slot can be written.
+                    bound.append((owner, owner._values, owner._index))
+                    owner._release()
+                saved.append((owner, name, getattr(owner, name)))
+                setattr(owner, name, _Slot(k))
+            text = self.template.as_string()
+        finally:
+            for owner, name, value in reversed(saved):
+                setattr(owner, name, value)
+            for owner, values, index in bound:
+                owner._bind(values, index)
+        pieces = text.split("\x00")
+        self._segments = pieces[0::2]
+        self._slots = [int(p) for p in pieces[1::2]]
+        # Convert once to Python scalars so str() matches what as_string writes.
+        self._columns = [self.overrides[path].tolist() for path in paths]
+
+    def variant_string(self, i):
+        """
+        Returns the configfile text of the i-th variant.
+        """
+        if not -self.n <= i < self.n:
+            raise IndexError("variant index out of range")
+        return _render(self._segments, self._slots, self._columns, i % self.n)
+
+    def write(self, directory, name="config_{i:06d}", processes=None):
+        """
+        Write all variants as configfiles.
+
+        Parameters
+        ----------
+        directory : str
+            The directory to write to. Created if needed.
+        name : str, optional
+            Format string for the file names, formatted with the variant index i.
+        processes : int, optional
+            Number of worker processes. Defaults to None, writing in this process.
+
+        Returns
+        -------
+        list of str
+            The paths of the written configfiles, in variant order.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, name.format(i=i)) for i in range(self.n)]
+        with span("sweep.write", n=self.n, processes=processes or 0):
+            return self._write(paths, processes)
+
+    def _write(self, paths, processes):
+        if not processes:
+            _write_chunk((self._segments, self._slots, self._columns, paths))
+            return paths
+        size = max(1, -(-self.n // (4 * processes)))
+        chunks = [(self._segments,
+                   self._slots,
+                   [column[start:start + size] for column in self._columns],
+                   paths[start:start + size]) for start in range(0, self.n, size)]
+        from multiprocessing import Pool
+        with Pool(processes) as pool:
+            for _ in pool.imap_unordered(_write_chunk, chunks):
+                pass
+            # Let the workers exit rather than be terminated, so they write their PYGLEE_TRACE spans.
+            pool.close()
+            pool.join()
+        return paths
@@ -6,5 +6,6 @@ setup(
     packages=find_packages(include=['pyGLEE']),
     version='0.1',
     description='Python wrapper for GLEE',
-    author='Allan'
+    author='Allan',
+    install_requires=['numpy>=2.0', 'astropy', 'scipy']
 )
\ No newline at end of file
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_glee.py")
+
+
+@pytest.fixture
+def make_config(tmp_path):
+    """
+    Returns a function building a small GleeConfig with a given seed, its .fits files in tmp_path.
+    """
+    from fixtures import make_config as build
+
+    def make(seed=0):
+        config = build(1, 1, ngx=20, ngy=10, directory=str(tmp_path / "fits"))
+        config.header.seed = seed
+        return config
+    return make
+
+
+@pytest.fixture
+def stub_runner(tmp_path):
+    """
+    Returns a function building a GleeRunner on the stub executable, with a scratch directory in tmp_path.
+    """
+    from pyGLEE.runner import GleeRunner
+    runners = []
+
+    def make(**kwargs):
+        runner = GleeRunner(sys.executable, args=(STUB,), scratch=str(tmp_path / "scratch"), **kwargs)
+        runners.append(runner)
+        return runner
+    yield make
+    for runner in runners:
+        runner.shutdown()
@@ -0,0 +1,40 @@
+"""
+A stand-in for the GLEE executable, run as `python stub_glee.py <configfile>` in the job directory.
+
+It prints a chi2 line and copies the configfile to <stem>_best.config, like a GLEE run writing its
+best fit. The seed of the configfile selects a failure mode:
+    seed 1: write a partial <stem>_partial.dat and exit with 3 on the first attempt of a job, succeed
+            on the next (the attempt is recorded next to the job directory, which retries clear)
+    seed 2: sleep for 30 s, to hit a timeout
+    seed 3: always exit with 3
+    seed 4: print a diverging siman progress line every 0.1 s for 5 s, between unrelated lines
+"""
+import os
+import re
+import shutil
+import sys
+import time
+
+configfile = sys.argv[-1]
+with open(configfile) as f:
+    text = f.read()
+seed = int(re.search(r"^seed\s+(\S+)", text, re.M).group(1))
+
+stem = os.path.splitext(os.path.basename(configfile))[0]
+attempted = os.path.join("..", f"{stem}.attempted")
+if seed == 1 and not os.path.exists(attempted):
+    open(attempted, "w").close()
+    open(f"{stem}_partial.dat", "w").close()
+    sys.exit(3)
+if seed == 2:
+    time.sleep(30)
+if seed == 3:
+    sys.exit(3)
+if seed == 4:
+    for i in range(50):
+        print(f"writing file at t = {i} seconds", flush=True)
+        print(f"step {i} T = {1 / (i + 1)} chi2 = {10.0 * 3**i}", flush=True)
+        time.sleep(0.1)
+
+print("step 0 T = 1.0 chi2 = 10.0", flush=True)
+shutil.copy(configfile, os.path.splitext(configfile)[0] + "_best.config")
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from pyGLEE.convolution import Convolver, ModelImage
+from pyGLEE.esource import ESource
+from pyGLEE.light_profiles import Gaussian, PSF
+from pyGLEE.priors import ExactPrior
+
+NGX = 16
+DX = 0.25
+
+
+def _kernel(side, sigma, shift):
+    # A Gaussian kernel off-centre by shift pixels, so convolving with it moves the image.
+    c = np.arange(side) - side // 2
+    return np.exp(-((c[:, None] - shift[0])**2 + (c[None, :] - shift[1])**2) / (2 * sigma**2))
+
+
+@pytest.fixture
+def kernels(tmp_path):
+    """
+    Writes distinct lens-light, lensed-source and point-image PSFs and returns (arrays, paths).
+    """
+    arrays = {"psf": _kernel(7, 0.8, (2, 0)), "sub_esr_psf": _kernel(15, 1.5, (0, -3)),
+              "sub_agn_psf": _kernel(9, 1.0, (-3, 3))}
+    paths = {}
+    for name, kernel in arrays.items():
+        paths[name] = str(tmp_path / f"{name}.fits")
+        fits.writeto(paths[name], kernel)
+    fits.writeto(str(tmp_path / "image.fits"), np.zeros((NGX, NGX)))
+    paths["image"] = str(tmp_path / "image.fits")
+    return arrays, paths
+
+
+def _esource(paths, profiles, mod_light):
+    image = paths["image"]
+    return ESource(ngy=8, ngx=NGX, dx=DX, data=image, err=image, arcmask=image, lensmask=image,
+                   psf=paths["psf"], sub_agn_psf=paths["sub_agn_psf"], sub_agn_psf_factor=3,
+                   sub_esr_psf=paths["sub_esr_psf"], sub_esr_psf_factor=3,
+                   regopt="SpecRegPrecSigFigOnce", reglampre=1, reglamnup=10, regtype="curv",
+                   reglam=10, reglamlo=0.01, reglamhi=1000, light_profiles=profiles,
+                   mod_light=mod_light, dds_ds=ExactPrior(1.0))
+
+
+def _expected(esource, profile, kernel, factor):
+    grid = esource.grid(subsampling=factor)
+    return grid.block_average(Convolver.from_array(kernel, grid.shape).convolve(profile.evaluate(grid)))
+
+
+def _gaussian():
+    centre = NGX * DX / 2
+    return Gaussian(x=ExactPrior(centre), y=ExactPrior(centre), amp=ExactPrior(1.0), q=ExactPrior(0.8),
+                    pa=ExactPrior(0.3), sigma=ExactPrior(0.5))
+
+
+def _point():
+    centre = NGX * DX / 2
+    return PSF(x=ExactPrior(centre + 0.3), y=ExactPrior(centre - 0.2), amp=ExactPrior(1.0))
+
+
+@pytest.mark.parametrize("mod_light, profile, name, factor", [
+    ("LensOnly", _gaussian, "psf", 1),
+    (None, _gaussian, "sub_esr_psf", 3),
+    ("LensOnly", _point, "sub_agn_psf", 3),
+    (None, _point, "sub_agn_psf", 3),
+])
+def test_each_component_uses_its_own_psf(kernels, mod_light, profile, name, factor):
+    arrays, paths = kernels
+    lp = profile()
+    esource = _esource(paths, [lp], mod_light)
+    model = ModelImage(esource)
+    assert model.kernel(lp) == (paths[name], factor)
+    rendered = model.render()
+    np.testing.assert_allclose(rendered, _expected(esource, lp, arrays[name], factor), atol=1e-12)
+    for other, kernel in arrays.items():
+        if other != name:
+            assert not np.allclose(rendered, _expected(esource, lp, kernel, factor), atol=1e-6)
+
+
+def test_components_are_summed(kernels):
+    arrays, paths = kernels
+    extended, point = _gaussian(), _point()
+    esource = _esource(paths, [extended, point], "LensOnly")
+    expected = (_expected(esource, extended, arrays["psf"], 1)
+                + _expected(esource, point, arrays["sub_agn_psf"], 3))
+    np.testing.assert_allclose(ModelImage(esource).render(), expected, atol=1e-12)
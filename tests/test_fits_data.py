@@ -0,0 +1,67 @@
+import random
+import threading
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from pyGLEE import fits_data
+from pyGLEE.fits_data import open_fits, close_all
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    """
+    Writes 12 small images and limits the shared handles to 4; returns their paths.
+    """
+    monkeypatch.setattr(fits_data, "MAX_OPEN_FILES", 4)
+    paths = []
+    for k in range(12):
+        paths.append(str(tmp_path / f"image{k}.fits"))
+        fits.writeto(paths[-1], np.full((8, 8), float(k)))
+    yield paths
+    close_all()
+
+
+def _open_images(seen):
+    return [image for image in seen if image._hdul is not None]
+
+
+def test_evicted_image_reopens_and_is_tracked(images):
+    first = open_fits(images[0])
+    for path in images[1:]:
+        open_fits(path).data
+    assert first._hdul is None
+    assert first.data[0, 0] == 0.0
+    assert first in fits_data._handles.values()
+    assert len(fits_data._handles) == fits_data.MAX_OPEN_FILES
+
+
+def test_concurrent_access_keeps_the_limit(images):
+    seen = set()
+    errors = []
+
+    def work(seed):
+        rng = random.Random(seed)
+        held = []
+        try:
+            for _ in range(300):
+                k = rng.randrange(len(images))
+                image = open_fits(images[k])
+                seen.add(image)
+                held.append((k, image))
+                # Read through handles that other threads may have evicted in the meantime.
+                k, image = rng.choice(held)
+                assert image.data[0, 0] == float(k)
+                assert image.header["NAXIS"] == 2
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len(fits_data._handles) <= fits_data.MAX_OPEN_FILES
+    assert set(_open_images(seen)) <= set(fits_data._handles.values())
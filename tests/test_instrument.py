@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+JOB = """
+import multiprocessing
+from pyGLEE.instrument import span
+
+def work(i):
+    with span("work", i=i):
+        return i
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method({method!r})
+    with span("main"):
+        with multiprocessing.Pool(2) as pool:
+            pool.map(work, range(6))
+            pool.close()
+            pool.join()
+"""
+
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_worker_spans_are_merged_without_stale_files(tmp_path, method):
+    trace = tmp_path / "trace.json"
+    stale = tmp_path / "trace.99999.json"
+    stale.write_text(json.dumps({"traceEvents": [{"ph": "X", "name": "stale", "ts": 0, "dur": 1, "pid": 99999}]}))
+    os.utime(stale, (0, 0))
+    script = tmp_path / "job.py"
+    script.write_text(JOB.format(method=method))
+    env = dict(os.environ, PYGLEE_TRACE=str(trace), PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, str(script)], cwd=tmp_path, env=env, check=True, timeout=60)
+    events = json.loads(trace.read_text())["traceEvents"]
+    names = [e["name"] for e in events if e["ph"] == "X"]
+    assert sorted(names) == ["main"] + ["work"] * 6
+    assert len({e["pid"] for e in events if e["ph"] == "X"}) == 3
+    assert sorted(os.listdir(tmp_path)) == ["job.py", "trace.99999.json", "trace.json"]
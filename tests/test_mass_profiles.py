@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from pyGLEE.mass_profiles import PIEMD, SIE, PowerLaw, NFW, Shear, MassProfile
+from pyGLEE.priors import ExactPrior
+
+PROFILES = {
+    "piemd": lambda: PIEMD(*map(ExactPrior, (0.2, -0.1, 0.7, 0.5, 1.3, 0.2))),
+    "piemd q > 1": lambda: PIEMD(*map(ExactPrior, (0.2, -0.1, 1.4, 0.5, 1.3, 0.2))),
+    "sie": lambda: SIE(*map(ExactPrior, (0.2, -0.1, 0.6, 2.1, 1.1))),
+    "powerlaw": lambda: PowerLaw(*map(ExactPrior, (0.1, 0.0, 0.7, 0.3, 1.2, 2.2))),
+    "nfw": lambda: NFW(*map(ExactPrior, (0.1, 0.0, 0.2, 1.5))),
+    "shear": lambda: Shear(*map(ExactPrior, (0.0, 0.0, 0.05, 0.4))),
+}
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(1)
+    return rng.uniform(-3, 3, 50) + 0.2, rng.uniform(-3, 3, 50) - 0.1
+
+
+@pytest.mark.parametrize("name", PROFILES)
+def test_hessian_trace_is_twice_the_convergence(name, points):
+    profile = PROFILES[name]()
+    xx, _, yy = profile.hessian(points)
+    np.testing.assert_allclose((xx + yy) / 2, profile.convergence(points), rtol=1e-8, atol=1e-12)
+
+
+@pytest.mark.parametrize("name", PROFILES)
+def test_deflection_is_the_gradient_of_the_potential(name, points):
+    profile = PROFILES[name]()
+    x, y, h = *points, 1e-5
+    gx = (profile.potential((x + h, y)) - profile.potential((x - h, y))) / (2 * h)
+    gy = (profile.potential((x, y + h)) - profile.potential((x, y - h))) / (2 * h)
+    ax, ay = profile.deflection(points)
+    np.testing.assert_allclose(gx, ax, atol=1e-8)
+    np.testing.assert_allclose(gy, ay, atol=1e-8)
+
+
+@pytest.mark.parametrize("name", ["piemd", "piemd q > 1", "sie", "nfw", "shear"])
+def test_analytic_hessian_matches_the_numerical_one(name, points):
+    profile = PROFILES[name]()
+    x, y, p = profile._prepare(points, None)
+    for analytic, numerical in zip(profile.hessian(points), MassProfile._hessian(profile, x, y, p)):
+        np.testing.assert_allclose(analytic, numerical, atol=1e-7)
+
+
+def test_powerlaw_hessian_at_large_coordinates():
+    profile = PowerLaw(*map(ExactPrior, (1000.0, 1000.0, 0.7, 0.3, 1.2, 2.2)))
+    where = (np.array([1001.3, 1000.05]), np.array([999.5, 1000.02]))
+    xx, _, yy = profile.hessian(where)
+    np.testing.assert_allclose((xx + yy) / 2, profile.convergence(where), rtol=1e-7)
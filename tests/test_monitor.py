@@ -0,0 +1,39 @@
+import asyncio
+import sys
+
+import pytest
+
+from conftest import STUB
+from pyGLEE.monitor import AsyncGleeRunner, Diverge, parse_progress
+
+
+@pytest.mark.parametrize("line, values", [
+    ("step 0 T = 1.0 chi2 = 10.0", {"temperature": 1.0, "chi2": 10.0}),
+    ("T = 0.5  chi2 = 1523.4", {"temperature": 0.5, "chi2": 1523.4}),
+    ("T: 1e-3  Chi2: inf", {"temperature": 1e-3, "chi2": float("inf")}),
+    ("temperature 0.25", {"temperature": 0.25}),
+    ("chi^2 = -2.5e+02", {"chi2": -250.0}),
+])
+def test_parse_progress(line, values):
+    assert parse_progress(line) == values
+
+
+@pytest.mark.parametrize("line", [
+    "writing file at t = 3 seconds",
+    "siman_Tmin 1",
+    "siman_Tf 0.5",
+    "dT = 0.1",
+    "seed 1",
+])
+def test_parse_progress_ignores_other_lines(line):
+    assert parse_progress(line) == {}
+
+
+def test_diverging_run_is_stopped(tmp_path, make_config):
+    runner = AsyncGleeRunner(sys.executable, args=(STUB,), scratch=str(tmp_path / "scratch"), grace=1.0)
+    events = []
+    result = asyncio.run(runner.run(make_config(4), "diverging", callbacks=[events.append], rules=[Diverge(10.0)]))
+    assert result.stopped is not None and "diverged" in result.stopped
+    assert result.elapsed < 4
+    assert all(event.temperature is not None for event in events)
+    assert [event.chi2 for event in events][:3] == [10.0, 30.0, 90.0]
@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyGLEE.runner import JobFailed, next_stage
+
+
+def test_success(stub_runner, make_config):
+    runner = stub_runner()
+    result = runner.run(make_config(0), "ok")
+    assert result.ok and result.attempts == 1
+    assert result.workdir == os.path.join(runner.scratch, "ok")
+    assert os.path.exists(result.configfile)
+    with open(result.stdout) as f:
+        assert "chi2 = 10.0" in f.read()
+    assert result.read_config("*_best.config").header.seed == 0
+
+
+def test_timeout(stub_runner, make_config):
+    result = stub_runner(timeout=1).run(make_config(2), "slow")
+    assert result.timed_out and not result.ok
+    assert result.elapsed < 10
+
+
+def test_retry_after_failure(stub_runner, make_config):
+    result = stub_runner(retries=1).run(make_config(1), "flaky")
+    assert result.ok and result.attempts == 2
+    assert not result.output_files("*_partial.dat")
+    assert os.path.exists(result.configfile)
+
+
+def test_concurrent_automatic_names(stub_runner, make_config):
+    runner = stub_runner(max_workers=4)
+    config = make_config(0)
+    with ThreadPoolExecutor(8) as pool:
+        futures = list(pool.map(lambda _: runner.submit(config), range(32)))
+    names = [f.result().name for f in futures]
+    assert len(set(names)) == 32
+
+
+def test_failure_without_retries(stub_runner, make_config):
+    result = stub_runner().run(make_config(1), "flaky")
+    assert result.returncode == 3 and result.attempts == 1
+
+
+def test_separate_workdirs(stub_runner, make_config):
+    results = stub_runner(max_workers=2).map([make_config(0), make_config(0)], ["a", "b"])
+    assert [r.ok for r in results] == [True, True]
+    assert results[0].workdir != results[1].workdir
+
+
+def test_reused_name_is_rejected(stub_runner, make_config):
+    runner = stub_runner()
+    runner.run(make_config(0), "job")
+    with pytest.raises(ValueError):
+        runner.run(make_config(0), "job")
+    with pytest.raises(ValueError):
+        runner.submit(make_config(0), "job")
+
+
+def test_pipeline(stub_runner, make_config):
+    results = stub_runner().submit_pipeline(make_config(0), [next_stage("*_best.config", "mcmc")], "fit").result()
+    assert [r.name for r in results] == ["fit_stage0", "fit_stage1"]
+    assert all(r.ok for r in results)
+    assert results[0].read_config("*_best.config").header.minimiser == "siman"
+    assert results[1].read_config("*_best.config").header.minimiser == "mcmc"
+
+
+def test_pipeline_stops_at_failed_stage(stub_runner, make_config):
+    future = stub_runner().submit_pipeline(make_config(3), [next_stage("*_best.config")], "broken")
+    with pytest.raises(JobFailed) as info:
+        future.result()
+    assert info.value.result.name == "broken_stage0"